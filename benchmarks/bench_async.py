@@ -0,0 +1,121 @@
+"""
+Asyncio versus threads benchmark.
+
+Runs the same fan out of single item requests (like fetching many playlists, which have no bulk getter)
+against the local stub server, at the same concurrency, two ways: through spotipy and the facade's
+Transport on a pool of worker threads (the SpotipyFacade path), and through AsyncSpotify on one
+event loop (the AsyncSpotipyFacade path). The stub holds every request for '--latency' seconds,
+to stand in for the round trip to the real API, and runs in its own process so it does not compete
+with the client for the GIL. Reports wall time, the client's CPU time and requests per second.
+
+Usage:
+    python -m benchmarks.bench_async [--requests N] [--concurrency N] [--latency S] [--runs N] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+from contextlib import contextmanager
+
+import spotipy
+
+from cli.facade.async_client import AsyncSpotify
+from cli.facade.concurrency import bounded_gather, ordered_map
+from cli.facade.transport import Transport
+from tests.stub_server import StubServer
+
+
+def _serve(latency: float, queue):
+    with StubServer(latency=latency) as server:
+        queue.put((server.prefix, list(server.data.catalog["track"])))
+        server._thread.join()
+
+
+@contextmanager
+def stub_process(latency: float):
+    """Runs a StubServer in a child process, yields its prefix and track ids"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve, args=(latency, queue), daemon=True
+    )
+    process.start()
+    try:
+        yield queue.get()
+    finally:
+        process.terminate()
+        process.join()
+
+
+def run_threads(prefix: str, ids: list, concurrency: int):
+    transport = Transport(pool_size=concurrency)
+    sp = spotipy.Spotify(auth="token", **transport.spotify_kwargs())
+    sp.prefix = prefix
+    for _ in ordered_map(sp.track, ids, concurrency):
+        pass
+    transport.close()
+
+
+def run_asyncio(prefix: str, ids: list, concurrency: int):
+    async def main():
+        async with AsyncSpotify(
+            auth="token", concurrency=concurrency, prefix=prefix
+        ) as sp:
+            await bounded_gather(sp.track, ids, concurrency)
+
+    asyncio.run(main())
+
+
+SCENARIOS = {"threads": run_threads, "asyncio": run_asyncio}
+
+
+def run_once(scenario, prefix: str, ids: list, concurrency: int) -> tuple:
+    """Returns the wall and CPU seconds the scenario took"""
+    start, start_cpu = time.perf_counter(), time.process_time()
+    scenario(prefix, ids, concurrency)
+    return time.perf_counter() - start, time.process_time() - start_cpu
+
+
+def run(requests: int, concurrency: int, latency: float, runs: int) -> dict:
+    results = {}
+    with stub_process(latency) as (prefix, track_ids):
+        ids = [track_ids[i % len(track_ids)] for i in range(requests)]
+        for name, scenario in SCENARIOS.items():
+            reports = [
+                run_once(scenario, prefix, ids, concurrency)
+                for _ in range(runs)
+            ]
+            times = [seconds for seconds, _ in reports]
+            results[name] = {
+                "requests": requests,
+                "concurrency": concurrency,
+                "latency": latency,
+                "runs": runs,
+                "mean_seconds": statistics.mean(times),
+                "min_seconds": min(times),
+                "mean_cpu_seconds": statistics.mean(cpu for _, cpu in reports),
+                "requests_per_second": requests / statistics.mean(times),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write results to this file as well")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.concurrency, args.latency, args.runs)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+CLI command benchmark, at library scale.
+
+Runs commands that walk the user's library or a whole playlist ('list -A', 'search --user', 'create'
+with its duplicate name scan, 'edit add', 'edit remove' and 'edit add --add-if-unique') against the
+local stub server, populated with libraries of each of the given sizes. Every run is a fresh interpreter,
+and records wall time, the API calls the stub answered (in total and per endpoint), and peak RSS.
+One more run per command is made with tracemalloc on, for the peak of allocated memory.
+
+Compare mode reads two result files and flags every command whose time, API calls or memory grew
+by more than the threshold, exiting with status 1 if any did.
+
+Usage:
+    python -m benchmarks.bench_commands [--scales 1000,10000,100000] [--runs N] [--output results.json]
+    python -m benchmarks.bench_commands --compare BASELINE.json RESULTS.json [--threshold 0.1]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests.stub_server import StubData, StubServer
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+# Tracks added to, or removed from, the target playlist by the edit commands
+EDIT_TRACKS = 100
+
+# Runs inside the child interpreter. Reports back on the last line of stderr.
+BOOTSTRAP = """
+import json, resource, runpy, sys, tracemalloc
+
+argv, trace = json.loads(sys.argv[1]), sys.argv[2] == "1"
+if trace:
+    tracemalloc.start()
+sys.argv = ["spotify-cli"] + argv
+exit_code = 0
+try:
+    runpy.run_module("cli.spotify_cli", run_name="__main__")
+except SystemExit as e:
+    exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+
+# ru_maxrss survives exec on linux, so would report the benchmark's own peak when it is larger
+peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                peak_rss_kb = int(line.split()[1])
+except OSError:
+    pass
+
+report = {"exit_code": exit_code, "peak_rss_kb": peak_rss_kb}
+if trace:
+    report["peak_allocated_bytes"] = tracemalloc.get_traced_memory()[1]
+sys.stderr.write("\\n" + json.dumps(report) + "\\n")
+"""
+
+# Per run metrics, and whether compare mode treats any growth in them as a regression
+METRICS = {
+    "mean_seconds": False,
+    "api_calls": True,
+    "peak_rss_kb": False,
+    "peak_allocated_bytes": False,
+}
+
+
+def build_library(scale: int) -> StubData:
+    """
+    A library of 'scale' saved tracks, with a playlist per 100 of them,
+    and a target playlist for the edit commands holding 'scale' tracks.
+    """
+    data = StubData().populate(
+        tracks=scale,
+        albums=max(scale // 10, 1),
+        artists=max(scale // 50, 1),
+        playlists=max(scale // 100, 1),
+        playlist_size=100,
+        saved_fraction=1,
+    )
+    track_ids = list(data.catalog["track"])
+    target = data.add("playlist", name="Benchmark target")
+    data.playlist_tracks[target["id"]] = [
+        data.rng.choice(track_ids) for _ in range(scale)
+    ]
+    data.library["playlist"].insert(0, target["id"])
+    return data
+
+
+def build_scenarios(data: StubData) -> dict:
+    """argv for each command, run against 'data'"""
+    target = data.library["playlist"][0]
+    in_playlist = list(dict.fromkeys(data.playlist_tracks[target]))
+    track_ids = list(data.catalog["track"])
+    last_saved = data.catalog["track"][data.library["track"][-1]]
+    return {
+        "list_all": ["list", "tr", "-A"],
+        "search_user": ["search", "tr", last_saved["name"], "--user"],
+        "create": ["create", "Benchmark new playlist"],
+        "edit_add": ["edit", "add", target] + track_ids[:EDIT_TRACKS],
+        "edit_remove": ["edit", "remove", target] + in_playlist[:EDIT_TRACKS],
+        "edit_add_unique": ["edit", "add", target, "--add-if-unique"]
+        + track_ids[-EDIT_TRACKS:],
+    }
+
+
+def child_env(server: StubServer, workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        USE_DUMMY_WRAPPER="False",
+        SPOTIFY_API_PREFIX=server.prefix,
+        SPOTIFY_ACCESS_TOKEN="benchmark",
+        SPOTIPY_CLIENT_ID="benchmark",
+        SPOTIPY_CLIENT_SECRET="benchmark",
+        SPOTIPY_REDIRECT_URI="http://localhost:8080",
+        ITEM_CACHE="False",
+        RATE_LIMIT="0",
+        IDENTITY_CACHE_PATH=os.path.join(workdir, "identity"),
+        LIBRARY_MIRROR_PATH=os.path.join(workdir, "mirror.sqlite3"),
+    )
+    return env
+
+
+def run_once(server: StubServer, argv: list, env: dict, trace: bool) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data = server.data
+    # Put the library back the way it was, so every run sees the same one
+    playlists = list(data.library["playlist"])
+    playlist_tracks = {k: list(v) for k, v in data.playlist_tracks.items()}
+    server.reset()
+    # Every run starts without a library mirror, so 'search --user' syncs it first
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(env["LIBRARY_MIRROR_PATH"] + suffix):
+            os.remove(env["LIBRARY_MIRROR_PATH"] + suffix)
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", BOOTSTRAP, json.dumps(argv), str(int(trace))],
+        cwd=root,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+
+    with data.lock:
+        data.library["playlist"] = playlists
+        data.playlist_tracks = playlist_tracks
+    report = json.loads(proc.stderr.strip().splitlines()[-1])
+    report.update(
+        seconds=seconds,
+        api_calls=server.counters["requests"],
+        api_calls_by_endpoint=dict(server.calls),
+    )
+    return report
+
+
+def run(scales, runs: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            with StubServer(build_library(scale)) as server:
+                env = child_env(server, workdir)
+                for name, argv in build_scenarios(server.data).items():
+                    reports = [
+                        run_once(server, argv, env, trace=False)
+                        for _ in range(runs)
+                    ]
+                    traced = run_once(server, argv, env, trace=True)
+                    times = [report["seconds"] for report in reports]
+                    results.setdefault(name, {})[str(scale)] = {
+                        "argv": argv[:4],
+                        "runs": runs,
+                        "exit_code": reports[-1]["exit_code"],
+                        "mean_seconds": statistics.mean(times),
+                        "min_seconds": min(times),
+                        "api_calls": reports[-1]["api_calls"],
+                        "api_calls_by_endpoint": reports[-1][
+                            "api_calls_by_endpoint"
+                        ],
+                        "peak_rss_kb": max(r["peak_rss_kb"] for r in reports),
+                        "peak_allocated_bytes": traced["peak_allocated_bytes"],
+                    }
+    return results
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> list:
+    """
+    Returns a line per metric that regressed from 'baseline' to 'results'.
+    Timing and memory regress when they grow by more than 'threshold' (a fraction), API calls on any growth.
+    """
+    regressions = []
+    for name, by_scale in sorted(results.items()):
+        for scale, result in sorted(by_scale.items(), key=lambda kv: int(kv[0])):
+            base = baseline.get(name, {}).get(scale)
+            if base is None:
+                continue
+            for metric, strict in METRICS.items():
+                old, new = base.get(metric), result.get(metric)
+                if old is None or new is None:
+                    continue
+                limit = old if strict else old * (1 + threshold)
+                if new > limit:
+                    change = f"+{(new - old) / old:.0%}" if old else "new"
+                    regressions.append(
+                        f"{name} @ {scale}: {metric} {old:.6g} -> {new:.6g} ({change})"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scales",
+        default=",".join(str(scale) for scale in DEFAULT_SCALES),
+        help="Comma seperated library sizes",
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write results to this file as well")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "RESULTS"),
+        help="Compare two result files instead of running",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Growth in time or memory, as a fraction, that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        files = []
+        for path in args.compare:
+            with open(path) as result_file:
+                files.append(json.load(result_file))
+        regressions = compare(*files, args.threshold)
+        for line in regressions:
+            print(line)
+        print(f"{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = run(scales, args.runs)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
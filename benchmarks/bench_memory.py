@@ -0,0 +1,182 @@
+"""
+Item memory benchmark.
+
+Lists a library of saved tracks with retrieve_all, holding every Track in memory like 'list -A' used to,
+twice: with the compact Track (only the printed fields, in slots) and with a Track that also keeps its
+raw info, which is what every Track held before. Pages are decoded from JSON shaped like the real API's
+(available markets, images, nested album and artists), so every item gets its own objects, as it does
+when spotipy decodes a response. Each mode runs in a fresh interpreter, and reports its peak RSS.
+
+Usage:
+    python -m benchmarks.bench_memory [--tracks N] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from cli.facade.items import Track
+
+# Markets a typical track is available in, the real list has about 185 codes
+MARKETS = [f"{a}{b}" for a in "ABCDEFGHIJKLM" for b in "ABCDEFGHIJKLMN"][:185]
+PAGE_LIMIT = 50
+
+
+class RawTrack(Track):
+    """A Track that keeps its raw info too, like Track did before it kept only its printed fields"""
+
+    def __init__(self, sp, item_id: str, info=None):
+        super().__init__(sp, item_id, info)
+        self.raw_info = info
+
+
+def api_track(i: int) -> dict:
+    """A saved track, shaped like the API's"""
+
+    def images(kind: str, item_id: str) -> list:
+        return [
+            {
+                "height": size,
+                "width": size,
+                "url": f"https://i.scdn.co/{kind}/{item_id}/{size}",
+            }
+            for size in (640, 300, 64)
+        ]
+
+    def simple(kind: str, item_id: str, name: str) -> dict:
+        return {
+            "external_urls": {
+                "spotify": f"https://open.spotify.com/{kind}/{item_id}"
+            },
+            "href": f"https://api.spotify.com/v1/{kind}s/{item_id}",
+            "id": item_id,
+            "name": name,
+            "type": kind,
+            "uri": f"spotify:{kind}:{item_id}",
+        }
+
+    track_id, album_id, artist_id = (
+        f"tr{i:020d}",
+        f"al{i // 10:020d}",
+        f"ar{i // 50:020d}",
+    )
+    artists = [simple("artist", artist_id, f"Artist {i // 50}")]
+    album = dict(
+        simple("album", album_id, f"Album {i // 10}"),
+        album_type="album",
+        artists=artists,
+        available_markets=MARKETS,
+        images=images("album", album_id),
+        release_date="2000-01-01",
+        release_date_precision="day",
+        total_tracks=10,
+    )
+    track = dict(
+        simple("track", track_id, f"Track {i}"),
+        album=album,
+        artists=artists,
+        available_markets=MARKETS,
+        disc_number=1,
+        duration_ms=200000 + i,
+        explicit=False,
+        external_ids={"isrc": f"US{i:010d}"},
+        is_local=False,
+        popularity=i % 100,
+        preview_url=f"https://p.scdn.co/mp3-preview/{track_id}",
+        track_number=i % 10 + 1,
+    )
+    return {"added_at": "2000-01-01T00:00:00Z", "track": track}
+
+
+class PagedSpotipy:
+    """Serves saved tracks a page at a time, decoding every page from JSON like spotipy does"""
+
+    def __init__(self, total: int):
+        self.total = total
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        end = min(offset + limit, self.total)
+        page = {
+            "items": [api_track(i) for i in range(offset, end)],
+            "limit": limit,
+            "offset": offset,
+            "total": self.total,
+            "next": "next" if end < self.total else None,
+        }
+        return json.loads(json.dumps(page))
+
+    def track(self, track_id):
+        return None
+
+
+# Runs inside the child interpreter. Reports back on the last line of stdout.
+BOOTSTRAP = """
+import json, resource, sys, time
+import cli.facade.user_libary as user_libary
+from benchmarks.bench_memory import PAGE_LIMIT, PagedSpotipy, RawTrack
+
+mode, total = sys.argv[1], int(sys.argv[2])
+if mode == "raw":
+    user_libary.Track = RawTrack
+
+start = time.perf_counter()
+collection = user_libary.SavedTracks(PagedSpotipy(total))
+collection.concurrency = 1
+tracks = collection.items(limit=PAGE_LIMIT, retrieve_all=True)
+seconds = time.perf_counter() - start
+
+peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                peak_rss_kb = int(line.split()[1])
+except OSError:
+    pass
+print(json.dumps({"items": len(tracks), "seconds": seconds, "peak_rss_kb": peak_rss_kb}))
+"""
+
+MODES = ("raw", "compact")
+
+
+def run_mode(mode: str, tracks: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-c", BOOTSTRAP, mode, str(tracks)],
+        cwd=root,
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(tracks: int) -> dict:
+    results = {mode: run_mode(mode, tracks) for mode in MODES}
+    raw, compact = (
+        results["raw"]["peak_rss_kb"],
+        results["compact"]["peak_rss_kb"],
+    )
+    results["peak_rss_saved_kb"] = raw - compact
+    results["peak_rss_saved_fraction"] = (raw - compact) / raw
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tracks", type=int, default=50000)
+    parser.add_argument("--output", help="Write results to this file as well")
+    args = parser.parse_args()
+
+    results = run(args.tracks)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
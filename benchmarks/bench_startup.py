@@ -0,0 +1,121 @@
+"""
+Startup benchmark for the CLI.
+
+Times cold invocations (a fresh interpreter each run) of paths that should never reach spotify:
+'--help', a command's help, and commands with bad arguments. Each run blocks the network and
+records any connection attempts, and which of the heavier modules got imported.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "help": ["--help"],
+    "command_help": ["edit", "add", "--help"],
+    "no_ids": ["follow", "playlist"],
+    "bad_option_value": ["list", "track", "--limit", "not_a_number"],
+}
+
+HEAVY_MODULES = ["spotipy", "requests", "decouple", "cli.facade.spotipy_facade"]
+
+# Runs inside the child interpreter. Reports back on the last line of stderr.
+BOOTSTRAP = """
+import json, runpy, socket, sys
+
+connections = []
+
+def refuse(*args, **kwargs):
+    connections.append(repr(args[1:]))
+    raise OSError("network disabled by startup benchmark")
+
+socket.socket.connect = refuse
+socket.socket.connect_ex = refuse
+socket.create_connection = refuse
+
+argv, heavy_modules = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+sys.argv = ["spotify-cli"] + argv
+exit_code = 0
+try:
+    runpy.run_module("cli.spotify_cli", run_name="__main__")
+except SystemExit as e:
+    exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+
+report = {
+    "exit_code": exit_code,
+    "connections": connections,
+    "heavy_modules": [name for name in heavy_modules if name in sys.modules],
+}
+sys.stderr.write("\\n" + json.dumps(report) + "\\n")
+"""
+
+
+def run_once(argv: list) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            BOOTSTRAP,
+            json.dumps(argv),
+            json.dumps(HEAVY_MODULES),
+        ],
+        cwd=root,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    report = json.loads(proc.stderr.strip().splitlines()[-1])
+    report["seconds"] = seconds
+    return report
+
+
+def run(runs: int) -> dict:
+    results = {}
+    for name, argv in SCENARIOS.items():
+        reports = [run_once(argv) for _ in range(runs)]
+        times = [report["seconds"] for report in reports]
+        results[name] = {
+            "argv": argv,
+            "runs": runs,
+            "exit_code": reports[-1]["exit_code"],
+            "mean_seconds": statistics.mean(times),
+            "min_seconds": min(times),
+            "max_seconds": max(times),
+            "network_connections": sum(len(r["connections"]) for r in reports),
+            "heavy_modules_imported": sorted(
+                {name for r in reports for name in r["heavy_modules"]}
+            ),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write results to this file as well")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+    # Fail if any path that should stay offline touched the network
+    if any(result["network_connections"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+HTTP transport benchmark.
+
+Runs the same burst of concurrent requests (like a command fanning out over a large library)
+against the local stub server, through spotipy configured three ways: without a session
+(a new connection per request), with the session spotipy builds itself, and with the facade's
+Transport. Reports the TCP handshakes the server saw, wall time, and bytes on the wire.
+
+Usage:
+    python -m benchmarks.bench_transport [--requests N] [--concurrency N] [--runs N] [--output results.json]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import spotipy
+
+from cli.facade.concurrency import ordered_map
+from cli.facade.transport import Transport
+from tests.stub_server import StubServer
+
+
+def build_clients(concurrency: int) -> dict:
+    """Returns a factory per scenario, each factory returns (spotify client, Transport or None)"""
+    return {
+        "no_session": lambda: (
+            spotipy.Spotify(auth="token", requests_session=False),
+            None,
+        ),
+        "spotipy_session": lambda: (spotipy.Spotify(auth="token"), None),
+        "transport": lambda: _transport_client(concurrency),
+    }
+
+
+def _transport_client(concurrency: int):
+    transport = Transport(pool_size=concurrency)
+    return spotipy.Spotify(auth="token", **transport.spotify_kwargs()), transport
+
+
+def run_once(
+    server: StubServer, factory, requests: int, concurrency: int
+) -> dict:
+    sp, transport = factory()
+    sp.prefix = server.prefix
+    server.reset()
+
+    start = time.perf_counter()
+    track_ids = list(server.data.catalog["track"])
+    ids = [track_ids[i % len(track_ids)] for i in range(requests)]
+    for _ in ordered_map(sp.track, ids, concurrency):
+        pass
+    seconds = time.perf_counter() - start
+
+    report = {"seconds": seconds, "handshakes": server.counters["connections"]}
+    if transport is not None:
+        report.update(transport.stats.snapshot())
+        transport.close()
+    return report
+
+
+def run(requests: int, concurrency: int, runs: int) -> dict:
+    results = {}
+    with StubServer() as server:
+        for name, factory in build_clients(concurrency).items():
+            reports = [
+                run_once(server, factory, requests, concurrency)
+                for _ in range(runs)
+            ]
+            times = [report["seconds"] for report in reports]
+            results[name] = {
+                "requests": requests,
+                "concurrency": concurrency,
+                "runs": runs,
+                "mean_seconds": statistics.mean(times),
+                "min_seconds": min(times),
+                "mean_handshakes": statistics.mean(
+                    report["handshakes"] for report in reports
+                ),
+            }
+            if "wire_bytes" in reports[-1]:
+                results[name]["wire_bytes"] = reports[-1]["wire_bytes"]
+                results[name]["decoded_bytes"] = reports[-1]["decoded_bytes"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write results to this file as well")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.concurrency, args.runs)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@ class General:
     item_DNE = "{} with {}: '{}' appears to not exist!"
     op_canceled = "Operation cancelled"
     not_found = "Could not find {} in user's followed items."
+    no_ids = "No IDs given, pass them as arguments or with '--from-file'"
+    no_item = "No {} exists with id: {}"
+    from_file_help = "Read IDs (whitespace or newline seperated) from a file, use '-' to read them from stdin"
 
 
 class Create:
@@ -34,22 +37,22 @@ class Create:
 
 
 class Follow:
-    id_help = "Use id to specify item to follow"
+    id_help = "ID, or list of space seperated IDs of items to follow"
     followed = "Followed {} with name: {}, id: {}"
 
 
 class Save:
-    id_help = "Use id to specify item to save"
+    id_help = "ID, or list of space seperated IDs of items to save"
     saved = "Saved {} with name: {}, id: {}"
 
 
 class Unsave:
-    id_help = "Use id to specify item to unsave"
+    id_help = "ID, or list of space seperated IDs of items to unsave"
     unsaved = "Unsaved {} with name: {}, id: {}"
 
 
 class Unfollow:
-    id_help = "Use id to specify item to unfollow"
+    id_help = "ID, or list of space seperated IDs of items to unfollow"
     # no_prompt_help = (
     #     "Do not prompt user to confirm unfollow. Will be ignored if NAME "
     #     + "is supplied and multiple items exist with the same name.\n"
@@ -68,7 +71,7 @@ class Unfollow:
 
 
 class Search:
-    user_help = "Limit search to just a user's followed items"
+    user_help = "Limit search to just a user's followed items. Matches words, or the start of words, in names, artists, albums, descriptions and publishers"
     limit_help = (
         "The number of items to return (min = 1, default = 10, max = 50)"
     )
@@ -96,6 +99,8 @@ class Listing:
     ret_all_help = (
         "Retrieve all items. If used, this overrides offset and limit."
     )
+    expand_help = "List all the tracks (or episodes) of every album, show or playlist too. Implies --retrieve-all."
+    expanded = "{} item(s) in {}:"
 
 
 class Edit:
@@ -115,6 +120,7 @@ Default is to add to the BACK/END of the playlist, specify 0 to add to the front
 For multiple tracks, takes a list of semi-colon and comma seperated values.
 See help text for '--specific' option on the remove command for list syntax."""
         not_unique = "Track not added as it already exists in the playlist and option '--add-if-unique' was used."
+        from_file_help = "Read track IDs (whitespace or newline seperated) from a file, use '-' to read them from stdin"
 
     class Remove:
         track_ids_help = "Track ID, or list of space seperated track IDs to add to the playlist"
@@ -140,3 +146,63 @@ Providing -1 as the second int tells it to walk to the end of the list.
 By default it walks from the start (0) to the end (-1)
         """
         count_help = "How many occurances of track to remove from the playlist. Can be overridden by '--specific' or '--all'"
+
+    class Dedupe:
+        keep_help = "Keep the last occurance of each track, instead of the first"
+        removed = "Removed {} duplicate track(s) from the playlist."
+
+    class Sync:
+        dry_run_help = "Only print the changes that would be made, without making them"
+        planned = "Would remove {removed}, move {moved} and insert {inserted} track(s), in {requests} request(s)."
+        synced = "Removed {removed}, moved {moved} and inserted {inserted} track(s), in {requests} request(s)."
+
+
+class Cache:
+    help = "Inspect or clear the item metadata cache"
+    disabled = "The item cache is disabled (see ITEM_CACHE in your .env file)"
+    stat = "{}: {}"
+    cleared = "Item cache cleared."
+
+
+class Sync:
+    types_help = "Item types to sync (default: all of them): playlist, album, track, artist, show, episode"
+    full_help = "Walk every item type in full, instead of only fetching what changed since the last sync"
+    mirror_help = "Answer listing and searching your library (and the duplicate name check of 'create') from the local mirror, as of the last 'sync'"
+    synced = "{}s: {} mirrored, {} new"
+    synced_playlists = "playlists: {} mirrored, {} changed"
+    full = " (walked in full)"
+
+
+class Transfer:
+    type_help = "Item type to export. Supported types: playlist, album, track, artist, show, episode"
+    id_help = "ID of a playlist, album or show to export the tracks (or episodes) of, instead of your saved/followed items"
+    output_help = "File to export to (default: print to stdout)"
+    format_help = "ndjson or csv (default: csv if the file name ends with .csv, ndjson otherwise)"
+    path_help = "File to import, as written by 'export', use '-' to read it from stdin"
+    playlist_help = "ID of playlist to add the imported tracks to, instead of saving/following the items in your library"
+    start_help = "Skip this many records, and import the rest"
+    resume_help = "Start after the last record imported by an interrupted import of the same file"
+    resuming = "Starting at record {}"
+    exported = "Exported {} item(s)"
+    imported = "Imported {} item(s)"
+
+
+class Batch:
+    path_help = "File of commands to run, one per line, use '-' to read them from stdin"
+    json_help = "Print each command's result as a line of JSON, with its output and exit code"
+    concurrency_help = "How many read only commands ('list', 'search') to run at once (default: MAX_CONCURRENCY)"
+    result = "[{}] exit {}: {}"
+    summary = "{} command(s) run, {} failed"
+    unparsable = "Could not parse the command (unbalanced quotes?)"
+
+
+class Daemon:
+    socket_help = "Unix socket to listen on (default: SPOTIFY_CLI_SOCKET, or .spotify-cli.sock)"
+    idle_help = "Seconds without a connected client before the daemon exits, 0 to never exit"
+    running = "A daemon is already listening on {}"
+
+
+class Stats:
+    help = "When the command finishes, print request, connection reuse and throttling counters to stderr"
+    header = "HTTP stats:"
+    stat = "{}: {}"
@@ -0,0 +1,222 @@
+"""
+This module contains the batch runner: many commands, one per line, run in a single process.
+
+Every command runs against the same facade, so the start up, authorization and connections are paid for once.
+Runs of consecutive read only commands ('list' and 'search') are run at once, and runs of consecutive
+'save', 'unsave', 'follow' and 'unfollow --no-prompt' lines of the same item type are merged, so their items
+are requested and added or removed in bulk. Any other command runs by itself, after every line before it has
+finished, so each line still sees the effects of the lines before it. Results come back in the order of the lines.
+"""
+import io
+import shlex
+import traceback
+from itertools import groupby
+from typing import Iterable, Iterator, List, NamedTuple
+
+from cli.app_strings import Batch, Follow, General, Save, Unfollow, Unsave
+from cli.client import command_name
+from cli.daemon import routed_streams, run_command
+from cli.facade.concurrency import ordered_map
+
+# Commands that don't change anything, so can run alongside each other
+READ_ONLY_COMMANDS = {"list", "search"}
+# For each command that can be merged, the name of the collection method it calls, and its message per item
+MERGEABLE_COMMANDS = {
+    "save": (
+        "add_many",
+        lambda item: Save.saved.format(item.type, item.name, item.id),
+    ),
+    "follow": (
+        "add_many",
+        lambda item: Follow.followed.format(item.type, item.name, item.id),
+    ),
+    "unsave": (
+        "remove_many",
+        lambda item: Unsave.unsaved.format(item.type, item.name, item.id),
+    ),
+    "unfollow": (
+        "remove_many",
+        lambda item: Unfollow.unfollowed_item.format(item.name, item.id),
+    ),
+}
+# The most IDs merged into a single step, so results keep coming while a long run of lines is worked through
+MERGE_LIMIT = 1000
+
+
+class Line(NamedTuple):
+    number: int
+    text: str
+    argv: List[str]
+
+
+class Result(NamedTuple):
+    """What running a line did. Its fields are also the keys of the JSON output of 'batch --json'"""
+
+    line: int
+    command: str
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+class Step(NamedTuple):
+    """One or more lines run together. 'merge' is the (command, item type) of merged lines, None for a single line"""
+
+    lines: List[Line]
+    merge: tuple = None
+
+    @property
+    def concurrent(self) -> bool:
+        return (
+            self.merge is None
+            and command_name(self.lines[0].argv) in READ_ONLY_COMMANDS
+        )
+
+
+def read_lines(file) -> Iterator[Line]:
+    """Lazily parse each line of 'file' into a command, skipping blank lines and '#' comments"""
+    for number, text in enumerate(file, 1):
+        text = text.strip()
+        if text == "" or text.startswith("#"):
+            continue
+        try:
+            argv = shlex.split(text)
+        except ValueError:
+            argv = None  # Can't be parsed, which it reports when run
+        yield Line(number, text, argv)
+
+
+def merge_key(line: Line, spot) -> tuple:
+    """(command, long item type) if 'line' can be merged with others, otherwise None"""
+    argv = line.argv
+    if argv is None or len(argv) < 3 or argv[0] not in MERGEABLE_COMMANDS:
+        return None
+    item_ids = argv[2:]
+    if argv[0] == "unfollow":
+        # Lines that prompt need to run on their own
+        if "-n" not in item_ids and "--no-prompt" not in item_ids:
+            return None
+        item_ids = [arg for arg in item_ids if arg not in ("-n", "--no-prompt")]
+    if len(item_ids) == 0 or any(arg.startswith("-") for arg in item_ids):
+        return None
+    # Lines with an unknown type run on their own, to fail like they would outside a batch
+    if argv[1] not in spot.types:
+        return None
+    return argv[0], spot.elongate(argv[1])
+
+
+def line_ids(line: Line) -> List[str]:
+    return [arg for arg in line.argv[2:] if not arg.startswith("-")]
+
+
+def plan_steps(lines: Iterable[Line], spot) -> Iterator[Step]:
+    """Lazily group 'lines' into steps, merging consecutive mergeable lines with the same command and item type"""
+    pending, pending_key, pending_ids = [], None, 0
+    for line in lines:
+        key = merge_key(line, spot)
+        if pending and (key != pending_key or pending_ids >= MERGE_LIMIT):
+            yield Step(pending, pending_key)
+            pending, pending_ids = [], 0
+        if key is None:
+            yield Step([line])
+            continue
+        pending.append(line)
+        pending_key = key
+        pending_ids += len(line_ids(line))
+    if pending:
+        yield Step(pending, pending_key)
+
+
+class BatchRunner:
+    """Runs the steps of a batch with 'command' (the click command of the app) against the facade 'spot'"""
+
+    def __init__(self, command, spot, routers):
+        self.command = command
+        self.spot = spot
+        self.routers = routers
+
+    def capture(self, func, *args):
+        """
+        Call func(*args) with this thread's stdout and stderr captured, and stdin empty
+        (so prompts are answered with the default). Returns (func's result, stdout, stderr)
+        """
+        out, err = io.StringIO(), io.StringIO()
+        for router, stream in zip(self.routers, (out, err, io.StringIO())):
+            router.route(stream)
+        try:
+            result = func(*args)
+        finally:
+            for router in self.routers:
+                router.route(None)
+        return result, out.getvalue(), err.getvalue()
+
+    def run_line(self, line: Line) -> Result:
+        if line.argv is None:
+            return Result(
+                line.number, line.text, 2, "", Batch.unparsable + "\n"
+            )
+        exit_code, out, err = self.capture(run_command, self.command, line.argv)
+        return Result(line.number, line.text, exit_code, out, err)
+
+    def run_merged(self, step: Step) -> List[Result]:
+        """
+        Run the merged lines of 'step' with one bulk lookup and one bulk add or remove,
+        then give each line the output and exit code it would have had on its own
+        """
+        command, item_type = step.merge
+        method, message = MERGEABLE_COMMANDS[command]
+        item_ids = [i for line in step.lines for i in line_ids(line)]
+        try:
+            collection = self.spot.get_collection(item_type)
+            found = self.spot.get_items(
+                item_type, list(dict.fromkeys(item_ids))
+            )
+            items = {item.id: item for item in found if item is not None}
+            getattr(collection, method)(list(items.values()))
+            self.spot.library_changed(item_type)
+        except Exception:
+            error = traceback.format_exc()
+            return [
+                Result(line.number, line.text, 1, "", error)
+                for line in step.lines
+            ]
+
+        results = []
+        for line in step.lines:
+            ids = line_ids(line)
+            missing = [i for i in ids if i not in items]
+            out = [General.no_item.format(line.argv[1], i) for i in missing]
+            out += [message(items[i]) for i in ids if i in items]
+            if command == "unfollow" and len(missing) == len(ids):
+                out.append(General.op_canceled)
+            exit_code = 0 if len(missing) == 0 else 1
+            stdout = "".join(text + "\n" for text in out)
+            results.append(
+                Result(line.number, line.text, exit_code, stdout, "")
+            )
+        return results
+
+    def run_step(self, step: Step) -> List[Result]:
+        if step.merge is not None:
+            return self.run_merged(step)
+        return [self.run_line(step.lines[0])]
+
+    def run(self, steps: Iterable[Step], concurrency: int) -> Iterator[Result]:
+        """Lazily run 'steps', yielding the result of every line in order"""
+        for concurrent, group in groupby(
+            steps, key=lambda step: step.concurrent
+        ):
+            if concurrent:
+                step_results = ordered_map(self.run_step, group, concurrency)
+            else:
+                step_results = map(self.run_step, group)
+            for results in step_results:
+                yield from results
+
+
+def run_batch(command, spot, file, concurrency: int) -> Iterator[Result]:
+    """Lazily run the commands read from 'file', yielding a Result per command, in order"""
+    with routed_streams() as routers:
+        runner = BatchRunner(command, spot, routers)
+        steps = plan_steps(read_lines(file), spot)
+        yield from runner.run(steps, concurrency)
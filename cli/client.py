@@ -0,0 +1,157 @@
+"""
+A thin client for the spotify-cli daemon (see cli/daemon.py).
+
+Sends its arguments (and stdin, when it is piped) to the daemon over a unix domain socket, and relays the
+command's output, prompts and exit code back, so an invocation only costs starting this small script and the
+requests the command sends, instead of importing, authorizing and connecting to spotify all over again.
+If no daemon is listening, one is started in the background. If that fails, the command runs in this process.
+
+Usage:
+    python -m cli.client COMMAND [ARGS]...
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# The daemon's socket, relative to the directory it serves (which is where .env and the caches are read from)
+SOCKET_PATH = os.environ.get("SPOTIFY_CLI_SOCKET", ".spotify-cli.sock")
+# Seconds to wait for a daemon started by the client to start listening
+START_TIMEOUT = 10.0
+# Commands that always run in the client's own process
+LOCAL_COMMANDS = {"daemon"}
+
+
+def command_name(argv: list) -> str:
+    """The command 'argv' runs, after any global options (which are all flags)"""
+    for arg in argv or []:
+        if not arg.startswith("-"):
+            return arg
+    return None
+
+
+def send(sock_file, message: dict):
+    """Send a single message, as a line of JSON"""
+    sock_file.write(json.dumps(message).encode() + b"\n")
+    sock_file.flush()
+
+
+def receive(sock_file) -> dict:
+    """Read a single message, None if the other end hung up"""
+    line = sock_file.readline()
+    return None if not line else json.loads(line)
+
+
+def connect(path: str) -> socket.socket:
+    """A socket connected to the daemon at 'path', None if no daemon is listening there"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def start_daemon(path: str) -> socket.socket:
+    """Start a daemon listening at 'path' in the background, and connect to it. Returns None if it didn't start"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [root, env.get("PYTHONPATH")])
+    )
+    subprocess.Popen(
+        [sys.executable, "-m", "cli.spotify_cli", "daemon", "--socket", path],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        sock = connect(path)
+        if sock is not None:
+            return sock
+        time.sleep(0.05)
+    return None
+
+
+def run(
+    argv: list,
+    path: str = SOCKET_PATH,
+    stdin=None,
+    stdout=None,
+    stderr=None,
+    autostart=True,
+) -> int:
+    """
+    Run a command (argv, without the program name) on the daemon at 'path', starting one if 'autostart' is set
+    and none is listening. Returns the command's exit code, or None if there is no daemon to run it on
+    (or the daemon serves another directory).
+
+    Like the CLI itself, piped stdin supplies more arguments, unless an argument is '-' (read IDs from stdin)
+    or the command is 'batch' (which reads commands from stdin), in which case all of stdin is sent along.
+    Otherwise stdin is only read to answer the command's prompts. Nothing is read before the daemon agreed
+    to run the command, so a command it refuses can still run elsewhere with all of its input.
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+
+    sock = connect(path)
+    if sock is None and autostart:
+        sock = start_daemon(path)
+    if sock is None:
+        return None
+
+    with sock, sock.makefile("rwb") as sock_file:
+        send(sock_file, {"cwd": os.getcwd()})
+        reply = receive(sock_file)
+        if reply is None or "refused" in reply:
+            return None
+
+        piped = None
+        if not stdin.isatty():
+            if "-" in argv or command_name(argv) == "batch":
+                piped = stdin.read()
+            else:
+                arguments = stdin.readline().rstrip("\n").split(" ")
+                argv = argv + [arg for arg in arguments if arg != ""]
+
+        send(sock_file, {"argv": argv, "stdin": piped})
+        while True:
+            message = receive(sock_file)
+            if message is None:
+                stderr.write("The spotify-cli daemon hung up\n")
+                return 1
+            if "out" in message:
+                stdout.write(message["out"])
+                stdout.flush()
+            elif "err" in message:
+                stderr.write(message["err"])
+                stderr.flush()
+            elif "input" in message:
+                send(sock_file, {"line": stdin.readline()})
+            elif "exit" in message:
+                return message["exit"]
+
+
+def main():
+    argv = sys.argv[1:]
+    exit_code = None
+    if len(argv) == 0 or argv[0] not in LOCAL_COMMANDS:
+        exit_code = run(argv)
+    if exit_code is None:
+        import runpy
+
+        sys.argv = ["spotify-cli"] + argv
+        runpy.run_module("cli.spotify_cli", run_name="__main__")
+        return
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+This module contains the spotify-cli daemon: a resident process that runs commands sent by cli/client.py.
+
+It keeps one facade for its whole life, so the imports, the access token, the open connections to spotify,
+the item cache and the library mirror are all set up once, instead of by every invocation. Each client gets
+a thread of its own, with its own stdout, stderr and stdin (see StreamRouter), so clients can run commands
+at once. The daemon exits once no client has been connected for 'idle_timeout' seconds.
+
+Messages are lines of JSON. The client sends {"cwd": path}, and is answered with {"accepted": true}, or with
+{"refused": path} if it is in another directory. Only then does it read its stdin, and send
+{"argv": [...], "stdin": text or null}. The daemon sends any number of {"out": text}, {"err": text} and
+{"input": true} (answered by the client with {"line": text}), and finally {"exit": code}.
+"""
+import io
+import os
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from cli.client import SOCKET_PATH, connect, receive, send
+
+# Seconds without a connected client before the daemon exits
+IDLE_TIMEOUT = 600.0
+# How often the idle timeout is checked, at most
+IDLE_POLL = 1.0
+
+
+class StreamRouter(io.TextIOBase):
+    """
+    Stands in for sys.stdout, sys.stderr or sys.stdin. Reads and writes go to the stream
+    the current thread routed them to, or to the original stream if it didn't.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, "target", self.default)
+
+    def route(self, target):
+        """Send this thread's reads and writes to 'target', None to send them back to the original stream"""
+        self._local.target = self.default if target is None else target
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def isatty(self):
+        return False
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return self.target.write(text)
+
+    def flush(self):
+        self.target.flush()
+
+    def read(self, size=-1):
+        return self.target.read(size)
+
+    def readline(self, size=-1):
+        return self.target.readline(size)
+
+
+class ClientOutput(io.TextIOBase):
+    """A client's stdout or stderr ('key' is "out" or "err"), sent to it a write at a time"""
+
+    def __init__(self, handler, key: str):
+        self.handler = handler
+        self.key = key
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        # Refused like a text file would, which is how click tells text streams from binary ones
+        if not isinstance(text, str):
+            raise TypeError(
+                f"write() argument must be str, not {type(text).__name__}"
+            )
+        if text:
+            self.handler.message({self.key: text})
+        return len(text)
+
+
+class ClientInput(io.TextIOBase):
+    """
+    A client's stdin: the text it piped in, or if it didn't pipe anything,
+    lines asked for from the client one at a time (e.g. to answer a prompt)
+    """
+
+    def __init__(self, handler, piped: str = None):
+        self.handler = handler
+        self.piped = None if piped is None else io.StringIO(piped)
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        if self.piped is not None:
+            return self.piped.readline(size)
+        return self.handler.ask()
+
+    def read(self, size=-1):
+        if self.piped is not None:
+            return self.piped.read(size)
+        lines = []
+        for line in iter(self.handler.ask, ""):
+            lines.append(line)
+        return "".join(lines)
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Runs the command a client sent, with the client as its stdout, stderr and stdin"""
+
+    def setup(self):
+        super().setup()
+        self.lock = threading.Lock()
+        self.server.connected(1)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.server.connected(-1)
+
+    def message(self, message: dict):
+        with self.lock:
+            send(self.wfile, message)
+
+    def ask(self) -> str:
+        """A line of the client's stdin, "" once it has ended"""
+        self.message({"input": True})
+        reply = receive(self.rfile)
+        return "" if reply is None else reply.get("line", "")
+
+    def handle(self):
+        hello = receive(self.rfile)
+        if hello is None:
+            return
+        # Relative paths (and .env) are resolved against the daemon's directory, so it only serves clients in it
+        if hello.get("cwd", os.getcwd()) != os.getcwd():
+            self.message({"refused": os.getcwd()})
+            return
+        self.message({"accepted": True})
+        request = receive(self.rfile)
+        if request is None:
+            return
+        streams = (
+            ClientOutput(self, "out"),
+            ClientOutput(self, "err"),
+            ClientInput(self, request.get("stdin")),
+        )
+        routers = self.server.routers
+        for router, stream in zip(routers, streams):
+            router.route(stream)
+        try:
+            exit_code = run_command(self.server.command, request["argv"])
+            self.message({"exit": exit_code})
+        except OSError:
+            pass  # The client hung up before the command finished
+        finally:
+            for router in routers:
+                router.route(None)
+
+
+def run_command(command, argv: list) -> int:
+    """Run 'argv' (without the program name) with 'command' (a click command) and return its exit code"""
+    try:
+        command.main(args=argv, prog_name="spotify-cli", standalone_mode=True)
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            return e.code
+        return 0 if e.code is None else 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+@contextmanager
+def routed_streams():
+    """Stand StreamRouters in for sys.stdout, sys.stderr and sys.stdin while in the block. Yields the routers"""
+    streams = (sys.stdout, sys.stderr, sys.stdin)
+    # Already routed, e.g. a batch run by the daemon
+    if all(isinstance(stream, StreamRouter) for stream in streams):
+        yield streams
+        return
+    routers = tuple(StreamRouter(stream) for stream in streams)
+    sys.stdout, sys.stderr, sys.stdin = routers
+    try:
+        yield routers
+    finally:
+        sys.stdout, sys.stderr, sys.stdin = streams
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a thread per client, and tracks how long it has been since one was connected"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, command):
+        super().__init__(path, CommandHandler)
+        self.command = command
+        # The stand-ins for sys.stdout, sys.stderr and sys.stdin, while serving
+        self.routers = ()
+        self._clients = 0
+        self._idle_since = time.monotonic()
+        self._lock = threading.Lock()
+
+    def connected(self, change: int):
+        with self._lock:
+            self._clients += change
+            self._idle_since = time.monotonic()
+
+    def idle_for(self) -> float:
+        """Seconds since the last client disconnected, 0 while any is connected"""
+        with self._lock:
+            if self._clients > 0:
+                return 0.0
+            return time.monotonic() - self._idle_since
+
+
+def watch_idle(server: DaemonServer, idle_timeout: float, stopped):
+    """Shut 'server' down once it has been idle for 'idle_timeout' seconds"""
+    poll = min(IDLE_POLL, idle_timeout)
+    while not stopped.wait(poll):
+        if server.idle_for() >= idle_timeout:
+            server.shutdown()
+            return
+
+
+def serve(
+    app,
+    path: str = SOCKET_PATH,
+    idle_timeout: float = IDLE_TIMEOUT,
+    ready=None,
+) -> bool:
+    """
+    Serve the commands of 'app' (a typer app) on the unix socket at 'path' until idle for 'idle_timeout'
+    seconds (0 to serve forever). Sets the 'ready' event, if given, once listening.
+    Returns False without serving if another daemon is already listening on 'path'.
+    """
+    import typer
+
+    running = connect(path)
+    if running is not None:
+        running.close()
+        return False
+    # Left behind by a daemon that didn't shut down cleanly
+    if os.path.exists(path):
+        os.unlink(path)
+
+    # Only the user running the daemon gets to send it commands
+    umask = os.umask(0o177)
+    try:
+        server = DaemonServer(path, typer.main.get_command(app))
+    finally:
+        os.umask(umask)
+
+    stopped = threading.Event()
+    if idle_timeout > 0:
+        threading.Thread(
+            target=watch_idle,
+            args=(server, idle_timeout, stopped),
+            daemon=True,
+        ).start()
+    try:
+        with routed_streams() as server.routers:
+            if ready is not None:
+                ready.set()
+            server.serve_forever(poll_interval=0.1)
+    finally:
+        stopped.set()
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return True
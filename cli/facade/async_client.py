@@ -0,0 +1,350 @@
+"""
+This module contains an asyncio Spotify Web API client, built on the connection pool in async_http.py.
+Its methods mirror the names, arguments and return values of the spotipy.Spotify methods the facade uses,
+so async collections read like their synchronous counterparts. The exception is the library endpoints,
+which spotipy wraps once per item type, those get one method taking the item type.
+"""
+
+import asyncio
+import json
+import time
+from typing import List
+
+from spotipy import SpotifyException
+
+from cli.facade.async_http import ConnectionPool
+from cli.facade.concurrency import DEFAULT_CONCURRENCY
+from cli.facade.rate_limit import RateLimiter
+from cli.facade.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+# Tokens are refreshed this many seconds before they expire
+TOKEN_MARGIN = 60
+
+
+class AsyncSpotify:
+    """
+    A minimal async Spotify client.
+
+    auth: Optional, a static access token. Otherwise tokens come from 'auth_manager'
+        (e.g. a SpotifyOAuth), which is run in a worker thread as it may block.
+    concurrency: Size of the connection pool.
+    limiter: Optional, a RateLimiter requests are scheduled through, which also retries 429s and 5xx responses.
+    prefix: Base url of the API, point it at a stub server for testing.
+    """
+
+    prefix = "https://api.spotify.com/v1/"
+
+    def __init__(
+        self,
+        auth: str = None,
+        auth_manager=None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        limiter: RateLimiter = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        gzip: bool = True,
+        prefix: str = None,
+    ):
+        self.auth_manager = auth_manager
+        self.limiter = limiter
+        if prefix is not None:
+            self.prefix = prefix
+        self._token = auth
+        self._token_expires_at = float("inf") if auth is not None else 0
+        self._token_lock = asyncio.Lock()
+        self.pool = ConnectionPool(
+            concurrency,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip=gzip,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.pool.aclose()
+
+    async def _auth_headers(self) -> dict:
+        async with self._token_lock:
+            if time.time() >= self._token_expires_at - TOKEN_MARGIN:
+                self._token = await asyncio.to_thread(
+                    self.auth_manager.get_access_token, as_dict=False
+                )
+                cached = self.auth_manager.cache_handler.get_cached_token()
+                self._token_expires_at = (cached or {}).get(
+                    "expires_at", time.time() + TOKEN_MARGIN * 2
+                )
+        return {"Authorization": f"Bearer {self._token}"}
+
+    async def _call(self, method: str, url: str, payload=None, **params):
+        if not url.startswith("http"):
+            url = self.prefix + url
+        params = {k: v for k, v in params.items() if v is not None}
+        headers = await self._auth_headers()
+        content = None
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+            content = json.dumps(payload).encode()
+
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                wait = self.limiter.reserve(url)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            response = await self.pool.request(
+                method, url, params=params, headers=headers, content=content
+            )
+            delay = None
+            if self.limiter is not None:
+                delay = self.limiter.retry_delay(response, attempt, method)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if response.status_code >= 400:
+            try:
+                error = response.json()["error"]
+                msg, reason = error.get("message"), error.get("reason")
+            except (ValueError, KeyError, TypeError):
+                msg, reason = response.text or None, None
+            raise SpotifyException(
+                response.status_code,
+                -1,
+                f"{response.url}:\n {msg}",
+                reason=reason,
+                headers=response.headers,
+            )
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    async def _get(self, url: str, **params):
+        return await self._call("GET", url, **params)
+
+    @staticmethod
+    def _get_id(item_type: str, item_id: str) -> str:
+        if item_id.startswith("spotify:"):
+            return item_id.split(":")[2]
+        return item_id
+
+    @staticmethod
+    def _get_uri(item_type: str, item_id: str) -> str:
+        if item_id.startswith("spotify:"):
+            return item_id
+        return f"spotify:{item_type}:{item_id}"
+
+    def _uris(self, item_type: str, item_ids: List[str]) -> str:
+        return ",".join(self._get_uri(item_type, i) for i in item_ids)
+
+    def _ids(self, item_type: str, item_ids: List[str]) -> str:
+        return ",".join(self._get_id(item_type, i) for i in item_ids)
+
+    # ============================== Catalog ==================================#
+    async def me(self):
+        return await self._get("me/")
+
+    async def track(self, track_id, market=None):
+        return await self._get(
+            "tracks/" + self._get_id("track", track_id), market=market
+        )
+
+    async def tracks(self, tracks, market=None):
+        return await self._get(
+            "tracks/", ids=self._ids("track", tracks), market=market
+        )
+
+    async def album(self, album_id, market=None):
+        return await self._get(
+            "albums/" + self._get_id("album", album_id), market=market
+        )
+
+    async def albums(self, albums, market=None):
+        return await self._get(
+            "albums/", ids=self._ids("album", albums), market=market
+        )
+
+    async def album_tracks(self, album_id, limit=50, offset=0, market=None):
+        return await self._get(
+            f"albums/{self._get_id('album', album_id)}/tracks/",
+            limit=limit,
+            offset=offset,
+            market=market,
+        )
+
+    async def artist(self, artist_id):
+        return await self._get("artists/" + self._get_id("artist", artist_id))
+
+    async def artists(self, artists):
+        return await self._get("artists/", ids=self._ids("artist", artists))
+
+    async def episode(self, episode_id, market=None):
+        return await self._get(
+            "episodes/" + self._get_id("episode", episode_id), market=market
+        )
+
+    async def episodes(self, episodes, market=None):
+        return await self._get(
+            "episodes/", ids=self._ids("episode", episodes), market=market
+        )
+
+    async def show(self, show_id, market=None):
+        return await self._get(
+            "shows/" + self._get_id("show", show_id), market=market
+        )
+
+    async def shows(self, shows, market=None):
+        return await self._get(
+            "shows/", ids=self._ids("show", shows), market=market
+        )
+
+    async def show_episodes(self, show_id, limit=50, offset=0, market=None):
+        return await self._get(
+            f"shows/{self._get_id('show', show_id)}/episodes/",
+            limit=limit,
+            offset=offset,
+            market=market,
+        )
+
+    async def search(self, q, limit=10, offset=0, type="track", market=None):
+        return await self._get(
+            "search", q=q, limit=limit, offset=offset, type=type, market=market
+        )
+
+    # ============================== Library ==================================#
+    async def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        return await self._get(
+            "me/tracks", limit=limit, offset=offset, market=market
+        )
+
+    async def current_user_saved_albums(self, limit=20, offset=0, market=None):
+        return await self._get(
+            "me/albums", limit=limit, offset=offset, market=market
+        )
+
+    async def current_user_saved_shows(self, limit=20, offset=0, market=None):
+        return await self._get(
+            "me/shows", limit=limit, offset=offset, market=market
+        )
+
+    async def current_user_saved_episodes(
+        self, limit=20, offset=0, market=None
+    ):
+        return await self._get(
+            "me/episodes", limit=limit, offset=offset, market=market
+        )
+
+    async def current_user_followed_artists(self, limit=20, after=None):
+        return await self._get(
+            "me/following", type="artist", limit=limit, after=after
+        )
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        return await self._get("me/playlists", limit=limit, offset=offset)
+
+    async def library_contains(self, item_type: str, item_ids: List[str]):
+        """Check which of the items are saved/followed, for any item type"""
+        return await self._get(
+            "me/library/contains", uris=self._uris(item_type, item_ids)
+        )
+
+    async def library_add(self, item_type: str, item_ids: List[str]):
+        """Save/follow the items, for any item type"""
+        return await self._call(
+            "PUT", "me/library", uris=self._uris(item_type, item_ids)
+        )
+
+    async def library_delete(self, item_type: str, item_ids: List[str]):
+        """Unsave/unfollow the items, for any item type but playlists"""
+        return await self._call(
+            "DELETE", "me/library", uris=self._uris(item_type, item_ids)
+        )
+
+    async def current_user_unfollow_playlist(self, playlist_id):
+        return await self._call(
+            "DELETE",
+            f"playlists/{self._get_id('playlist', playlist_id)}/followers",
+        )
+
+    # ============================= Playlists =================================#
+    async def playlist(self, playlist_id, fields=None, market=None):
+        return await self._get(
+            f"playlists/{self._get_id('playlist', playlist_id)}",
+            fields=fields,
+            market=market,
+            additional_types="track",
+        )
+
+    async def playlist_items(
+        self, playlist_id, fields=None, limit=100, offset=0, market=None
+    ):
+        return await self._get(
+            f"playlists/{self._get_id('playlist', playlist_id)}/items",
+            fields=fields,
+            limit=limit,
+            offset=offset,
+            market=market,
+            additional_types="track",
+        )
+
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        return await self._call(
+            "POST",
+            f"playlists/{self._get_id('playlist', playlist_id)}/items",
+            payload=[self._get_uri("track", item) for item in items],
+            position=position,
+        )
+
+    async def playlist_remove_all_occurrences_of_items(
+        self, playlist_id, items, snapshot_id=None
+    ):
+        payload = {"items": [{"uri": self._get_uri("track", i)} for i in items]}
+        if snapshot_id:
+            payload["snapshot_id"] = snapshot_id
+        return await self._call(
+            "DELETE",
+            f"playlists/{self._get_id('playlist', playlist_id)}/items",
+            payload=payload,
+        )
+
+    async def playlist_remove_specific_occurrences_of_items(
+        self, playlist_id, items, snapshot_id=None
+    ):
+        payload = {
+            "items": [
+                {
+                    "uri": self._get_uri("track", item["uri"]),
+                    "positions": item["positions"],
+                }
+                for item in items
+            ]
+        }
+        if snapshot_id:
+            payload["snapshot_id"] = snapshot_id
+        return await self._call(
+            "DELETE",
+            f"playlists/{self._get_id('playlist', playlist_id)}/items",
+            payload=payload,
+        )
+
+    async def current_user_playlist_create(
+        self, name, public=True, collaborative=False, description=""
+    ):
+        return await self._call(
+            "POST",
+            "me/playlists",
+            payload={
+                "name": name,
+                "public": public,
+                "collaborative": collaborative,
+                "description": description,
+            },
+        )
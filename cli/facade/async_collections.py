@@ -0,0 +1,400 @@
+"""
+This module contains the asyncio counterparts of the collections in user_libary.py,
+and of the items that are also collections (playlists, albums and shows).
+
+Plain items (tracks, episodes, artists) are the same classes the synchronous facade uses.
+Items here are always created with their info already fetched, see AsyncSpotipyFacade.get_item.
+"""
+
+from typing import AsyncIterator, List
+
+from cli.facade.async_client import AsyncSpotify
+from cli.facade.async_interfaces import AsyncItemCollection, AsyncMutable
+from cli.facade.concurrency import bounded_gather, chunked
+from cli.facade.interfaces import CompactItem, Item
+from cli.facade.items import Album, Artist, Episode, Playlist, Show, Track
+
+
+class AsyncPlaylist(Item, AsyncItemCollection, AsyncMutable):
+    """
+    Class for holding info related to a single Spotify Playlist, and managing its tracks
+    """
+
+    __repr__ = Playlist.__repr__
+    __str__ = Playlist.__str__
+    snapshot_id = Playlist.snapshot_id
+
+    # The track index is kept exactly like the synchronous playlist's, see Playlist._track_index
+    _index_is_current = Playlist._index_is_current
+    _reindex = Playlist._reindex
+    _index_insert = Playlist._index_insert
+    _index_remove_positions = Playlist._index_remove_positions
+    _index_remove_ids = Playlist._index_remove_ids
+    invalidate_index = Playlist.invalidate_index
+
+    def __init__(self, sp: AsyncSpotify, item_id: str, info: dict):
+        super().__init__(
+            sp, sp.playlist, item_id=item_id, item_type="playlist", info=info
+        )
+
+        # Index of the playlist's tracks, see _track_index()
+        self._track_ids = None
+        self._track_positions = None
+        self._index_snapshot_id = None
+
+    async def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> AsyncIterator[Track]:
+        raw_tracks = self._iter_raw_items(
+            self.sp.playlist_items,
+            playlist_id=self.id,
+            fields=Playlist.TRACK_FIELDS,
+            limit=min(limit, Playlist.PAGE_LIMIT),
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
+        async for track in raw_tracks:
+            tr = track["track"]
+            yield Track(self.sp, tr["id"], tr)
+
+    async def track_ids(self) -> List[str]:
+        """The ids of every track in the playlist, in order"""
+        raw_tracks = self._iter_raw_items(
+            self.sp.playlist_items,
+            playlist_id=self.id,
+            fields=Playlist.TRACK_ID_FIELDS,
+            limit=Playlist.PAGE_LIMIT,
+            offset=0,
+            retrieve_all=True,
+        )
+        return [
+            None if raw["track"] is None else raw["track"]["id"]
+            async for raw in raw_tracks
+        ]
+
+    async def _track_index(self) -> dict:
+        """
+        Returns a dict mapping each track id in the playlist to a list of its positions.
+        Like Playlist._track_index, it is reused for as long as the playlist's snapshot_id matches the one it was built for.
+        """
+        if not self._index_is_current():
+            # Pin the snapshot the index is built from, so changes planned with it can reference it
+            result = await self.sp.playlist(self.id, fields="snapshot_id")
+            if result is not None:
+                self.info["snapshot_id"] = result.get("snapshot_id")
+            self._track_ids = await self.track_ids()
+            self._reindex()
+            self._index_snapshot_id = self.snapshot_id
+        return self._track_positions
+
+    async def contains(self, item: Item) -> bool:
+        return item.id in await self._track_index()
+
+    async def contains_many(self, items: List[Item]) -> List[bool]:
+        track_positions = await self._track_index()
+        return [item.id in track_positions for item in items]
+
+    async def add(self, item: Item, **kwargs):
+        await self.add_many([item], [kwargs.get("position")])
+
+    async def add_many(self, items: List[Item], positions: List[int] = None):
+        """
+        Add many items to the playlist, with as few requests as possible (see Playlist.plan_inserts).
+        Returns the number of requests sent.
+        """
+        if positions is None:
+            positions = [None] * len(items)
+        requests = Playlist.plan_inserts(
+            [item.id for item in items], positions, Playlist.WRITE_LIMIT
+        )
+        # Each insert's position depends on the ones before it, so they are sent in order
+        for position, item_ids in requests:
+            result = await self.sp.playlist_add_items(
+                self.id, item_ids, position=position
+            )
+            self._record_change(
+                result, lambda: self._index_insert(item_ids, position)
+            )
+        return len(requests)
+
+    async def remove(self, item: Item, **kwargs):
+        """Remove an item from the playlist, takes the same keyword args as remove_many"""
+        return await self.remove_many([item], **kwargs)
+
+    async def remove_many(self, items: List[Item], **kwargs):
+        """
+        Remove many items from the playlist, with the same keyword args as Playlist.remove
+        ('positions', 'all', 'count' and 'offset'): by default the first occurance of each item is removed.
+        Every removal is planned against a single snapshot of the playlist. Returns the number of requests sent.
+        """
+        positions = kwargs.get("positions")
+        count = kwargs.get("count", 1)
+        offset = kwargs.get("offset", (0, None))
+
+        item_ids = [item.id for item in items]
+
+        # Removing every occurance doesn't depend on positions, so there is no need to walk the playlist
+        if kwargs.get("all"):
+            snapshot_id = self.snapshot_id
+            requests = chunked(
+                list(dict.fromkeys(item_ids)), Playlist.WRITE_LIMIT
+            )
+            for ids in requests:
+                result = await self.sp.playlist_remove_all_occurrences_of_items(
+                    self.id, ids, snapshot_id=snapshot_id
+                )
+                self._record_change(result, lambda: self._index_remove_ids(ids))
+            return len(requests)
+
+        targets = Playlist.plan_removals(
+            await self._track_index(), item_ids, positions, count, offset
+        )
+        # The targets are sorted last position first, see Playlist._remove_targets
+        snapshot_id = self.snapshot_id
+        requests = chunked(targets, Playlist.WRITE_LIMIT)
+        for chunk in requests:
+            chunk_positions = {}
+            for position, item_id in chunk:
+                chunk_positions.setdefault(item_id, []).append(position)
+            result = (
+                await self.sp.playlist_remove_specific_occurrences_of_items(
+                    self.id,
+                    [
+                        {"uri": item_id, "positions": item_positions}
+                        for item_id, item_positions in chunk_positions.items()
+                    ],
+                    snapshot_id=snapshot_id,
+                )
+            )
+            self._record_change(
+                result,
+                lambda: self._index_remove_positions(
+                    [position for position, _ in chunk]
+                ),
+            )
+        return len(requests)
+
+    def _record_change(self, result: dict, patch_index=None):
+        """Record the snapshot_id returned by a change, like Playlist._record_change, and drop the cached info"""
+        Playlist._record_change(self, result, patch_index)
+        if Item.cache is not None:
+            Item.cache.invalidate(self.type, self.id)
+
+
+class AsyncAlbum(CompactItem, AsyncItemCollection):
+    """
+    Class for holding info related to a single Spotify Album
+    """
+
+    FIELDS = Album.FIELDS
+    __slots__ = Album.__slots__
+    __repr__ = Album.__repr__
+    __str__ = Album.__str__
+
+    def __init__(self, sp: AsyncSpotify, item_id: str, info: dict):
+        super().__init__(
+            sp, sp.album, item_id=item_id, item_type="album", info=info
+        )
+
+    async def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> AsyncIterator[Track]:
+        raw_tracks = self._iter_raw_items(
+            self.sp.album_tracks,
+            album_id=self.id,
+            limit=limit,
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
+        async for tr in raw_tracks:
+            # Tracks of an album come back without the album they belong to
+            tr.setdefault("album", {"name": self.name, "id": self.id})
+            yield Track(self.sp, tr["id"], tr)
+
+    async def contains(self, item: Item) -> bool:
+        async for track in self.iter_items(retrieve_all=True):
+            if track.id == item.id:
+                return True
+        return False
+
+
+class AsyncShow(Item, AsyncItemCollection):
+    """
+    Class for holding info related to a single Spotify Show
+    """
+
+    __repr__ = Show.__repr__
+    __str__ = Show.__str__
+
+    def __init__(self, sp: AsyncSpotify, item_id: str, info: dict):
+        super().__init__(
+            sp, sp.show, item_id=item_id, item_type="show", info=info
+        )
+
+    async def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> AsyncIterator[Episode]:
+        raw_episodes = self._iter_raw_items(
+            self.sp.show_episodes,
+            show_id=self.id,
+            limit=limit,
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
+        async for ep in raw_episodes:
+            # Episodes of a show come back without the show they belong to
+            ep.setdefault("show", {"name": self.name, "id": self.id})
+            yield Episode(self.sp, ep["id"], ep)
+
+    async def contains(self, item: Item) -> bool:
+        async for ep in self.iter_items(retrieve_all=True):
+            if ep.id == item.id:
+                return True
+        return False
+
+
+class AsyncLibrary(AsyncItemCollection, AsyncMutable):
+    """
+    Base class for the current user's saved items of a single type.
+    Subclasses set the item type, the client method that pages through the saved items,
+    and the item class those are wrapped in.
+    """
+
+    item_type: str = None
+    item_class = None
+    page_getter: str = None
+    # Max number of ids accepted by the library endpoints
+    ID_LIMIT = 50
+
+    def __init__(self, sp: AsyncSpotify):
+        self.sp: AsyncSpotify = sp
+
+    async def iter_items(self, limit=20, offset=0, retrieve_all=False):
+        raw_items = self._iter_raw_items(
+            getattr(self.sp, self.page_getter),
+            limit=limit,
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
+        async for saved in raw_items:
+            raw_item = saved[self.item_type]
+            yield self.item_class(self.sp, raw_item["id"], raw_item)
+
+    async def contains(self, item: Item) -> bool:
+        return (await self.contains_many([item]))[0]
+
+    async def contains_many(self, items: List[Item]) -> List[bool]:
+        return await self._id_chunk_calls(
+            lambda ids: self.sp.library_contains(self.item_type, ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    async def add(self, item: Item, **kwargs):
+        await self.add_many([item])
+
+    async def add_many(self, items: List[Item], **kwargs):
+        await self._id_chunk_calls(
+            lambda ids: self.sp.library_add(self.item_type, ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    async def remove(self, item: Item, **kwargs):
+        await self.remove_many([item])
+
+    async def remove_many(self, items: List[Item], **kwargs):
+        await self._id_chunk_calls(
+            lambda ids: self.sp.library_delete(self.item_type, ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+
+class AsyncSavedTracks(AsyncLibrary):
+    """
+    Class for managing the current user's saved tracks
+    """
+
+    item_type = "track"
+    item_class = Track
+    page_getter = "current_user_saved_tracks"
+
+
+class AsyncSavedAlbums(AsyncLibrary):
+    """
+    Class for managing the current user's saved albums
+    """
+
+    item_type = "album"
+    item_class = AsyncAlbum
+    page_getter = "current_user_saved_albums"
+    ID_LIMIT = 20
+
+
+class AsyncSavedShows(AsyncLibrary):
+    """
+    Class for managing the current user's saved shows
+    """
+
+    item_type = "show"
+    item_class = AsyncShow
+    page_getter = "current_user_saved_shows"
+
+
+class AsyncSavedEpisodes(AsyncLibrary):
+    """
+    Class for managing the current user's saved episodes
+    """
+
+    item_type = "episode"
+    item_class = Episode
+    page_getter = "current_user_saved_episodes"
+
+
+class AsyncFollowedArtists(AsyncLibrary):
+    """
+    Class for managing the current user's followed artists
+    """
+
+    item_type = "artist"
+    item_class = Artist
+
+    async def iter_items(self, limit=20, offset=0, retrieve_all=False):
+        async def followed_artists(**kwargs):
+            res = await self.sp.current_user_followed_artists(**kwargs)
+            return None if res is None else res["artists"]
+
+        # Followed artists are paged by cursor, the endpoint does not accept an offset
+        raw_artists = self._iter_raw_items(
+            followed_artists, limit=limit, retrieve_all=retrieve_all
+        )
+        async for artist in raw_artists:
+            yield Artist(self.sp, artist["id"], artist)
+
+
+class AsyncFollowedPlaylists(AsyncLibrary):
+    """
+    Class for managing the current user's followed playlists
+    """
+
+    item_type = "playlist"
+    item_class = AsyncPlaylist
+
+    async def iter_items(self, limit=20, offset=0, retrieve_all=False):
+        raw_playlists = self._iter_raw_items(
+            self.sp.current_user_playlists,
+            limit=limit,
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
+        async for playlist in raw_playlists:
+            yield AsyncPlaylist(self.sp, playlist["id"], playlist)
+
+    # Playlists can only be unfollowed one at a time, so those requests are sent concurrently
+    async def remove_many(self, items: List[Item], **kwargs):
+        await bounded_gather(
+            lambda item: self.sp.current_user_unfollow_playlist(item.id),
+            items,
+            self.concurrency,
+        )
@@ -0,0 +1,254 @@
+"""
+This module contains an asyncio facade, the counterpart of SpotipyFacade for services that
+orchestrate many operations at once without wrapping every call in a thread.
+"""
+from typing import List
+
+from decouple import config
+from spotipy import SpotifyException
+from spotipy.oauth2 import SpotifyOAuth
+
+from cli.facade.async_client import AsyncSpotify
+from cli.facade.async_collections import (
+    AsyncAlbum,
+    AsyncFollowedArtists,
+    AsyncFollowedPlaylists,
+    AsyncItemCollection,
+    AsyncPlaylist,
+    AsyncSavedAlbums,
+    AsyncSavedEpisodes,
+    AsyncSavedShows,
+    AsyncSavedTracks,
+    AsyncShow,
+)
+from cli.facade.cache import ItemCache
+from cli.facade.concurrency import bounded_gather, chunked
+from cli.facade.interfaces import CompactItem, Item
+from cli.facade.items import Artist, Episode, Playlist, Track
+from cli.facade.spotipy_facade import (
+    BULK_LIMITS,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_GZIP,
+    HTTP_READ_TIMEOUT,
+    MAX_CONCURRENCY,
+    SCOPE,
+    SPOTIFY_ACCESS_TOKEN,
+    SPOTIFY_API_PREFIX,
+    shared_rate_limiter,
+)
+
+
+class AsyncSpotipyFacade:
+    """
+    An asyncio facade for simplifying interaction with the Spotify Web API.
+    Mirrors SpotipyFacade, every method that talks to spotify is a coroutine.
+    Use it as an async context manager, or await aclose() when done, to close its connections.
+    """
+
+    def __init__(
+        self,
+        output_object=None,
+        concurrency=MAX_CONCURRENCY,
+        item_cache: ItemCache = None,
+        client: AsyncSpotify = None,
+    ):
+        """
+        output_object: Optional, any function capable of printing text. If configured with an object, this is where the facade will send output.
+        concurrency: Optional, max number of requests the facade and its collections will have in flight at once.
+        item_cache: Optional, an ItemCache used for item metadata. Unlike SpotipyFacade, there is no cache by default.
+        client: Optional, the AsyncSpotify to send requests with. Defaults to one authorized like SpotipyFacade,
+            sharing its process wide rate limiter.
+        """
+        if client is None:
+            auth_manager = SpotifyOAuth(
+                client_id=config("SPOTIPY_CLIENT_ID"),
+                client_secret=config("SPOTIPY_CLIENT_SECRET"),
+                redirect_uri=config("SPOTIPY_REDIRECT_URI"),
+                scope=SCOPE,
+            )
+            client = AsyncSpotify(
+                auth=SPOTIFY_ACCESS_TOKEN or None,
+                auth_manager=auth_manager,
+                concurrency=concurrency,
+                limiter=shared_rate_limiter(),
+                connect_timeout=HTTP_CONNECT_TIMEOUT,
+                read_timeout=HTTP_READ_TIMEOUT,
+                gzip=HTTP_GZIP,
+                prefix=SPOTIFY_API_PREFIX or None,
+            )
+        self.sp = client
+        self._user_id = None
+        self.types = {
+            "playlist": {"item": AsyncPlaylist, "collection": AsyncFollowedPlaylists},
+            "artist": {"item": Artist, "collection": AsyncFollowedArtists},
+            "track": {"item": Track, "collection": AsyncSavedTracks},
+            "album": {"item": AsyncAlbum, "collection": AsyncSavedAlbums},
+            "episode": {"item": Episode, "collection": AsyncSavedEpisodes},
+            "show": {"item": AsyncShow, "collection": AsyncSavedShows},
+        }
+        self.short_to_long_type = {
+            "pl": "playlist",
+            "ar": "artist",
+            "tr": "track",
+            "al": "album",
+            "ep": "episode",
+            "sh": "show",
+        }
+        for short_type, long_type in self.short_to_long_type.items():
+            self.types[short_type] = self.types[long_type]
+
+        self.output = output_object
+        self.concurrency = concurrency
+        self.item_cache = item_cache
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.sp.aclose()
+
+    async def user_id(self) -> str:
+        """The current user's id, requested from spotify on first use"""
+        if self._user_id is None:
+            self._user_id = (await self.sp.me())["id"]
+        return self._user_id
+
+    def elongate(self, item_type: str):
+        """
+        item_type can be short or long as it is passed to the facade.
+        This method ensures item_type is in the long format.
+        """
+        return self.short_to_long_type.get(item_type, item_type)
+
+    def _init_item(self, item_type: str, item_id: str, info: dict) -> Item:
+        item = self.types[item_type]["item"](self.sp, item_id, info)
+        # Compact items (albums) have no slot for it, and page with the class default
+        if isinstance(item, AsyncItemCollection) and not isinstance(
+            item, CompactItem
+        ):
+            item.concurrency = self.concurrency
+        return item
+
+    async def get_item(self, item_type: str, item_id: str) -> Item:
+        """
+        Returns an Item given item_type and item_id, or None if the item does not exist.
+        See self.types for list of supported 'item_type's
+        """
+        return (await self.get_items(item_type, [item_id]))[0]
+
+    async def get_items(self, item_type: str, item_ids: List[str]) -> List[Item]:
+        """
+        Returns a list of Items given item_type and any number of item_ids, in the same order as item_ids.
+        Items that do not exist are returned as None.
+
+        Like SpotipyFacade.get_items, ids are looked up in the item cache first, the rest are requested
+        in chunks as large as the type's bulk getter accepts, with the chunks fetched concurrently.
+        """
+        item_type = self.elongate(item_type)
+
+        infos = {}
+        uncached_ids = []
+        for item_id in dict.fromkeys(item_ids):
+            info = ItemCache.MISSING
+            if self.item_cache is not None:
+                info = self.item_cache.get(item_type, item_id)
+            if info is ItemCache.MISSING:
+                uncached_ids.append(item_id)
+            else:
+                infos[item_id] = info
+
+        if item_type in BULK_LIMITS:
+            chunks = chunked(uncached_ids, BULK_LIMITS[item_type])
+            get_chunk = lambda chunk: self._get_bulk(item_type, chunk)
+        else:
+            chunks = [[item_id] for item_id in uncached_ids]
+            get_chunk = lambda chunk: self._get_one(item_type, chunk[0])
+
+        raw_chunks = await bounded_gather(get_chunk, chunks, self.concurrency)
+        for chunk, raw_items in zip(chunks, raw_chunks):
+            for item_id, info in zip(chunk, raw_items):
+                infos[item_id] = info
+                if self.item_cache is not None and item_type in BULK_LIMITS:
+                    self.item_cache.set(item_type, item_id, info)
+
+        return [
+            None
+            if infos[item_id] is None
+            else self._init_item(item_type, item_id, infos[item_id])
+            for item_id in item_ids
+        ]
+
+    async def _get_one(self, item_type: str, item_id: str) -> List[dict]:
+        # A playlist's info would otherwise hold its first 100 tracks in full
+        kwargs = {"fields": Playlist.INFO_FIELDS} if item_type == "playlist" else {}
+        try:
+            return [await getattr(self.sp, item_type)(item_id, **kwargs)]
+        except SpotifyException as e:
+            if e.http_status in {400, 404}:
+                return [None]
+            raise e
+
+    async def _get_bulk(self, item_type: str, item_ids: List[str]) -> List[dict]:
+        """
+        Fetch a single chunk of items with the bulk getter for item_type.
+        If spotify rejects the chunk, the ids are retried one by one so only the bad ids come back as None.
+        """
+        try:
+            result = await getattr(self.sp, item_type + "s")(item_ids)
+        except SpotifyException as e:
+            if e.http_status != 400:
+                raise e
+            single = await bounded_gather(
+                lambda item_id: self._get_one(item_type, item_id),
+                item_ids,
+                self.concurrency,
+            )
+            return [raw_items[0] for raw_items in single]
+        return result[item_type + "s"]
+
+    def get_collection(self, item_type: str) -> AsyncItemCollection:
+        """
+        Returns an AsyncItemCollection given item_type.
+        See self.types for list of supported 'item_type's
+        """
+        i_type = self.types[item_type]
+        if "collection" in i_type:
+            collection = i_type["collection"](self.sp)
+            collection.concurrency = self.concurrency
+            return collection
+        return None
+
+    async def search_public(
+        self, item_type, query, limit=10, offset=0, market=None
+    ):
+        raw_items = await self.sp.search(query, limit, offset, item_type, market)
+        items = []
+        for raw_item in raw_items[item_type + "s"]["items"]:
+            if raw_item is None:
+                continue
+            items.append(self._init_item(item_type, raw_item["id"], raw_item))
+        return items
+
+    async def create_playlist(
+        self,
+        name: str,
+        public=False,
+        collaborative=False,
+        description="",
+    ) -> AsyncPlaylist:
+        """
+        Attempts to create a playlist with the given name.
+        Returns an AsyncPlaylist object if succesful, None if not.
+        """
+        result = await self.sp.current_user_playlist_create(
+            name=name,
+            public=public,
+            collaborative=collaborative,
+            description=description,
+        )
+        if result is not None:
+            return self._init_item("playlist", result["id"], result)
+        return None
@@ -0,0 +1,222 @@
+"""
+This module contains a small HTTP/1.1 client built directly on asyncio streams, used by AsyncSpotify.
+
+The Web API only needs short JSON requests over keep-alive connections, and general purpose async clients
+spend several times more CPU per request on that than a thread pool running requests does, which cancels out
+the point of going async. This keeps just what the API needs: a bounded pool of reused connections (TLS for https),
+Content-Length and chunked bodies, gzip, and the same TransportStats the synchronous Transport keeps.
+"""
+import asyncio
+import gzip
+import json
+import ssl
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+from cli.facade.rate_limit import IDEMPOTENT_METHODS
+from cli.facade.transport import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    TransportStats,
+)
+
+
+class Response:
+    """A complete HTTP response, with the attributes of a requests.Response the facade reads"""
+
+    def __init__(self, url: str, status_code: int, headers, content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Connection:
+    """A single keep-alive connection, reading and writing one request at a time"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    def is_open(self) -> bool:
+        # A closed or half closed idle connection is one the server timed out
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+    async def send(self, head: bytes, body: bytes):
+        self.writer.write(head + body)
+        await self.writer.drain()
+
+    async def _readline(self) -> bytes:
+        return (await self.reader.readuntil(b"\r\n"))[:-2]
+
+    async def receive(self, method: str):
+        """Returns the status code, headers and (undecoded) body of the next response"""
+        status_line = await self._readline()
+        try:
+            version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+            status_code = int(status)
+        except ValueError:
+            raise ConnectionError(f"Malformed status line: {status_line!r}")
+
+        headers = CaseInsensitiveDict()
+        while True:
+            line = await self._readline()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip()] = value.strip()
+
+        if method == "HEAD" or status_code in (204, 304) or status_code < 200:
+            body = b""
+        elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+            body = await self._read_chunked()
+        elif "Content-Length" in headers:
+            body = await self.reader.readexactly(int(headers["Content-Length"]))
+        else:
+            # The body runs until the server closes the connection
+            body = await self.reader.read()
+            self.reusable = False
+
+        if (
+            version == "HTTP/1.0"
+            or headers.get("Connection", "").lower() == "close"
+        ):
+            self.reusable = False
+        return status_code, headers, body
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self._readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip any trailers
+                while await self._readline():
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self._readline()
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections per host, with at most 'size' requests in flight (so at most 'size' connections per host).
+    Requests beyond that wait for one to finish, like the synchronous PooledAdapter.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        gzip: bool = True,
+        ssl_context: ssl.SSLContext = None,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.gzip = gzip
+        self.ssl_context = ssl_context
+        self.stats = TransportStats()
+        self._idle = defaultdict(list)
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self, scheme: str, host: str, port: int) -> Connection:
+        ssl_context = None
+        if scheme == "https":
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            ssl_context = self.ssl_context
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl_context),
+            self.connect_timeout,
+        )
+        self.stats.count("connections")
+        return Connection(reader, writer)
+
+    def _checkout_idle(self, key) -> Connection:
+        idle = self._idle[key]
+        while idle:
+            connection = idle.pop()
+            if connection.is_open():
+                return connection
+            connection.close()
+        return None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        headers: dict = None,
+        content: bytes = None,
+    ) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        query = "&".join(q for q in (parts.query, urlencode(params or {})) if q)
+        if query:
+            target += "?" + query
+        url = f"{scheme}://{parts.netloc}{target}"
+
+        body = content or b""
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        lines.append("Accept-Encoding: " + ("gzip" if self.gzip else "identity"))
+        if body or method in ("POST", "PUT", "DELETE"):
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        key = (scheme, host, port)
+        async with self._slots:
+            connection = self._checkout_idle(key)
+            reused = connection is not None
+            while True:
+                if connection is None:
+                    connection = await self._connect(scheme, host, port)
+                try:
+                    await connection.send(head, body)
+                    status_code, response_headers, raw = await asyncio.wait_for(
+                        connection.receive(method), self.read_timeout
+                    )
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    connection.close()
+                    # An idle connection can be closed by the server just as it is reused, an idempotent
+                    # request is retried once on a new connection (any other may already have been applied)
+                    if not reused or method.upper() not in IDEMPOTENT_METHODS:
+                        raise ConnectionError(f"{method} {url}: {e}") from e
+                    connection, reused = None, False
+                except BaseException:
+                    connection.close()
+                    raise
+            if connection.reusable:
+                self._idle[key].append(connection)
+            else:
+                connection.close()
+
+        self.stats.count("requests")
+        self.stats.count("wire_bytes", len(raw))
+        if response_headers.get("Content-Encoding", "").lower() == "gzip":
+            raw = gzip.decompress(raw)
+        self.stats.count("decoded_bytes", len(raw))
+        return Response(url, status_code, response_headers, raw)
+
+    async def aclose(self):
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
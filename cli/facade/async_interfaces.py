@@ -0,0 +1,152 @@
+"""
+This module contains the asyncio counterparts of the ItemCollection and Mutable interfaces.
+"""
+from abc import ABCMeta, abstractmethod
+from typing import AsyncIterator, List
+
+from cli.facade.concurrency import (
+    DEFAULT_CONCURRENCY,
+    bounded_gather,
+    chunked,
+    ordered_amap,
+)
+from cli.facade.interfaces import Item
+
+
+# Interface
+class AsyncItemCollection(metaclass=ABCMeta):
+    """
+    A class should implement this interface if it can "hold" a collection of items,
+    and talks to spotify through an AsyncSpotify client.
+    """
+
+    __slots__ = ()
+
+    # Max number of requests in flight at once when retrieving all items, or working in bulk
+    concurrency = DEFAULT_CONCURRENCY
+
+    async def _pages(self, concrete_item_getter, **kwargs):
+        """
+        Async generator, yields the raw pages returned by 'concrete_item_getter', in order.
+
+        If 'retrieve_all' is set, the first page is used to work out the offsets of all
+        remaining pages, which are then fetched concurrently (at most self.concurrency at a time).
+        Getters that page by cursor instead of offset are walked one page after another.
+        """
+        retrieve_all = kwargs.pop("retrieve_all")
+        page = await concrete_item_getter(**kwargs)
+        yield page
+        if page is None or not retrieve_all or page["next"] is None:
+            return
+
+        limit = kwargs["limit"]
+        if "offset" in kwargs and "total" in page:
+
+            async def get_page(offset):
+                return await concrete_item_getter(**dict(kwargs, offset=offset))
+
+            offsets = range(kwargs["offset"] + limit, page["total"], limit)
+            async for page in ordered_amap(get_page, offsets, self.concurrency):
+                yield page
+            return
+
+        while page is not None and page["next"] is not None:
+            if "offset" in kwargs:
+                kwargs["offset"] += limit
+            else:
+                kwargs["after"] = page["cursors"]["after"]
+            page = await concrete_item_getter(**kwargs)
+            yield page
+
+    async def _iter_raw_items(self, concrete_item_getter, **kwargs):
+        """Async generator, yields the raw items from each page, one page at a time"""
+        async for page in self._pages(concrete_item_getter, **kwargs):
+            if page is None:
+                return
+            for raw_item in page["items"]:
+                yield raw_item
+
+    async def items(self, limit=20, offset=0, retrieve_all=False) -> List[Item]:
+        """Get a list of the items in the collection"""
+        return [
+            item
+            async for item in self.iter_items(
+                limit=limit, offset=offset, retrieve_all=retrieve_all
+            )
+        ]
+
+    @abstractmethod
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> AsyncIterator[Item]:
+        """
+        Lazily yield the items in the collection, as an async generator.
+        Pages are only requested as the caller consumes the items of the previous page.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def contains(self, item: Item) -> bool:
+        """Check if item is a member of the collection"""
+        raise NotImplementedError
+
+    async def contains_many(self, items: List[Item]) -> List[bool]:
+        """
+        Check if each of the items is a member of the collection.
+        Collections with a multi-id endpoint should override this to check many items per request.
+        """
+        return await bounded_gather(self.contains, items, self.concurrency)
+
+    async def _id_chunk_calls(
+        self, concrete_call, items: List[Item], limit: int
+    ) -> list:
+        """
+        Await 'concrete_call' with the ids of 'items', in chunks of at most 'limit' ids.
+        Chunks are sent concurrently (at most self.concurrency at a time).
+        Returns the results of every call (calls returning None count as returning []), joined in order.
+        """
+        chunks = chunked([item.id for item in items], limit)
+        results = []
+        for result in await bounded_gather(
+            concrete_call, chunks, self.concurrency
+        ):
+            results.extend([] if result is None else result)
+        return results
+
+
+# Interface
+class AsyncMutable:
+    """
+    If an AsyncItemCollection is mutable (modifiable, editable) by the user,
+    said AsyncItemCollection should implement this interface.
+    """
+
+    __slots__ = ()
+
+    @abstractmethod
+    async def add(self, item: Item, **kwargs):
+        """Add an item to the collection"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove(self, item: Item, **kwargs):
+        """Remove an item from the collection"""
+        raise NotImplementedError
+
+    async def add_many(self, items: List[Item], **kwargs):
+        """
+        Add many items to the collection, concurrently.
+        Collections with a multi-id endpoint should override this to add many items per request.
+        """
+        await bounded_gather(
+            lambda item: self.add(item, **kwargs), items, self.concurrency
+        )
+
+    async def remove_many(self, items: List[Item], **kwargs):
+        """
+        Remove many items from the collection, concurrently.
+        Collections with a multi-id endpoint should override this to remove many items per request.
+        """
+        await bounded_gather(
+            lambda item: self.remove(item, **kwargs), items, self.concurrency
+        )
@@ -0,0 +1,312 @@
+"""
+This module contains caches used by items to avoid re-fetching metadata from spotify.
+Caches are keyed by (item_type, item_id), a cached value of None records that the item does not exist.
+"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+# Seconds an item's metadata stays fresh, per item type.
+# Playlists are edited by the user, so by default they are never cached.
+DEFAULT_TTLS = {
+    "track": 7 * 24 * 60 * 60,
+    "album": 7 * 24 * 60 * 60,
+    "artist": 24 * 60 * 60,
+    "episode": 24 * 60 * 60,
+    "show": 24 * 60 * 60,
+    "playlist": 0,
+}
+# Seconds a "does not exist" (404) result stays fresh
+DEFAULT_NEGATIVE_TTL = 60 * 60
+DEFAULT_MAX_ENTRIES = 50000
+# Share of max_entries a full persisted cache evicts at once, so it only counts its entries every so many writes
+EVICTION_SHARE = 0.1
+
+STAT_NAMES = ("hits", "negative_hits", "misses", "evictions")
+
+
+# Interface
+class ItemCache(metaclass=ABCMeta):
+    """
+    Implement this interface to provide Item with a cache for item metadata.
+    """
+
+    # Returned by get() when the cache holds nothing usable for a key
+    MISSING = object()
+
+    def __init__(
+        self,
+        ttls: dict = None,
+        negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.counters = dict.fromkeys(STAT_NAMES, 0)
+        self._lock = threading.Lock()
+
+    def _ttl(self, item_type: str, info: dict) -> int:
+        if info is None:
+            return self.negative_ttl
+        return self.ttls.get(item_type, 0)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    @abstractmethod
+    def get(self, item_type: str, item_id: str):
+        """
+        Returns the cached info dict for the item, None if the item is cached as not existing,
+        or ItemCache.MISSING if the item is not cached (or its entry has expired).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, item_type: str, item_id: str, info: dict):
+        """Cache info for the item. Pass info=None to record that the item does not exist."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def invalidate(self, item_type: str, item_id: str):
+        """Drop the cached entry for the item, if there is one"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        """Drop every cached entry"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries currently cached"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process, plus the number of cached entries"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats["entries"] = len(self)
+        return stats
+
+    def close(self):
+        """Release any resources held by the cache"""
+
+
+class MemoryItemCache(ItemCache):
+    """
+    An in-process LRU cache, entries are lost when the process exits.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries = OrderedDict()
+
+    def get(self, item_type: str, item_id: str):
+        key = (item_type, item_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            self._count("misses")
+            return self.MISSING
+        self._count("hits" if entry[1] is not None else "negative_hits")
+        return entry[1]
+
+    def set(self, item_type: str, item_id: str, info: dict):
+        ttl = self._ttl(item_type, info)
+        if ttl <= 0:
+            return
+        evicted = 0
+        with self._lock:
+            self._entries[(item_type, item_id)] = (time.time() + ttl, info)
+            self._entries.move_to_end((item_type, item_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def invalidate(self, item_type: str, item_id: str):
+        with self._lock:
+            self._entries.pop((item_type, item_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteItemCache(ItemCache):
+    """
+    An LRU cache persisted to an sqlite database, so entries outlive a single CLI invocation.
+    The database runs in WAL mode with a busy timeout, so several CLI processes can share it.
+    Counters are added to the totals stored in the database when the cache is closed.
+
+    Hits don't write to the database, their access times are written in bulk before evicting, and on close.
+    Writes keep an estimate of the number of entries, which are only counted once it reaches max_entries.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        # Access times of the hits not yet written, by key
+        self._accessed = {}
+        # Entries stored, as far as this process knows. Replaced entries, and those
+        # invalidated or evicted by other processes, can make it too high, never too low
+        self._estimate = None
+        self._db = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS items (
+                    item_type TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    info TEXT,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (item_type, item_id)
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS items_lru ON items (accessed_at)"
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )"""
+            )
+
+    def get(self, item_type: str, item_id: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT info, expires_at FROM items WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            ).fetchone()
+            if row is not None and row[1] > now:
+                self._accessed[(item_type, item_id)] = now
+        if row is None or row[1] <= now:
+            self._count("misses")
+            return self.MISSING
+        if row[0] is None:
+            self._count("negative_hits")
+            return None
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, item_type: str, item_id: str, info: dict):
+        ttl = self._ttl(item_type, info)
+        if ttl <= 0:
+            return
+        now = time.time()
+        raw_info = None if info is None else json.dumps(info)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                    (item_type, item_id, raw_info, now + ttl, now),
+                )
+                excess = 0
+                if self._estimate is None or self._estimate >= self.max_entries:
+                    # Count them for real, then evict down to leave room for a share of max_entries
+                    self._estimate = self._stored()
+                    excess = self._estimate - (
+                        self.max_entries
+                        - int(self.max_entries * EVICTION_SHARE)
+                    )
+                else:
+                    self._estimate += 1
+                if excess > 0:
+                    self._write_accessed()
+                    # Evict expired entries first, then the least recently used ones
+                    self._db.execute(
+                        """DELETE FROM items WHERE rowid IN (
+                            SELECT rowid FROM items
+                            ORDER BY expires_at > ?, accessed_at LIMIT ?
+                        )""",
+                        (now, excess),
+                    )
+                    self._estimate -= excess
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if excess > 0:
+            self._count("evictions", excess)
+
+    def invalidate(self, item_type: str, item_id: str):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM items WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM items")
+            self._accessed.clear()
+            self._estimate = 0
+
+    def _stored(self) -> int:
+        """Count the entries in the database, the caller must hold the lock"""
+        return self._db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def _write_accessed(self):
+        """Write the access times of the hits since the last write, the caller must hold the lock"""
+        self._db.executemany(
+            "UPDATE items SET accessed_at = ? WHERE item_type = ? AND item_id = ?",
+            [
+                (accessed_at, item_type, item_id)
+                for (item_type, item_id), accessed_at in self._accessed.items()
+            ],
+        )
+        self._accessed.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._stored()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters for this process, plus lifetime totals (prefixed with 'total_')
+        across every process that has used the database.
+        """
+        stats = super().stats()
+        with self._lock:
+            totals = dict(self._db.execute("SELECT name, value FROM stats"))
+        for name in STAT_NAMES:
+            stats["total_" + name] = totals.get(name, 0) + stats[name]
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute("BEGIN IMMEDIATE")
+            self._write_accessed()
+            for name, value in self.counters.items():
+                self._db.execute(
+                    """INSERT INTO stats VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = value + excluded.value""",
+                    (name, value),
+                )
+            self._db.execute("COMMIT")
+            self.counters = dict.fromkeys(STAT_NAMES, 0)
+            self._db.close()
+            self._db = None
@@ -0,0 +1,156 @@
+"""
+This module contains helpers used by the facade to run spotify requests concurrently.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+
+# Default cap on the number of requests the facade will have in flight at once
+DEFAULT_CONCURRENCY = 8
+
+_EXHAUSTED = object()
+
+
+def ordered_map(
+    func: Callable, iterable: Iterable, concurrency: int = DEFAULT_CONCURRENCY
+) -> Iterator:
+    """
+    Lazily apply 'func' to every element of 'iterable' using a bounded thread pool.
+
+    Results are yielded in the same order as 'iterable', and no more than
+    'concurrency' calls are ever in flight (or waiting to be consumed) at once.
+    A 'concurrency' of 1 or less runs everything on the calling thread.
+    """
+    if concurrency is None or concurrency <= 1:
+        for element in iterable:
+            yield func(element)
+        return
+
+    elements = iter(iterable)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = deque()
+        for element in elements:
+            in_flight.append(pool.submit(func, element))
+            if len(in_flight) >= concurrency:
+                break
+
+        while in_flight:
+            result = in_flight.popleft().result()
+            # Keep the window full before handing the result back
+            for element in elements:
+                in_flight.append(pool.submit(func, element))
+                break
+            yield result
+
+
+def nested_map(
+    first: Callable,
+    rest: Callable,
+    parents: Iterable,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Iterator:
+    """
+    Call first(parent) for every parent of 'parents', then every call in rest(parent, first_result),
+    a list of functions taking no arguments (e.g. the requests for the rest of a parent's pages).
+
+    Every call, of every parent, shares one bounded thread pool, so no more than 'concurrency'
+    are ever in flight at once. Yields (parent, [first_result, *rest_results]) as soon as all of
+    a parent's calls have completed, in the order parents complete rather than the order of 'parents'.
+    Calls for parents already started are sent before the first call of a new parent.
+    A 'concurrency' of 1 or less runs everything on the calling thread, in order.
+    """
+    if concurrency is None or concurrency <= 1:
+        for parent in parents:
+            result = first(parent)
+            yield parent, [result] + [call() for call in rest(parent, result)]
+        return
+
+    parents = iter(parents)
+    # Calls waiting for room in the pool, and the calls in flight.
+    # Both hold the parent's state: [parent, results, calls left], and the call's index into results
+    queued = deque()
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            while len(in_flight) < concurrency:
+                if queued:
+                    state, index, call = queued.popleft()
+                else:
+                    parent = next(parents, _EXHAUSTED)
+                    if parent is _EXHAUSTED:
+                        break
+                    state, index = [parent, [None], 1], 0
+                    call = partial(first, parent)
+                in_flight[pool.submit(call)] = (state, index)
+            if not in_flight:
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                state, index = in_flight.pop(future)
+                parent, results, _ = state
+                results[index] = future.result()
+                state[2] -= 1
+                if index == 0:
+                    calls = rest(parent, results[0])
+                    results.extend([None] * len(calls))
+                    state[2] += len(calls)
+                    queued.extend(
+                        (state, i, call) for i, call in enumerate(calls, 1)
+                    )
+                if state[2] == 0:
+                    yield parent, results
+
+
+def chunked(sequence: list, size: int) -> list:
+    """Split 'sequence' into a list of consecutive chunks holding at most 'size' elements"""
+    return [sequence[i : i + size] for i in range(0, len(sequence), size)]
+
+
+async def ordered_amap(
+    func: Callable[..., Awaitable],
+    iterable: Iterable,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> AsyncIterator:
+    """
+    The asyncio counterpart of ordered_map, 'func' is a coroutine function.
+
+    Results are yielded in the same order as 'iterable', and no more than
+    'concurrency' calls are ever in flight (or waiting to be consumed) at once.
+    """
+    concurrency = max(concurrency or 1, 1)
+    elements = iter(iterable)
+    in_flight = deque()
+    try:
+        for element in elements:
+            in_flight.append(asyncio.ensure_future(func(element)))
+            if len(in_flight) >= concurrency:
+                break
+
+        while in_flight:
+            result = await in_flight.popleft()
+            for element in elements:
+                in_flight.append(asyncio.ensure_future(func(element)))
+                break
+            yield result
+    finally:
+        # The caller stopped early, or a call failed
+        for task in in_flight:
+            task.cancel()
+
+
+async def bounded_gather(
+    func: Callable[..., Awaitable],
+    iterable: Iterable,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> list:
+    """Await 'func' for every element of 'iterable', at most 'concurrency' at once, returns the results in order"""
+    semaphore = asyncio.Semaphore(max(concurrency or 1, 1))
+
+    async def bounded(element):
+        async with semaphore:
+            return await func(element)
+
+    return await asyncio.gather(*(bounded(element) for element in iterable))
@@ -1,17 +1,33 @@
 """
 This module contains interfaces and an abstract base class.
 """
-from typing import List
+import inspect
+from functools import partial
+from typing import Iterable, Iterator, List, Tuple
 from abc import ABCMeta, abstractmethod
 
 from spotipy import Spotify, SpotifyException
 
+from cli.facade.cache import ItemCache
+from cli.facade.concurrency import (
+    DEFAULT_CONCURRENCY,
+    chunked,
+    nested_map,
+    ordered_map,
+)
+
 # Abstract base class
 class Item(metaclass=ABCMeta):
     """
     Item should be inherited by all items (Playlist, Artist, Album, Track, Episode, Show, etc)
     """
 
+    # Items that don't declare __slots__ themselves still get a __dict__, and hold 'info' in it
+    __slots__ = ("sp", "id", "type", "name", "msg")
+
+    # Optional ItemCache consulted before fetching an item's info from spotify
+    cache: ItemCache = None
+
     def __init__(
         self,
         sp: Spotify,
@@ -23,16 +39,16 @@ class Item(metaclass=ABCMeta):
 
         self.sp = sp
         self.id = item_id
-        self.info = info
+        self.type = item_type
 
         if info is None:
-            self.info = self._get_item(concrete_getter, item_id)
+            info = self._get_item(concrete_getter, item_id)
+        self.info = info
 
         self.name = None
-        if self.info is not None:
-            self.name = self.info["name"]
+        if info is not None:
+            self.name = info["name"]
 
-        self.type = item_type
         self.msg = ""
 
     @abstractmethod
@@ -40,15 +56,67 @@ class Item(metaclass=ABCMeta):
         """Make item printable"""
         raise NotImplementedError
 
-    @staticmethod
-    def _get_item(concrete_getter, item_id):
+    @property
+    def exists(self) -> bool:
+        """False if spotify had no item with this id"""
+        return self.info is not None
+
+    def _get_item(self, concrete_getter, item_id):
+        cache = Item.cache
+        if cache is not None:
+            info = cache.get(self.type, item_id)
+            if info is not ItemCache.MISSING:
+                return info
+
         try:
-            return concrete_getter(item_id)
+            info = concrete_getter(item_id)
         except SpotifyException as e:
             if e.http_status != 404:
                 raise e
             else:
-                return None
+                info = None
+
+        if cache is not None:
+            cache.set(self.type, item_id, info)
+        return info
+
+
+class CompactItem(Item):
+    """
+    An Item that keeps only the fields it prints, and the facade reads, in slots instead of the raw info.
+    Raw track, episode and album objects are mostly available markets, images and nested objects,
+    which adds up when a whole library is held in memory.
+
+    FIELDS maps each slot to a function extracting its value from the raw info.
+    The full info is requested (through Item.cache) the first time 'info' is read.
+    """
+
+    __slots__ = ("_info", "_exists")
+
+    FIELDS = {}
+
+    @property
+    def exists(self) -> bool:
+        return self._exists
+
+    @property
+    def info(self) -> dict:
+        if self._info is None and self._exists:
+            getter = getattr(self.sp, self.type)
+            if inspect.iscoroutinefunction(getter):
+                raise TypeError(
+                    f"The full info of a {self.type} can't be requested synchronously, "
+                    f"await the AsyncSpotify client's '{self.type}' for it"
+                )
+            self._info = self._get_item(getter, self.id)
+        return self._info
+
+    @info.setter
+    def info(self, info: dict):
+        self._info = None
+        self._exists = info is not None
+        for field, extract in self.FIELDS.items():
+            setattr(self, field, None if info is None else extract(info))
 
 
 # Interface
@@ -58,27 +126,78 @@ class ItemCollection(metaclass=ABCMeta):
     A class can be an Item, and an ItemCollection, example: Playlist or Album
     """
 
-    def _items(self, concrete_item_getter, **kwargs):
-        retrieve_all = kwargs["retrieve_all"]
-        kwargs.pop("retrieve_all")
-        raw_items = []
-        more = True
-        while more:
-            res = concrete_item_getter(**kwargs)
-            if res is None:
-                return None
-            raw_items.extend(res["items"])
-
-            if retrieve_all and res["next"] != None:
-                kwargs["offset"] += 20
+    __slots__ = ()
+
+    # Max number of pages fetched at once when retrieving all items
+    concurrency = DEFAULT_CONCURRENCY
+
+    def _pages(self, concrete_item_getter, **kwargs):
+        """
+        Generator, yields the raw pages returned by 'concrete_item_getter', in order.
+
+        If 'retrieve_all' is set, the first page is used to work out the offsets of all
+        remaining pages, which are then fetched concurrently (at most self.concurrency at a time).
+        Getters that page by cursor instead of offset are walked one page after another.
+        Yields None if the first page could not be retrieved.
+        """
+        retrieve_all = kwargs.pop("retrieve_all")
+        page = concrete_item_getter(**kwargs)
+        yield page
+        if page is None or not retrieve_all or page["next"] is None:
+            return
+
+        limit = kwargs["limit"]
+        if "offset" in kwargs and "total" in page:
+            get_page = lambda offset: concrete_item_getter(
+                **dict(kwargs, offset=offset)
+            )
+            offsets = range(kwargs["offset"] + limit, page["total"], limit)
+            yield from ordered_map(get_page, offsets, self.concurrency)
+            return
+
+        while page is not None and page["next"] is not None:
+            if "offset" in kwargs:
+                kwargs["offset"] += limit
             else:
-                more = False
+                kwargs["after"] = page["cursors"]["after"]
+            page = concrete_item_getter(**kwargs)
+            yield page
 
-        return raw_items
+    def _iter_raw_items(self, concrete_item_getter, **kwargs):
+        """Generator, yields the raw items from each page, one page at a time"""
+        for page in self._pages(concrete_item_getter, **kwargs):
+            if page is None:
+                return
+            yield from page["items"]
 
-    @abstractmethod
     def items(self, limit=20, offset=0, retrieve_all=False) -> List[Item]:
         """Get a list of the items in the collection"""
+        return list(
+            self.iter_items(
+                limit=limit, offset=offset, retrieve_all=retrieve_all
+            )
+        )
+
+    def _get_page(self, limit: int, offset: int) -> dict:
+        """
+        Request a single page of the collection's items, as spotify returns it.
+        Implemented by the collections that are items themselves (albums, shows and playlists),
+        so the items of many of them can be requested at once with expand_collections.
+        """
+        raise NotImplementedError
+
+    def _to_item(self, raw_item: dict) -> Item:
+        """Make an Item out of one of the raw items in a page returned by _get_page"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Item]:
+        """
+        Lazily yield the items in the collection.
+        Pages are only requested as the caller consumes the items of the previous page.
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -86,6 +205,65 @@ class ItemCollection(metaclass=ABCMeta):
         """Check if item is a member of the collection"""
         raise NotImplementedError
 
+    def contains_many(self, items: List[Item]) -> List[bool]:
+        """
+        Check if each of the items is a member of the collection.
+        Collections with a multi-id endpoint should override this to check many items per request.
+        """
+        return list(ordered_map(self.contains, items, self.concurrency))
+
+    def _id_chunk_calls(
+        self, concrete_call, items: List[Item], limit: int
+    ) -> list:
+        """
+        Call 'concrete_call' with the ids of 'items', in chunks of at most 'limit' ids.
+        Chunks are sent concurrently (at most self.concurrency at a time).
+        Returns the results of every call (calls returning None count as returning []), joined in order.
+        """
+        chunks = chunked([item.id for item in items], limit)
+        results = []
+        for result in ordered_map(concrete_call, chunks, self.concurrency):
+            results.extend([] if result is None else result)
+        return results
+
+
+def expand_collections(
+    collections: Iterable[ItemCollection],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Iterator[Tuple[ItemCollection, List[Item]]]:
+    """
+    Retrieve all the items of every collection in 'collections' (e.g. the tracks of every saved album).
+
+    The first page of every collection, and then the rest of its pages, are requested concurrently
+    with no more than 'concurrency' requests in flight across all of the collections.
+    Yields (collection, items) for each collection as soon as all of its pages have arrived,
+    so collections are yielded in the order they complete, not the order of 'collections'.
+    A collection that spotify has no items for (like a deleted album) is yielded with no items.
+    """
+
+    def first_page(collection: ItemCollection) -> dict:
+        return collection._get_page(limit=collection.PAGE_LIMIT, offset=0)
+
+    def rest_of_pages(collection: ItemCollection, page: dict) -> list:
+        if page is None or page["next"] is None:
+            return []
+        limit = collection.PAGE_LIMIT
+        return [
+            partial(collection._get_page, limit=limit, offset=offset)
+            for offset in range(limit, page["total"], limit)
+        ]
+
+    for collection, pages in nested_map(
+        first_page, rest_of_pages, collections, concurrency
+    ):
+        items = [
+            collection._to_item(raw_item)
+            for page in pages
+            if page is not None
+            for raw_item in page["items"]
+        ]
+        yield collection, items
+
 
 # Interface
 class Mutable:
@@ -94,6 +272,8 @@ class Mutable:
     said ItemCollection should implement this interface.
     """
 
+    __slots__ = ()
+
     @abstractmethod
     def add(self, item: Item, **kwargs):
         """
@@ -109,3 +289,19 @@ class Mutable:
         Accepts arbitrary keyword arguments to allow better control over how item is removed from collection
         """
         raise NotImplementedError
+
+    def add_many(self, items: List[Item], **kwargs):
+        """
+        Add many items to the collection.
+        Collections with a multi-id endpoint should override this to add many items per request.
+        """
+        for item in items:
+            self.add(item, **kwargs)
+
+    def remove_many(self, items: List[Item], **kwargs):
+        """
+        Remove many items from the collection.
+        Collections with a multi-id endpoint should override this to remove many items per request.
+        """
+        for item in items:
+            self.remove(item, **kwargs)
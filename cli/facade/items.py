@@ -3,19 +3,87 @@ This module contains item classes used for managing Spotify items.
 """
 
 import textwrap
+from bisect import bisect_left
+from collections import deque
+from functools import partial
 from itertools import zip_longest
 
-from typing import List
+from typing import Iterator, List, Tuple
 from spotipy import Spotify
 
-from cli.facade.interfaces import Item, ItemCollection, Mutable
+from cli.facade.concurrency import chunked
+from cli.facade.interfaces import CompactItem, Item, ItemCollection, Mutable
 
 
-class Episode(Item):
+def artist_names(info: dict) -> tuple:
+    return tuple(artist["name"] for artist in info.get("artists") or ())
+
+
+def spotify_url(info: dict) -> str:
+    return (info.get("external_urls") or {}).get("spotify")
+
+
+def longest_increasing(values: List[int]) -> set:
+    """The values of a longest strictly increasing subsequence of 'values', found in O(n log n)"""
+    # tails[k] is the index of the smallest value ending an increasing run of length k + 1
+    tails, tail_values, previous = [], [], [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tail_values, value)
+        previous[i] = tails[k - 1] if k > 0 else None
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[k] = i
+            tail_values[k] = value
+
+    longest = set()
+    i = tails[-1] if tails else None
+    while i is not None:
+        longest.add(values[i])
+        i = previous[i]
+    return longest
+
+
+class PrefixCounts:
+    """
+    A count per slot (0 to size - 1), each starting at 1, where the total of the slots
+    before any slot is found in O(log n) (a Fenwick tree)
+    """
+
+    def __init__(self, size: int):
+        self.tree = [i & -i for i in range(size + 1)]
+
+    def add(self, slot: int, amount: int):
+        slot += 1
+        while slot < len(self.tree):
+            self.tree[slot] += amount
+            slot += slot & -slot
+
+    def before(self, slot: int) -> int:
+        """The total of the slots before 'slot'"""
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+        return total
+
+
+class Episode(CompactItem):
     """
     Class for holding info related to a single Spotify Episode
     """
 
+    FIELDS = {
+        "show": lambda info: (info.get("show") or {}).get("name"),
+        "description": lambda info: textwrap.shorten(
+            info.get("description") or "", width=500
+        ),
+        "release_date": lambda info: info.get("release_date"),
+        "url": spotify_url,
+    }
+    __slots__ = tuple(FIELDS)
+
     def __init__(self, sp: Spotify, item_id: str, info=None):
         super().__init__(
             sp, sp.episode, item_id=item_id, item_type="episode", info=info
@@ -25,20 +93,23 @@ class Episode(Item):
         return f"<Episode: name: {self.name}, id: {self.id}>"
 
     def __str__(self) -> str:
-        name = self.info["name"]
-        show = self.info["show"]["name"]
-        description = textwrap.shorten(self.info["description"], width=500)
-        rel_date = self.info["release_date"]
-        url = self.info["external_urls"]["spotify"]
-        item_id = self.info["id"]
-        return f"Episode Name: {name}\nShow: {show}\nDescription: {description}\nRelease Date: {rel_date}\nURL: {url}\nID: {item_id}"
+        return f"Episode Name: {self.name}\nShow: {self.show}\nDescription: {self.description}\nRelease Date: {self.release_date}\nURL: {self.url}\nID: {self.id}"
 
 
-class Track(Item):
+class Track(CompactItem):
     """
     Class for holding info related to a single Spotify Track
     """
 
+    FIELDS = {
+        "album": lambda info: (info.get("album") or {}).get("name"),
+        "artists": artist_names,
+        "url": spotify_url,
+    }
+    __slots__ = tuple(FIELDS)
+    # The same fields, plus id and name, as a 'fields' filter for the endpoints that accept one
+    API_FIELDS = "id,name,album(name),artists(name),external_urls"
+
     def __init__(self, sp: Spotify, item_id: str, info=None):
         super().__init__(
             sp, sp.track, item_id=item_id, item_type="track", info=info
@@ -48,12 +119,8 @@ class Track(Item):
         return f"<Track: name: {self.name}, id: {self.id}>"
 
     def __str__(self) -> str:
-        name = self.info["name"]
-        tr_id = self.info["id"]
-        album = self.info["album"]["name"]
-        artists = [item["name"] for item in self.info["artists"]]
-        url = self.info["external_urls"]["spotify"]
-        return f"Track Name: {name}\nAlbum: {album}\nArtist(s): {artists}\nURL: {url}\nID: {tr_id}"
+        artists = list(self.artists)
+        return f"Track Name: {self.name}\nAlbum: {self.album}\nArtist(s): {artists}\nURL: {self.url}\nID: {self.id}"
 
 
 class Show(Item, ItemCollection):
@@ -61,6 +128,9 @@ class Show(Item, ItemCollection):
     Class for holding info related to a single Spotify Show
     """
 
+    # Max number of episodes returned by a single request for a show's episodes
+    PAGE_LIMIT = 50
+
     def __init__(self, sp: Spotify, item_id: str, info=None):
         super().__init__(
             sp, sp.show, item_id=item_id, item_type="show", info=info
@@ -78,23 +148,30 @@ class Show(Item, ItemCollection):
         item_id = self.info["id"]
         return f"Show Name: {name}\nPublisher: {publisher}\nDescription: {description}\nEpisode Count: {episode_count}\nURL: {url}\nID: {item_id}"
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Episode]:
-        raw_episodes = self._items(
-            self.sp.show_episodes,
+    def _get_page(self, limit: int, offset: int) -> dict:
+        return self.sp.show_episodes(
+            show_id=self.id, limit=limit, offset=offset
+        )
+
+    def _to_item(self, ep: dict) -> Episode:
+        # Episodes of a show come back without the show they belong to
+        ep.setdefault("show", {"name": self.name, "id": self.id})
+        return Episode(self.sp, ep["id"], ep)
+
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Episode]:
+        raw_episodes = self._iter_raw_items(
+            self._get_page,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_episodes is None:
-            return None
-        episodes = []
-        for episode in raw_episodes:
-            ep = episode["episode"]
-            episodes.append(Episode(self.sp, ep["id"], ep))
-        return episodes
+        for ep in raw_episodes:
+            yield self._to_item(ep)
 
     def contains(self, item: Item):
-        for ep in self.items(retrieve_all=True):
+        for ep in self.iter_items(retrieve_all=True):
             if item.id == ep.id:
                 return True
         return False
@@ -105,14 +182,40 @@ class Playlist(Item, ItemCollection, Mutable):
     Class for holding info related to a single Spotify Playlist
     """
 
+    # Max number of tracks returned by a single request for a playlist's tracks
+    PAGE_LIMIT = 100
+    # Max number of items a single request can add to, or remove from, a playlist
+    WRITE_LIMIT = 100
+
+    # The fields each use of the playlist asks for, spotify leaves everything else out of the response
+    INFO_FIELDS = "id,name,description,public,collaborative,owner(id,display_name),external_urls,snapshot_id,tracks(total)"
+    TRACK_FIELDS = f"items(track({Track.API_FIELDS})),next,total"
+    TRACK_ID_FIELDS = "items(track(id)),next,total"
+
     def __init__(self, sp: Spotify, item_id: str, info=None):
         super().__init__(
-            sp, sp.playlist, item_id=item_id, item_type="playlist", info=info
+            sp,
+            partial(sp.playlist, fields=self.INFO_FIELDS),
+            item_id=item_id,
+            item_type="playlist",
+            info=info,
         )
 
+        # Index of the playlist's tracks, see _track_index()
+        self._track_ids = None
+        self._track_positions = None
+        self._index_snapshot_id = None
+
     def __repr__(self):
         return f"<{self.type}: name: {self.name}, id: {self.id}>"
 
+    @property
+    def snapshot_id(self) -> str:
+        """Version identifier of the playlist's tracks, as last seen by this object"""
+        if self.info is None:
+            return None
+        return self.info.get("snapshot_id")
+
     def __str__(self):
         info = self.info
         pl_str = ["-----------------------"]
@@ -135,30 +238,33 @@ class Playlist(Item, ItemCollection, Mutable):
         return "\n".join(pl_str)
 
     # Playlist implements ItemCollection since it "holds" a collection of tracks
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Track]:
-        raw_tracks = self._items(
-            self.sp.playlist_tracks,
+    def _get_page(self, limit: int, offset: int) -> dict:
+        return self.sp.playlist_tracks(
             playlist_id=self.id,
+            fields=self.TRACK_FIELDS,
             limit=limit,
             offset=offset,
-            retrieve_all=retrieve_all,
         )
-        if raw_tracks is None:
-            return None
 
-        tracks = []
+    def _to_item(self, track: dict) -> Track:
+        # TODO: Playlists can have episodes in them, add support for that
+        tr = track["track"]
+        return Track(self.sp, tr["id"], tr)
+
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Track]:
+        raw_tracks = self._iter_raw_items(
+            self._get_page,
+            limit=limit,
+            offset=offset,
+            retrieve_all=retrieve_all,
+        )
         for track in raw_tracks:
-            # TODO: Playlists can have episodes in them, add support for that
-            tr = track["track"]
-            tracks.append(Track(self.sp, tr["id"], tr))
-        return tracks
+            yield self._to_item(track)
 
     def contains(self, item: Item):
-        for track in self.items(retrieve_all=True):
-            if track.id == item.id:
-                return True
-        else:
-            return False
+        return item.id in self._track_index()
 
     def change_details(
         self, name=None, public=None, collaborative=None, description=None
@@ -170,6 +276,8 @@ class Playlist(Item, ItemCollection, Mutable):
             collaborative=collaborative,
             description=description,
         )
+        if Item.cache is not None:
+            Item.cache.invalidate(self.type, self.id)
 
     def add(self, item: Item, **kwargs):
         """
@@ -179,15 +287,73 @@ class Playlist(Item, ItemCollection, Mutable):
         If "position" is not given as a kwarg, default behavior is to add to the END of the playlist.
         """
         position = None if "position" not in kwargs else kwargs["position"]
-        self.sp.playlist_add_items(self.id, [item.id], position=position)
+        self.add_many([item], [position])
+
+    def add_many(self, items: List[Item], positions: List[int] = None):
+        """
+        Add many items to the playlist, with as few requests as possible.
+        Optional, 'positions' holds one position per item (None adds the item to the END).
+        The result is the same as adding the items one at a time, in order, each at its position.
+        Returns the number of requests made.
+        """
+        if positions is None:
+            positions = [None] * len(items)
+        item_ids = [item.id for item in items]
+
+        requests = self.plan_inserts(item_ids, positions, self.WRITE_LIMIT)
+        self._send_inserts(requests)
+        return len(requests)
+
+    def _send_inserts(self, requests: List[Tuple[int, List[str]]]):
+        """Send the (position, [item_id, ...]) requests planned by plan_inserts, in order"""
+        for position, ids in requests:
+            # Each request returns the snapshot_id the next one builds on
+            result = self.sp.playlist_add_items(self.id, ids, position=position)
+            self._record_change(
+                result, lambda: self._index_insert(ids, position)
+            )
+
+    @staticmethod
+    def plan_inserts(item_ids: List[str], positions: List[int], limit: int):
+        """
+        Coalesce a sequence of single inserts into as few multi-item inserts as possible.
+        Returns a list of (position, [item_id, ...]) requests, each holding at most 'limit' ids.
+
+        An insert at position P, following a request that places its ids at [S, S + N),
+        lands inside (or right next to) that block when S <= P <= S + N, so it can join the
+        request at offset P - S. Consecutive appends (position None) always coalesce.
+        """
+        requests = []
+        for item_id, position in zip(item_ids, positions):
+            if len(requests) > 0:
+                start, ids = requests[-1]
+                if len(ids) < limit:
+                    if position is None and start is None:
+                        ids.append(item_id)
+                        continue
+                    if (
+                        position is not None
+                        and start is not None
+                        and start <= position <= start + len(ids)
+                    ):
+                        ids.insert(position - start, item_id)
+                        continue
+            requests.append((position, [item_id]))
+        return requests
 
     def remove(self, items: List[Item], **kwargs):
         """
         Remove an item from the playlist.
         Item can be track or episode.
         Optional:
-        * Keyword arg 'positions'= [int, int, int...], a list of ints, determines which occurance of the item to remove .
+        * Keyword arg 'positions'= [[int, int...], ...], one list of positions per item, determines which occurances of the item to remove.
         * Keyword arg 'all'=True, will cause ALL occurances of a specific item to be removed
+        * Keyword arg 'count'=int, how many occurances to remove of each item without a positions list (default 1)
+        * Keyword arg 'offset'=(start, end), the window of the playlist to look for those occurances in (end of -1 or None means the end of the playlist)
+
+        Every removal is planned against a single snapshot of the playlist, and sent in requests of
+        at most 100 positions that all carry that snapshot's snapshot_id.
+        Returns the number of requests made.
         """
         config = (
             lambda key, default: default if key not in kwargs else kwargs[key]
@@ -197,62 +363,378 @@ class Playlist(Item, ItemCollection, Mutable):
         count = config("count", 1)
         offset = config("offset", (0, None))
 
-        # TODO: Add THIRD mode of removal:
-        #       Walk through list, remove FIRST OCCURANCE and up to N occurances
-        #       Basically, add kwarg support for the shit in remove in the cli
-        #       Default behavior of just passing item ID should remove the FIRST instance of said item
         item_ids = [item.id for item in items]
+        snapshot_id = self.snapshot_id
 
+        # Removing every occurance doesn't depend on positions, so there is no need to walk the playlist
         if remove_all:
-            self.sp.playlist_remove_all_occurrences_of_items(self.id, item_ids)
+            requests = chunked(list(dict.fromkeys(item_ids)), self.WRITE_LIMIT)
+            for ids in requests:
+                result = self.sp.playlist_remove_all_occurrences_of_items(
+                    self.id, ids, snapshot_id=snapshot_id
+                )
+                self._record_change(result, lambda: self._index_remove_ids(ids))
+            return len(requests)
+
+        targets = self.plan_removals(
+            self._track_index(), item_ids, positions, count, offset
+        )
+        return self._remove_targets(targets)
 
-        specfic_items = []
-        normal_items = dict()
+    def dedupe(self, keep: str = "first") -> int:
+        """
+        Remove every duplicate occurance of a track from the playlist, keeping only its 'first' or its 'last' occurance.
+        Duplicates are found in a single pass over the track index, and removed by position,
+        like remove, in requests of at most 100 positions that all carry the same snapshot_id.
+        Returns the number of occurances removed.
+        """
+        targets = self.plan_dedupe(self._track_index(), keep)
+        self._remove_targets(targets)
+        return len(targets)
+
+    @staticmethod
+    def plan_dedupe(
+        track_positions: dict, keep: str = "first"
+    ) -> List[Tuple[int, str]]:
+        """
+        Work out the positions of every duplicate occurance in a playlist.
+        track_positions: the playlist's index, track id -> sorted list of positions
+        keep: which occurance of each track is kept, 'first' or 'last'
+        Unavailable tracks (which have no id) are never counted as duplicates.
+        Returns a list of (position, item_id) pairs, sorted from last position to first.
+        """
+        if keep not in ("first", "last"):
+            raise ValueError(f"keep must be 'first' or 'last', not '{keep}'")
+
+        targets = []
+        for item_id, item_positions in track_positions.items():
+            if item_id is None or len(item_positions) < 2:
+                continue
+            duplicates = (
+                item_positions[1:] if keep == "first" else item_positions[:-1]
+            )
+            targets.extend((position, item_id) for position in duplicates)
+        return sorted(targets, reverse=True)
 
+    def _remove_targets(self, targets: List[Tuple[int, str]]) -> int:
+        """
+        Remove the (position, item_id) pairs in 'targets', which must be sorted last position first,
+        against the snapshot of the playlist they were planned with. Returns the number of requests made.
+        """
+        snapshot_id = self.snapshot_id
+
+        # Targets are sorted last position first, so every request only removes positions after
+        # those of the requests that follow it, which keeps them valid whether or not spotify
+        # applies the snapshot_id.
+        requests = chunked(targets, self.WRITE_LIMIT)
+        for chunk in requests:
+            chunk_positions = {}
+            for position, item_id in chunk:
+                chunk_positions.setdefault(item_id, []).append(position)
+            result = self.sp.playlist_remove_specific_occurrences_of_items(
+                self.id,
+                [
+                    {"uri": item_id, "positions": item_positions}
+                    for item_id, item_positions in chunk_positions.items()
+                ],
+                snapshot_id=snapshot_id,
+            )
+            self._record_change(
+                result,
+                lambda: self._index_remove_positions(
+                    [position for position, _ in chunk]
+                ),
+            )
+        return len(requests)
+
+    @staticmethod
+    def plan_removals(
+        track_positions: dict,
+        item_ids: List[str],
+        positions: List[List[int]] = None,
+        count: int = 1,
+        offset: Tuple[int, int] = (0, None),
+    ) -> List[Tuple[int, str]]:
+        """
+        Work out every position to remove from a playlist, in a single pass over its track index.
+        track_positions: the playlist's index, track id -> sorted list of positions
+        positions: Optional, one position list per item id. Items with a (non empty) list have exactly those positions removed.
+        Items without one have their first 'count' occurances, within the 'offset' window, removed.
+        Returns a list of (position, item_id) pairs, sorted from last position to first.
+        """
+        if positions is None:
+            positions = []
+
+        targets = {}
+        counts = {}
         # Associate positions lists, if specified, to track ids
-        for item, position_list in zip_longest(
-            items, positions, fillvalue=None
+        for item_id, position_list in zip_longest(
+            item_ids, positions[: len(item_ids)], fillvalue=None
         ):
-
-            # Pos lit can be None, or can be empty if a track was skipped with '...'
+            # Pos list can be None, or can be empty if a track was skipped with '...'
             if position_list is not None and len(position_list) > 0:
-                specfic_items.append(
-                    {"uri": item.id, "positions": position_list}
-                )
+                for position in position_list:
+                    targets[position] = item_id
             else:
-                normal_items[item.id] = count
+                counts[item_id] = count
 
-        # Make inital call to handle specific positon specified tracks
-        if len(specfic_items) > 0:
-            self.sp.playlist_remove_specific_occurrences_of_items(
-                self.id, specfic_items
-            )
-
-        # Then locate and remove tracks that did not have specific position lists
-        # This is also how tracks are normally handeled when a user does not provide a list of position lists
-        items = self.items(retrieve_all=True)
         start, end = offset
-        end = end if end not in {-1, None} else len(items)
-        target_items = []
-
-        # Walk the playlist from 'start' to 'end'
-        for index, cur_item in enumerate(items[start:end]):
-            if count == 0:
-                break
-
-            # Check each item to see if it's one we want to remove
-            if cur_item.id in normal_items:
-                # If we've already "removed" 'count' occurances of said item, skip this occurance
-                if normal_items[cur_item.id] <= 0:
+        for item_id, remaining in counts.items():
+            for position in track_positions.get(item_id, []):
+                if remaining <= 0 or (
+                    end not in {-1, None} and position >= end
+                ):
+                    break
+                if position < start or position in targets:
                     continue
-                target_items.append(
-                    {"uri": cur_item.id, "positions": [index + start]}
-                )
-                normal_items[cur_item.id] -= 1
+                targets[position] = item_id
+                remaining -= 1
 
-        self.sp.playlist_remove_specific_occurrences_of_items(
-            self.id, target_items
+        return sorted(targets.items(), reverse=True)
+
+    def sync_from(self, source: "Playlist", dry_run=False) -> dict:
+        """
+        Make the playlist hold the same tracks as 'source', in the same order, with as few writes as possible.
+        Both playlists are walked once, and the edit script is worked out with plan_sync.
+        Removals are sent first (like remove, against a single snapshot), then each range move, then the inserts.
+        If 'dry_run' is set, the playlist is left as it is.
+
+        Returns the number of tracks 'removed', 'moved' and 'inserted', and the number of write 'requests' the script takes.
+        """
+        source._track_index()
+        self._track_index()
+        removals, moves, inserts = self.plan_sync(
+            source._track_ids, self._track_ids, self.WRITE_LIMIT
         )
+        plan = {
+            "removed": len(removals),
+            "moved": sum(length for _, length, _ in moves),
+            "inserted": sum(len(ids) for _, ids in inserts),
+            "requests": len(chunked(removals, self.WRITE_LIMIT))
+            + len(moves)
+            + len(inserts),
+        }
+        if dry_run:
+            return plan
+
+        self._remove_targets(removals)
+        for start, length, insert_before in moves:
+            # Every move's positions are those left by the one before it
+            result = self.sp.playlist_reorder_items(
+                self.id,
+                range_start=start,
+                insert_before=insert_before,
+                range_length=length,
+                snapshot_id=self.snapshot_id,
+            )
+            self._record_change(
+                result, lambda: self._index_move(start, length, insert_before)
+            )
+        self._send_inserts(inserts)
+        return plan
+
+    @staticmethod
+    def plan_sync(
+        source_ids: List[str], target_ids: List[str], limit: int
+    ) -> Tuple[list, list, list]:
+        """
+        Work out the smallest edit script that turns a playlist holding target_ids into one holding source_ids.
+        The k-th occurance of a track in the target is paired with its k-th occurance in the source,
+        tracks without a pair are removed, and tracks missing from the target are inserted.
+        Of the paired tracks, those in a longest increasing subsequence (of their source positions) stay where they are,
+        the rest are moved, in runs of tracks that are next to each other in both playlists.
+        Unavailable tracks (which have no id) can't be removed or inserted, so they are left where they are.
+
+        Returns three lists:
+        * removals: (position, item_id) pairs, sorted from last position to first (see remove)
+        * moves: (range_start, range_length, insert_before) range moves, each against the playlist as the one before it left it
+        * inserts: (position, [item_id, ...]) requests of at most 'limit' ids, made after the moves (see plan_inserts)
+        """
+        occurances = {}
+        for position, item_id in enumerate(source_ids):
+            if item_id is not None:
+                occurances.setdefault(item_id, deque()).append(position)
+
+        # The target as it will be after the removals, each track as the position it has in the source.
+        # Unavailable tracks are negative, so they never compare with those
+        current, removals = [], []
+        for position, item_id in enumerate(target_ids):
+            if item_id is None:
+                current.append(-1 - position)
+            elif occurances.get(item_id):
+                current.append(occurances[item_id].popleft())
+            else:
+                removals.append((position, item_id))
+        removals.reverse()
+
+        paired = [value for value in current if value >= 0]
+        stays = longest_increasing(paired)
+        # Every paired track not in 'stays' is moved right after the one before it in the source, in source order.
+        # Each track has a slot, 1 + its position in 'current' until it's moved, then the slot of the track it was
+        # moved after (0 for the front). Only the next track in the source is moved after a track, so the tracks
+        # before one being moved, or moved after, are those in the slots before its own, found in O(log n)
+        order = sorted(paired)
+        slots = {value: position + 1 for position, value in enumerate(current)}
+        counts = PrefixCounts(len(current) + 1)
+        counts.add(0, -1)
+        moves, moved = [], set()
+        k = 0
+        while k < len(order):
+            if order[k] in stays:
+                k += 1
+                continue
+            start = counts.before(slots[order[k]])
+            length = 1
+            while (
+                k + length < len(order)
+                and order[k + length] not in stays
+                and counts.before(slots[order[k + length]]) == start + length
+            ):
+                length += 1
+            after = 0 if k == 0 else slots[order[k - 1]]
+            insert_before = counts.before(after + 1)
+            if insert_before != start:
+                moves.append((start, length, insert_before))
+                for value in order[k : k + length]:
+                    counts.add(slots[value], -1)
+                    counts.add(after, 1)
+                    slots[value] = after
+                    moved.add(value)
+            k += length
+        # The tracks moved into a slot follow the one already there, in source order
+        moved_current = sorted(
+            current, key=lambda value: (slots[value], value in moved, value)
+        )
+        placed = {value: i for i, value in enumerate(moved_current)}
+
+        # Insert each missing track right after the one before it in the source.
+        # 'position' is where the next one goes, looked up only when the previous track was paired
+        paired = set(paired)
+        item_ids, positions = [], []
+        previous, position = None, 0
+        for source_position, item_id in enumerate(source_ids):
+            if source_position in paired:
+                previous, position = source_position, None
+                continue
+            if item_id is None:
+                continue
+            if position is None:
+                # Every track inserted so far is before 'previous'
+                position = placed[previous] + len(item_ids) + 1
+            item_ids.append(item_id)
+            positions.append(position)
+            position += 1
+        inserts = Playlist.plan_inserts(item_ids, positions, limit)
+
+        return removals, moves, inserts
+
+    def _record_change(self, result: dict, patch_index=None):
+        """
+        Record the snapshot_id returned by a request that changed the playlist.
+        If the track index was current before the change, 'patch_index' is called to bring
+        it up to date with the change, otherwise (or if no patch is given) it is dropped.
+        """
+        index_current = self._index_is_current()
+        if (
+            self.info is not None
+            and result is not None
+            and "snapshot_id" in result
+        ):
+            self.info["snapshot_id"] = result["snapshot_id"]
+
+        if index_current and patch_index is not None:
+            patch_index()
+            self._index_snapshot_id = self.snapshot_id
+        else:
+            self.invalidate_index()
+
+    def _track_index(self) -> dict:
+        """
+        Returns a dict mapping each track id in the playlist to a list of its positions.
+        The index is built with a single walk of the playlist, and reused for as long as the
+        playlist's snapshot_id matches the one it was built for (changes made through this
+        object patch the index and keep it current).
+        """
+        if not self._index_is_current():
+            # Pin the snapshot the index is built from, so changes planned with it can reference it
+            result = self.sp.playlist(self.id, fields="snapshot_id")
+            if self.info is not None and result is not None:
+                self.info["snapshot_id"] = result.get("snapshot_id")
+
+            raw_tracks = self._iter_raw_items(
+                self.sp.playlist_tracks,
+                playlist_id=self.id,
+                fields=self.TRACK_ID_FIELDS,
+                limit=self.PAGE_LIMIT,
+                offset=0,
+                retrieve_all=True,
+            )
+            # Unavailable tracks come back as None
+            self._track_ids = [
+                None if raw["track"] is None else raw["track"]["id"]
+                for raw in raw_tracks
+            ]
+            self._reindex()
+            self._index_snapshot_id = self.snapshot_id
+        return self._track_positions
+
+    def _index_is_current(self) -> bool:
+        return (
+            self._track_positions is not None
+            and self._index_snapshot_id == self.snapshot_id
+        )
+
+    def _reindex(self):
+        """Rebuild the id -> positions mapping from self._track_ids"""
+        positions = {}
+        for position, track_id in enumerate(self._track_ids):
+            positions.setdefault(track_id, []).append(position)
+        self._track_positions = positions
+
+    def _index_insert(self, item_ids: List[str], position: int = None):
+        """Patch the track index after item_ids were inserted at position (None = appended)"""
+        if position is None:
+            for item_id in item_ids:
+                self._track_positions.setdefault(item_id, []).append(
+                    len(self._track_ids)
+                )
+                self._track_ids.append(item_id)
+        else:
+            self._track_ids[position:position] = item_ids
+            self._reindex()
+
+    def _index_remove_positions(self, positions: List[int]):
+        """Patch the track index after the tracks at 'positions' were removed"""
+        removed = set(positions)
+        self._track_ids = [
+            track_id
+            for position, track_id in enumerate(self._track_ids)
+            if position not in removed
+        ]
+        self._reindex()
+
+    def _index_move(self, start: int, length: int, insert_before: int):
+        """Patch the track index after 'length' tracks from 'start' were moved before 'insert_before'"""
+        block = self._track_ids[start : start + length]
+        del self._track_ids[start : start + length]
+        if insert_before > start:
+            insert_before -= length
+        self._track_ids[insert_before:insert_before] = block
+        self._reindex()
+
+    def _index_remove_ids(self, item_ids: List[str]):
+        """Patch the track index after every occurance of item_ids was removed"""
+        removed = set(item_ids)
+        self._track_ids = [
+            track_id for track_id in self._track_ids if track_id not in removed
+        ]
+        self._reindex()
+
+    def invalidate_index(self):
+        """Drop the track index, it will be rebuilt the next time it is needed"""
+        self._track_ids = None
+        self._track_positions = None
+        self._index_snapshot_id = None
 
 
 class Artist(Item):
@@ -285,11 +767,21 @@ class Artist(Item):
         return "\n".join(art_str)
 
 
-class Album(Item, ItemCollection):
+class Album(CompactItem, ItemCollection):
     """
     Class for holding info related to a single Spotify Album
     """
 
+    FIELDS = {
+        "release_date": lambda info: info.get("release_date"),
+        "artists": artist_names,
+        "total_tracks": lambda info: info.get("total_tracks"),
+        "url": spotify_url,
+    }
+    __slots__ = tuple(FIELDS)
+    # Max number of tracks returned by a single request for an album's tracks
+    PAGE_LIMIT = 50
+
     def __init__(self, sp: Spotify, item_id: str, info=None):
         super().__init__(
             sp, sp.album, item_id=item_id, item_type="album", info=info
@@ -299,32 +791,33 @@ class Album(Item, ItemCollection):
         return f"<{self.type}: name: {self.name}, id: {self.id}>"
 
     def __str__(self) -> str:
-        name = self.info["name"]
-        rel_date = self.info["release_date"]
-        artists = ", ".join([item["name"] for item in self.info["artists"]])
-        track_count = self.info["total_tracks"]
-        url = self.info["external_urls"]["spotify"]
-        tr_id = self.info["id"]
-        return f"Album Name: {name}\nArtist(s): {artists}\nRelease Date: {rel_date}\nURL: {url}\nTrack Count: {track_count}\nID: {tr_id}"
+        artists = ", ".join(self.artists)
+        return f"Album Name: {self.name}\nArtist(s): {artists}\nRelease Date: {self.release_date}\nURL: {self.url}\nTrack Count: {self.total_tracks}\nID: {self.id}"
+
+    def _get_page(self, limit: int, offset: int) -> dict:
+        return self.sp.album_tracks(
+            album_id=self.id, limit=limit, offset=offset
+        )
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Track]:
-        raw_tracks = self._items(
-            self.sp.album_tracks,
-            album_id=self.id,
+    def _to_item(self, tr: dict) -> Track:
+        # Tracks of an album come back without the album they belong to
+        tr.setdefault("album", {"name": self.name, "id": self.id})
+        return Track(self.sp, tr["id"], tr)
+
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Track]:
+        raw_tracks = self._iter_raw_items(
+            self._get_page,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_tracks is None:
-            return None
-        tracks = []
-        for track in raw_tracks:
-            tr = track["track"]
-            tracks.append(Track(self.sp, tr["id"], tr))
-        return tracks
+        for tr in raw_tracks:
+            yield self._to_item(tr)
 
     def contains(self, item: Item):
-        for track in self.items(retrieve_all=True):
+        for track in self.iter_items(retrieve_all=True):
             if track.id == item.id:
                 return True
         else:
@@ -0,0 +1,671 @@
+"""
+This module contains a local mirror of the user's library, kept in an sqlite database:
+saved tracks, albums, shows and episodes, followed artists, and followed playlists with their tracks.
+
+LibraryMirror.sync brings the mirror up to date with as few requests as it can, and
+MirroredCollection answers read-only queries (listing, looking up by name) from it without talking to spotify.
+The mirror also holds an inverted index over the library, which LibraryMirror.search queries.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from spotipy import Spotify
+
+from cli.facade.concurrency import DEFAULT_CONCURRENCY, ordered_map
+from cli.facade.interfaces import Item, ItemCollection
+from cli.facade.items import Playlist
+from cli.facade.user_libary import (
+    FollowedPlaylists,
+    SavedAlbums,
+    SavedEpisodes,
+    SavedShows,
+    SavedTracks,
+)
+
+# Getter for the pages of each saved type, newest first, with when each item was added
+SAVED_GETTERS = {
+    "track": "current_user_saved_tracks",
+    "album": "current_user_saved_albums",
+    "show": "current_user_saved_shows",
+    "episode": "current_user_saved_episodes",
+}
+SAVED_COLLECTIONS = {
+    "track": SavedTracks,
+    "album": SavedAlbums,
+    "show": SavedShows,
+    "episode": SavedEpisodes,
+}
+MIRROR_TYPES = tuple(SAVED_GETTERS) + ("artist", "playlist")
+# Max page sizes of the saved items, followed artists, followed playlists and playlist tracks endpoints
+SAVED_PAGE_LIMIT = 50
+PLAYLIST_TRACKS_PAGE_LIMIT = 100
+# Sorts after every character, so a term's prefix range is [prefix, prefix + LAST_CHAR)
+LAST_CHAR = "\U0010ffff"
+# Bumped whenever the tables change, a mirror with another version is dropped and synced again in full
+SCHEMA_VERSION = 2
+
+# Text of an item that search matches against, with how much a match in each counts for
+SEARCH_FIELDS = (
+    (3, lambda info: info.get("name")),
+    (2, lambda info: " ".join(a["name"] for a in info.get("artists") or [])),
+    (1, lambda info: (info.get("album") or {}).get("name")),
+    (1, lambda info: (info.get("show") or {}).get("name")),
+    (1, lambda info: info.get("publisher")),
+    (1, lambda info: info.get("description")),
+)
+
+
+def search_terms(text: str) -> List[str]:
+    """Split text into the terms search indexes it by: lower cased words, with accents dropped"""
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"[^\W_]+", text)
+
+
+def item_terms(info: dict) -> dict:
+    """term -> weight, for every term in an item's searchable fields. A term in several fields gets its best weight"""
+    weights = {}
+    for weight, field in SEARCH_FIELDS:
+        for term in search_terms(field(info) or ""):
+            weights[term] = max(weight, weights.get(term, 0))
+    return weights
+
+
+class LibraryMirror:
+    """
+    A copy of the user's library in an sqlite database, so it outlives a single CLI invocation.
+    Like SqliteItemCache, the database runs in WAL mode with a busy timeout, so several CLI processes can share it.
+
+    Changes made through the facade invalidate the changed type (see invalidate), which is then
+    read from spotify instead of from the mirror until it is synced again.
+
+    Every type is synced on its own:
+        * Saved items are paged newest first, and paging stops at the first item that was already mirrored
+          (by 'added_at'). If the mirror then holds a different number of items than spotify reports,
+          something older was removed, and the type is walked in full instead.
+        * Followed artists are paged by cursor, and have no 'added_at', so they are always walked in full.
+        * Followed playlists are walked in full (a page holds 50), but the tracks of a playlist are only
+          requested again when its snapshot_id changed since the last sync.
+    """
+
+    def __init__(self, path: str, concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        path: Where the database is stored, ':memory:' keeps it in memory for the life of the process.
+        concurrency: Max number of requests sync will have in flight at once.
+        """
+        self.path = path
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        # Held while a type is synced, so only one thread syncs it at a time
+        self._sync_locks = {
+            item_type: threading.Lock() for item_type in MIRROR_TYPES
+        }
+        self._db = sqlite3.connect(
+            path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                for table in ("items", "library", "playlist_tracks", "synced", "terms"):
+                    self._db.execute(f"DROP TABLE IF EXISTS {table}")
+                self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            # The info of every mirrored item, whether it is in the library or only in a playlist
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS items (
+                    item_type TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    info TEXT NOT NULL,
+                    PRIMARY KEY (item_type, item_id)
+                )"""
+            )
+            # Saved or followed items, the highest seq was added most recently
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS library (
+                    item_type TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    added_at TEXT,
+                    terms TEXT NOT NULL,
+                    PRIMARY KEY (item_type, item_id)
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS library_order ON library (item_type, seq)"
+            )
+            # Local tracks, and tracks that are no longer available, have no id
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS playlist_tracks (
+                    playlist_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    track_id TEXT,
+                    PRIMARY KEY (playlist_id, position)
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS playlist_track_ids ON playlist_tracks (track_id)"
+            )
+            # The search index, a row per term of every item in the library (library.terms holds an item's terms).
+            # seq is the item's, so ties can be ranked most recently added first without a join
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS terms (
+                    item_type TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    weight INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (item_type, term, item_id)
+                ) WITHOUT ROWID"""
+            )
+            # 'stale' is set once the type was changed after it was synced
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS synced (
+                    item_type TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL,
+                    stale INTEGER NOT NULL
+                )"""
+            )
+
+    # ================================ Reads ==================================#
+
+    def synced_at(self, item_type: str) -> float:
+        """When item_type was last synced (seconds since the epoch), None if it never was"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT synced_at FROM synced WHERE item_type = ?", (item_type,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def is_current(self, item_type: str) -> bool:
+        """True if item_type was synced, and hasn't been invalidated since"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT stale FROM synced WHERE item_type = ?", (item_type,)
+            ).fetchone()
+        return row is not None and not row[0]
+
+    def count(self, item_type: str) -> int:
+        """Number of items of item_type in the mirrored library"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM library WHERE item_type = ?", (item_type,)
+            ).fetchone()[0]
+
+    def in_library(self, item_type: str, item_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM library WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            ).fetchone()
+        return row is not None
+
+    def library(self, item_type: str, limit: int = None, offset: int = 0):
+        """(id, info) of the items of item_type in the mirrored library, most recently added first"""
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT library.item_id, items.info FROM library
+                JOIN items USING (item_type, item_id)
+                WHERE item_type = ? ORDER BY seq DESC LIMIT ? OFFSET ?""",
+                (item_type, -1 if limit is None else limit, offset),
+            ).fetchall()
+        return [(item_id, json.loads(info)) for item_id, info in rows]
+
+    def info(self, item_type: str, item_id: str) -> dict:
+        """The mirrored info of an item, None if it is not mirrored"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT info FROM items WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def playlist_track_ids(self, playlist_id: str) -> List[str]:
+        """The ids of the tracks in a mirrored playlist, in order. Tracks without an id are None"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT track_id FROM playlist_tracks WHERE playlist_id = ? ORDER BY position",
+                (playlist_id,),
+            ).fetchall()
+        return [track_id for (track_id,) in rows]
+
+    def search(self, item_type: str, query: str, limit: int = None):
+        """
+        (id, info) of the items of item_type in the mirrored library that match every term of query,
+        best match first. A term matches the words of an item it is a prefix of, case and accents aside.
+
+        Each term scores the weight of the best field it matched in (see SEARCH_FIELDS),
+        doubled if it matched a whole word. Items that score the same are ranked most recently added first.
+        Terms are looked up rarest first, and after the first one only the terms of the items still
+        in the running are read, so a query costs about as much as its rarest term has matches.
+        """
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms:
+            return []
+        match = "item_type = ? AND term >= ? AND term < ?"
+        score = "SELECT item_id, MAX(weight * (1 + (term = ?))), seq FROM terms"
+        limit = -1 if limit is None else limit
+
+        with self._lock:
+            terms.sort(
+                key=lambda term: self._db.execute(
+                    f"SELECT COUNT(*) FROM terms WHERE {match}",
+                    (item_type, term, term + LAST_CHAR),
+                ).fetchone()[0]
+            )
+            first = terms[0]
+            args = (first, item_type, first, first + LAST_CHAR)
+            if len(terms) == 1:
+                rows = self._db.execute(
+                    f"{score} WHERE {match} GROUP BY item_id ORDER BY 2 DESC, seq DESC LIMIT ?",
+                    args + (limit,),
+                )
+                ranked = [item_id for item_id, _, _ in rows]
+            else:
+                scores = {
+                    item_id: (term_score, seq)
+                    for item_id, term_score, seq in self._db.execute(
+                        f"{score} WHERE {match} GROUP BY item_id", args
+                    )
+                }
+                # The rest of the terms are matched against the terms of each item still in the running
+                candidates = self._db.execute(
+                    """SELECT item_id, terms FROM library
+                    WHERE item_type = ? AND item_id IN (SELECT value FROM json_each(?))""",
+                    (item_type, json.dumps(list(scores))),
+                )
+                for item_id, raw_terms in candidates:
+                    item_terms = json.loads(raw_terms)
+                    for term in terms[1:]:
+                        term_score = max(
+                            (
+                                weight * (2 if item_term == term else 1)
+                                for item_term, weight in item_terms.items()
+                                if item_term.startswith(term)
+                            ),
+                            default=0,
+                        )
+                        if term_score == 0:
+                            del scores[item_id]
+                            break
+                        scores[item_id] = (
+                            scores[item_id][0] + term_score,
+                            scores[item_id][1],
+                        )
+                ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+                ranked = ranked[: None if limit < 0 else limit]
+        return self._with_info(item_type, ranked)
+
+    def _with_info(self, item_type: str, item_ids: List[str]) -> list:
+        results = []
+        for item_id in item_ids:
+            info = self.info(item_type, item_id)
+            if info is not None:
+                results.append((item_id, info))
+        return results
+
+    # ================================ Sync ===================================#
+
+    def sync(self, sp: Spotify, item_types=MIRROR_TYPES, full=False) -> dict:
+        """
+        Bring the mirror of each of item_types up to date. Pass full=True to walk every type in full.
+        Returns a dict of stats per type: the number of items mirrored, how many of them are new
+        (or for playlists, how many had their tracks requested again), and whether it was walked in full.
+
+        A type that another thread is already syncing is waited for, and (unless full is set) not synced
+        again if that sync left it current.
+        """
+        results = {}
+        for item_type in item_types:
+            sync_lock = self._sync_locks[item_type]
+            waited = not sync_lock.acquire(blocking=False)
+            if waited:
+                sync_lock.acquire()
+            try:
+                if waited and not full and self.is_current(item_type):
+                    results[item_type] = {
+                        "items": self.count(item_type),
+                        "new": 0,
+                        "full": False,
+                    }
+                elif item_type in SAVED_GETTERS:
+                    results[item_type] = self._sync_saved(sp, item_type, full)
+                elif item_type == "artist":
+                    results[item_type] = self._sync_artists(sp)
+                else:
+                    results[item_type] = self._sync_playlists(sp, full)
+            finally:
+                sync_lock.release()
+        self._prune()
+        return results
+
+    def _sync_saved(self, sp: Spotify, item_type: str, full: bool) -> dict:
+        getter = getattr(sp, SAVED_GETTERS[item_type])
+        if not full and self.synced_at(item_type) is not None:
+            new_items = self._new_saved_items(getter, item_type)
+            if new_items is not None:
+                return {
+                    "items": self.count(item_type),
+                    "new": len(new_items),
+                    "full": False,
+                }
+
+        saved = [
+            raw
+            for raw in self._walk(SAVED_COLLECTIONS[item_type](sp), getter)
+            if raw[item_type] is not None
+        ]
+        known = self._library_ids(item_type)
+        with self._transaction():
+            self._remove_library(item_type)
+            self._store_library(item_type, saved[::-1], 0)
+            self._mark_synced(item_type)
+        new = sum(raw[item_type]["id"] not in known for raw in saved)
+        return {"items": len(saved), "new": new, "full": True}
+
+    def _new_saved_items(self, getter, item_type: str) -> list:
+        """
+        Page the saved items newest first, until reaching one that is already mirrored, and mirror the new ones.
+        Returns the new items, or None if the mirror would not match spotify (and nothing was stored).
+        """
+        with self._lock:
+            newest, seq = self._db.execute(
+                "SELECT MAX(added_at), MAX(seq) FROM library WHERE item_type = ?",
+                (item_type,),
+            ).fetchone()
+        known = self._library_ids(item_type)
+
+        new_items, total, offset = [], None, 0
+        while True:
+            page = getter(limit=SAVED_PAGE_LIMIT, offset=offset)
+            if page is None:
+                return None
+            total = page["total"]
+            seen = False
+            for raw in page["items"]:
+                if raw[item_type] is None:
+                    continue
+                if raw[item_type]["id"] in known and (
+                    newest is None or raw["added_at"] <= newest
+                ):
+                    seen = True
+                    break
+                new_items.append(raw)
+            if seen or page["next"] is None:
+                break
+            offset += SAVED_PAGE_LIMIT
+
+        # Items saved again since the last sync moved to the front, they are not new
+        moved = {raw[item_type]["id"] for raw in new_items} & known
+        if len(known) - len(moved) + len(new_items) != total:
+            return None
+        with self._transaction():
+            self._remove_library(item_type, moved)
+            self._store_library(item_type, new_items[::-1], (seq or 0) + 1)
+            self._mark_synced(item_type)
+        return [raw for raw in new_items if raw[item_type]["id"] not in moved]
+
+    def _sync_artists(self, sp: Spotify) -> dict:
+        artists, after = [], None
+        while True:
+            kwargs = {} if after is None else {"after": after}
+            page = sp.current_user_followed_artists(
+                limit=SAVED_PAGE_LIMIT, **kwargs
+            )
+            page = None if page is None else page["artists"]
+            if page is None:
+                break
+            artists.extend(page["items"])
+            if page["next"] is None:
+                break
+            after = page["cursors"]["after"]
+
+        known = self._library_ids("artist")
+        with self._transaction():
+            self._remove_library("artist")
+            self._store_library(
+                "artist", [{"artist": artist} for artist in artists[::-1]], 0
+            )
+            self._mark_synced("artist")
+        new = sum(artist["id"] not in known for artist in artists)
+        return {"items": len(artists), "new": new, "full": True}
+
+    def _sync_playlists(self, sp: Spotify, full: bool) -> dict:
+        playlists = list(
+            self._walk(FollowedPlaylists(sp), sp.current_user_playlists)
+        )
+        with self._lock:
+            snapshots = {
+                playlist_id: json.loads(info).get("snapshot_id")
+                for playlist_id, info in self._db.execute(
+                    """SELECT items.item_id, items.info FROM library
+                    JOIN items USING (item_type, item_id)
+                    WHERE item_type = 'playlist'"""
+                )
+            }
+        changed = [
+            playlist
+            for playlist in playlists
+            if full
+            or playlist["id"] not in snapshots
+            or snapshots[playlist["id"]] != playlist.get("snapshot_id")
+        ]
+
+        # Playlists are requested concurrently, the pages of each one after another
+        def get_tracks(playlist: dict) -> list:
+            collection = Playlist(sp, playlist["id"], info=playlist)
+            collection.concurrency = 1
+            return list(
+                collection._iter_raw_items(
+                    sp.playlist_tracks,
+                    playlist_id=playlist["id"],
+                    fields=Playlist.TRACK_FIELDS,
+                    limit=PLAYLIST_TRACKS_PAGE_LIMIT,
+                    offset=0,
+                    retrieve_all=True,
+                )
+            )
+
+        tracks = list(ordered_map(get_tracks, changed, self.concurrency))
+        with self._transaction():
+            self._remove_library("playlist")
+            self._store_library(
+                "playlist",
+                [{"playlist": playlist} for playlist in playlists[::-1]],
+                0,
+            )
+            for playlist, raw_tracks in zip(changed, tracks):
+                self._store_playlist_tracks(playlist["id"], raw_tracks)
+            self._db.execute(
+                """DELETE FROM playlist_tracks WHERE playlist_id NOT IN (
+                    SELECT item_id FROM library WHERE item_type = 'playlist'
+                )"""
+            )
+            self._mark_synced("playlist")
+        return {"items": len(playlists), "new": len(changed), "full": full}
+
+    def _walk(self, collection: ItemCollection, getter) -> Iterator[dict]:
+        """
+        Every raw item of an offset paged getter, paged by 'collection'.
+        Pages after the first are fetched concurrently.
+        """
+        collection.concurrency = self.concurrency
+        return collection._iter_raw_items(
+            getter, limit=SAVED_PAGE_LIMIT, offset=0, retrieve_all=True
+        )
+
+    # =============================== Storage =================================#
+
+    @contextmanager
+    def _transaction(self):
+        """Holds the lock for a single write transaction, rolled back if anything raises"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _library_ids(self, item_type: str) -> set:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT item_id FROM library WHERE item_type = ?", (item_type,)
+            )
+            return {item_id for (item_id,) in rows}
+
+    def _store_items(self, item_type: str, infos: List[dict]):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?)",
+            [(item_type, info["id"], json.dumps(info)) for info in infos],
+        )
+
+    def _store_library(self, item_type: str, saved: List[dict], first_seq: int):
+        """Store and index saved items (as listed in pages, {item_type: info, 'added_at': ...}), oldest first"""
+        self._store_items(item_type, [raw[item_type] for raw in saved])
+        terms = [item_terms(raw[item_type]) for raw in saved]
+        self._db.executemany(
+            "INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    item_type,
+                    raw[item_type]["id"],
+                    seq,
+                    raw.get("added_at"),
+                    json.dumps(item_terms),
+                )
+                for seq, (raw, item_terms) in enumerate(
+                    zip(saved, terms), first_seq
+                )
+            ],
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO terms VALUES (?, ?, ?, ?, ?)",
+            [
+                (item_type, term, raw[item_type]["id"], weight, seq)
+                for seq, (raw, item_terms) in enumerate(
+                    zip(saved, terms), first_seq
+                )
+                for term, weight in item_terms.items()
+            ],
+        )
+
+    def _remove_library(self, item_type: str, item_ids=None):
+        """Remove items from the library, and the search index. All of item_type if item_ids is None"""
+        if item_ids is None:
+            for table in ("library", "terms"):
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE item_type = ?", (item_type,)
+                )
+            return
+
+        for item_id in item_ids:
+            row = self._db.execute(
+                "SELECT terms FROM library WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            ).fetchone()
+            if row is None:
+                continue
+            self._db.executemany(
+                "DELETE FROM terms WHERE item_type = ? AND term = ? AND item_id = ?",
+                [(item_type, term, item_id) for term in json.loads(row[0])],
+            )
+            self._db.execute(
+                "DELETE FROM library WHERE item_type = ? AND item_id = ?",
+                (item_type, item_id),
+            )
+
+    def _store_playlist_tracks(self, playlist_id: str, raw_tracks: List[dict]):
+        tracks = [raw["track"] for raw in raw_tracks]
+        self._store_items(
+            "track",
+            [track for track in tracks if track is not None and track["id"]],
+        )
+        self._db.execute(
+            "DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,)
+        )
+        self._db.executemany(
+            "INSERT INTO playlist_tracks VALUES (?, ?, ?)",
+            [
+                (playlist_id, position, None if track is None else track["id"])
+                for position, track in enumerate(tracks)
+            ],
+        )
+
+    def _prune(self):
+        """Drop the info of items that are no longer saved, followed, or in a followed playlist"""
+        with self._transaction():
+            self._db.execute(
+                """DELETE FROM items WHERE NOT EXISTS (
+                    SELECT 1 FROM library
+                    WHERE library.item_type = items.item_type AND library.item_id = items.item_id
+                ) AND NOT (
+                    items.item_type = 'track' AND EXISTS (
+                        SELECT 1 FROM playlist_tracks WHERE track_id = items.item_id
+                    )
+                )"""
+            )
+
+    def _mark_synced(self, item_type: str):
+        self._db.execute(
+            "INSERT OR REPLACE INTO synced VALUES (?, ?, 0)",
+            (item_type, time.time()),
+        )
+
+    def invalidate(self, item_type: str):
+        """
+        Record that item_type was changed since it was synced, so it isn't read from the mirror until
+        it is synced again. What was mirrored is kept, so that sync can still be incremental.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE synced SET stale = 1 WHERE item_type = ?", (item_type,)
+            )
+
+    def clear(self):
+        """Drop everything mirrored"""
+        with self._transaction():
+            for table in ("items", "library", "playlist_tracks", "synced", "terms"):
+                self._db.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.close()
+            self._db = None
+
+
+class MirroredCollection(ItemCollection):
+    """
+    A read-only view of one type of the mirrored library, items are built from the mirrored info.
+    Listing it never sends a request, but it is only as up to date as the last sync.
+    """
+
+    def __init__(
+        self, sp: Spotify, mirror: LibraryMirror, item_type: str, item_class
+    ):
+        self.sp = sp
+        self.mirror = mirror
+        self.item_type = item_type
+        self.item_class = item_class
+
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Item]:
+        if retrieve_all:
+            limit, offset = None, 0
+        for item_id, info in self.mirror.library(self.item_type, limit, offset):
+            yield self.item_class(self.sp, item_id, info=info)
+
+    def contains(self, item: Item):
+        return self.mirror.in_library(self.item_type, item.id)
@@ -0,0 +1,200 @@
+"""
+This module contains the rate limiter the transport runs every request through.
+A single limiter is shared by every thread (and every facade) in the process, so bulk jobs
+spend one request budget instead of each worker hammering the API on its own.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# Requests per second allowed by default, spotify does not publish its limits
+DEFAULT_RATE = 20
+DEFAULT_MAX_RETRIES = 5
+# Base and cap, in seconds, of the jittered exponential backoff used for 5xx responses
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF = 30
+# A Retry-After longer than this is not waited out, the response is returned as is
+DEFAULT_MAX_RETRY_AFTER = 120
+# 5xx responses are only retried for these, a POST may have been applied before the server failed
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket refilled at 'rate' tokens per second, holding at most 'burst' tokens.
+    A rate of 0 or less never limits.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, returns how many seconds the caller must wait before using it.
+        Tokens can be borrowed against the future, so callers are served in the order they reserve.
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def parse_endpoint_limits(spec: str) -> dict:
+    """
+    Parse per-endpoint limits written as 'endpoint=rate' pairs seperated by commas,
+    for example: 'search=2, playlists=10, me/tracks=5'
+    """
+    limits = {}
+    for pair in spec.split(","):
+        if pair.strip() == "":
+            continue
+        endpoint, rate = pair.split("=")
+        limits[endpoint.strip().strip("/")] = float(rate)
+    return limits
+
+
+class RateLimiter:
+    """
+    Schedules requests against a token bucket for the whole API, plus an optional bucket per endpoint.
+
+    rate, burst: Requests per second allowed in total, and how many can be sent at once.
+    endpoint_limits: Maps an endpoint, the path after the API version (e.g. 'search' or 'me/tracks'),
+        to the requests per second allowed for it. The longest matching endpoint applies.
+    max_retries: How many times a 429 or 5xx response is retried. 5xx responses to a POST are never retried.
+    backoff_factor, max_backoff: Base and cap in seconds of the backoff used for 5xx responses,
+        and for 429 responses without a Retry-After header.
+    max_retry_after: Longest Retry-After that will be waited out.
+
+    'stats' counts the seconds spent throttled (waiting on a bucket or a Retry-After),
+    the seconds spent backing off, and the number of 429 and 5xx responses seen.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: float = None,
+        endpoint_limits: dict = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.endpoint_buckets = {
+            endpoint: TokenBucket(endpoint_rate)
+            for endpoint, endpoint_rate in (endpoint_limits or {}).items()
+        }
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.counters = {
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+            "rate_limited": 0,
+            "server_errors": 0,
+        }
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def endpoint(self, url: str) -> str:
+        """The endpoint a url belongs to, the path after the API version, e.g. 'playlists/<id>/tracks'"""
+        parts = [part for part in urlparse(url).path.split("/") if part]
+        return "/".join(parts[1:])
+
+    def _endpoint_bucket(self, url: str) -> TokenBucket:
+        endpoint = self.endpoint(url)
+        matches = [
+            key
+            for key in self.endpoint_buckets
+            if endpoint == key or endpoint.startswith(key + "/")
+        ]
+        if len(matches) == 0:
+            return None
+        return self.endpoint_buckets[max(matches, key=len)]
+
+    def count(self, name: str, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def reserve(self, url: str) -> float:
+        """
+        Reserve a slot for a request to 'url', returns how many seconds to wait before sending it.
+        Use this directly when waiting without blocking the thread, e.g. from a coroutine.
+        """
+        wait = self.bucket.reserve()
+        endpoint_bucket = self._endpoint_bucket(url)
+        if endpoint_bucket is not None:
+            wait = max(wait, endpoint_bucket.reserve())
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+        if wait <= 0:
+            return 0
+        self.count("throttled_seconds", wait)
+        return wait
+
+    def acquire(self, url: str):
+        """Block until a request to 'url' may be sent"""
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every request, from every thread, for 'seconds'"""
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + seconds
+            )
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to back off before retry number 'attempt' (from 0), with full jitter"""
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2**attempt)
+        )
+
+    def retry_delay(self, response, attempt: int, method: str = "GET") -> float:
+        """
+        Returns how long to wait before retrying 'response' to a 'method' request, or None if it should not be retried.
+        429s pause every thread for the Retry-After, 5xx responses back off this thread only.
+        5xx responses are only retried for idempotent methods, since the request may have been applied anyway.
+        """
+        if response.status_code == 429:
+            self.count("rate_limited")
+            if attempt >= self.max_retries:
+                return None
+            try:
+                delay = float(response.headers["Retry-After"])
+            except (KeyError, ValueError):
+                delay = self.backoff(attempt)
+            if delay > self.max_retry_after:
+                return None
+            self.pause(delay)
+            # acquire() will wait out the pause
+            return 0
+
+        if response.status_code >= 500:
+            self.count("server_errors")
+            if method.upper() not in IDEMPOTENT_METHODS:
+                return None
+            if attempt >= self.max_retries:
+                return None
+            delay = self.backoff(attempt)
+            self.count("backoff_seconds", delay)
+            return delay
+
+        return None
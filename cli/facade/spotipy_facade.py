@@ -1,11 +1,35 @@
 """This module contains a facade class built on top of spotipy Spotify wrapper"""
-from typing import List
+import atexit
+import hashlib
+import json
+import threading
+from typing import Iterable, Iterator, List, Tuple
 
 import spotipy
 from decouple import config
+from spotipy import SpotifyException
 from spotipy.oauth2 import SpotifyOAuth
 
-from cli.facade.interfaces import Item, ItemCollection
+from cli.facade.cache import DEFAULT_MAX_ENTRIES, ItemCache, SqliteItemCache
+from cli.facade.concurrency import DEFAULT_CONCURRENCY, chunked, ordered_map
+from cli.facade.interfaces import (
+    CompactItem,
+    Item,
+    ItemCollection,
+    expand_collections,
+)
+from cli.facade.mirror import MIRROR_TYPES, LibraryMirror, MirroredCollection
+from cli.facade.rate_limit import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_RATE,
+    RateLimiter,
+    parse_endpoint_limits,
+)
+from cli.facade.transport import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    Transport,
+)
 
 from cli.facade.items import Artist, Playlist, Track, Album, Episode, Show
 from cli.facade.user_libary import (
@@ -16,9 +40,47 @@ from cli.facade.user_libary import (
     SavedEpisodes,
     SavedShows,
 )
-from tests.dummy_spotipy import DummySpotipy
 
 USE_DUMMY_WRAPPER = config("USE_DUMMY_WRAPPER", cast=bool, default=False)
+MAX_CONCURRENCY = config(
+    "MAX_CONCURRENCY", cast=int, default=DEFAULT_CONCURRENCY
+)
+# HTTP transport, the connection pool defaults to one connection per concurrent request
+HTTP_POOL_SIZE = config("HTTP_POOL_SIZE", cast=int, default=MAX_CONCURRENCY)
+HTTP_CONNECT_TIMEOUT = config(
+    "HTTP_CONNECT_TIMEOUT", cast=float, default=DEFAULT_CONNECT_TIMEOUT
+)
+HTTP_READ_TIMEOUT = config(
+    "HTTP_READ_TIMEOUT", cast=float, default=DEFAULT_READ_TIMEOUT
+)
+HTTP_GZIP = config("HTTP_GZIP", cast=bool, default=True)
+# Requests per second across the whole process, 0 disables the limit
+RATE_LIMIT = config("RATE_LIMIT", cast=float, default=DEFAULT_RATE)
+RATE_LIMIT_BURST = config("RATE_LIMIT_BURST", cast=float, default=RATE_LIMIT)
+# Per-endpoint requests per second, e.g. 'search=2, me/tracks=5'
+RATE_LIMIT_ENDPOINTS = config(
+    "RATE_LIMIT_ENDPOINTS", cast=parse_endpoint_limits, default=""
+)
+RATE_LIMIT_RETRIES = config(
+    "RATE_LIMIT_RETRIES", cast=int, default=DEFAULT_MAX_RETRIES
+)
+# Item metadata is cached on disk between invocations, except when testing with the dummy wrapper
+ITEM_CACHE = config("ITEM_CACHE", cast=bool, default=not USE_DUMMY_WRAPPER)
+ITEM_CACHE_PATH = config("ITEM_CACHE_PATH", default=".item_cache.sqlite3")
+ITEM_CACHE_SIZE = config(
+    "ITEM_CACHE_SIZE", cast=int, default=DEFAULT_MAX_ENTRIES
+)
+# Where API requests are sent, and a static token to send instead of going through OAuth.
+# Both are meant for pointing the app at a stub of the API (see tests/stub_server.py)
+SPOTIFY_API_PREFIX = config("SPOTIFY_API_PREFIX", default="")
+SPOTIFY_ACCESS_TOKEN = config("SPOTIFY_ACCESS_TOKEN", default="")
+# The local mirror of the user's library, updated by 'sync'. The dummy wrapper's only lives in memory
+LIBRARY_MIRROR_PATH = config(
+    "LIBRARY_MIRROR_PATH",
+    default=":memory:" if USE_DUMMY_WRAPPER else ".library_mirror.sqlite3",
+)
+# The current user's id is remembered here, so it doesn't cost a request per invocation
+IDENTITY_CACHE_PATH = config("IDENTITY_CACHE_PATH", default=".identity_cache")
 SCOPE = "playlist-modify-private \
             user-follow-read \
             user-follow-modify \
@@ -28,9 +90,41 @@ SCOPE = "playlist-modify-private \
             playlist-read-collaborative \
             playlist-modify-public"
 
+# Max number of ids accepted in a single request by each bulk getter
+BULK_LIMITS = {
+    "track": 50,
+    "album": 20,
+    "artist": 50,
+    "episode": 50,
+    "show": 50,
+}
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def shared_rate_limiter() -> RateLimiter:
+    """The process wide RateLimiter, configured with RATE_LIMIT*, shared by every facade"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                rate=RATE_LIMIT,
+                burst=RATE_LIMIT_BURST,
+                endpoint_limits=RATE_LIMIT_ENDPOINTS,
+                max_retries=RATE_LIMIT_RETRIES,
+            )
+        return _rate_limiter
+
 
-# If testing locally, use the dummy wrapper
-SpotifyWrapper = DummySpotipy if USE_DUMMY_WRAPPER else spotipy.Spotify
+def spotify_wrapper():
+    """Returns the Spotify class to use. If testing locally, use the dummy wrapper"""
+    if USE_DUMMY_WRAPPER:
+        from tests.dummy_spotipy import DummySpotipy
+
+        return DummySpotipy
+    return spotipy.Spotify
 
 
 class SpotipyFacade:
@@ -38,19 +132,46 @@ class SpotipyFacade:
     A facade for simplifying interaction with spotipy's Spotify object.
     """
 
-    def __init__(self, output_object=None):
+    def __init__(
+        self,
+        output_object=None,
+        concurrency=MAX_CONCURRENCY,
+        item_cache=None,
+        transport=None,
+        mirror=None,
+    ):
         """
         output_object: Optional, any function capable of printing text. If configured with an object, this is where the facade will send output.
+        concurrency: Optional, max number of requests the facade and its collections will have in flight at once.
+        item_cache: Optional, an ItemCache used for item metadata. Defaults to the on-disk cache configured with ITEM_CACHE*.
+        transport: Optional, the Transport every request is sent through. Defaults to one configured with HTTP_*.
+        mirror: Optional, the LibraryMirror read-only queries can be answered from. Defaults to the one at LIBRARY_MIRROR_PATH,
+            opened on first use.
         """
-        self.sp = SpotifyWrapper(
-            auth_manager=SpotifyOAuth(
-                client_id=config("SPOTIPY_CLIENT_ID"),
-                client_secret=config("SPOTIPY_CLIENT_SECRET"),
-                redirect_uri=config("SPOTIPY_REDIRECT_URI"),
-                scope=SCOPE,
+        if transport is None:
+            transport = Transport(
+                pool_size=HTTP_POOL_SIZE,
+                connect_timeout=HTTP_CONNECT_TIMEOUT,
+                read_timeout=HTTP_READ_TIMEOUT,
+                gzip=HTTP_GZIP,
+                limiter=shared_rate_limiter(),
             )
+        self.transport: Transport = transport
+        self.auth_manager = SpotifyOAuth(
+            client_id=config("SPOTIPY_CLIENT_ID"),
+            client_secret=config("SPOTIPY_CLIENT_SECRET"),
+            redirect_uri=config("SPOTIPY_REDIRECT_URI"),
+            scope=SCOPE,
+            **transport.spotify_kwargs(),
         )
-        self.user_id = self.sp.me()["id"]
+        self.sp = spotify_wrapper()(
+            auth=SPOTIFY_ACCESS_TOKEN or None,
+            auth_manager=self.auth_manager,
+            **transport.spotify_kwargs(),
+        )
+        if SPOTIFY_API_PREFIX:
+            self.sp.prefix = SPOTIFY_API_PREFIX
+        self._user_id = None
         self.types = {
             "playlist": {"item": Playlist, "collection": FollowedPlaylists},
             "artist": {"item": Artist, "collection": FollowedArtists},
@@ -82,6 +203,96 @@ class SpotipyFacade:
         }
 
         self.output = output_object
+        self.concurrency = concurrency
+
+        if item_cache is None and ITEM_CACHE:
+            item_cache = SqliteItemCache(
+                ITEM_CACHE_PATH, max_entries=ITEM_CACHE_SIZE
+            )
+            atexit.register(item_cache.close)
+        self.item_cache: ItemCache = item_cache
+        Item.cache = item_cache
+        self._mirror = mirror
+        self._mirror_lock = threading.Lock()
+
+    @property
+    def mirror(self) -> LibraryMirror:
+        """The local mirror of the user's library, opened on first use"""
+        if self._mirror is None:
+            with self._mirror_lock:
+                if self._mirror is None:
+                    mirror = LibraryMirror(
+                        LIBRARY_MIRROR_PATH, concurrency=self.concurrency
+                    )
+                    atexit.register(mirror.close)
+                    self._mirror = mirror
+        return self._mirror
+
+    def library_changed(self, item_type: str):
+        """
+        Call after adding items to, or removing them from, the user's library or one of their playlists.
+        The mirror of item_type (or of the playlists) is invalidated, so it isn't read until synced again.
+        """
+        self.mirror.invalidate(self.elongate(item_type))
+
+    def sync_mirror(self, item_types: List[str] = None, full=False) -> dict:
+        """
+        Bring the local mirror up to date for each of item_types (short or long), all mirrored types by default.
+        See LibraryMirror.sync for what is fetched, and what is returned.
+
+        Sends an error message to self.output, if configured, and returns None if any item type can't be mirrored.
+        """
+        item_types = list(
+            dict.fromkeys(
+                self.elongate(item_type)
+                for item_type in item_types or MIRROR_TYPES
+            )
+        )
+        for item_type in item_types:
+            if item_type not in MIRROR_TYPES:
+                if self.output is not None:
+                    self.output(f"Item of type '{item_type}' not recognized!")
+                return None
+        return self.mirror.sync(self.sp, item_types, full=full)
+
+    @property
+    def user_id(self) -> str:
+        """
+        The current user's id. Read from the identity cache if it was written for the
+        currently cached token, otherwise requested from spotify (and cached) on first use.
+        """
+        if self._user_id is not None:
+            return self._user_id
+
+        fingerprint = self._token_fingerprint()
+        if fingerprint is not None:
+            try:
+                with open(IDENTITY_CACHE_PATH) as identity_file:
+                    identity = json.load(identity_file)
+                if identity["token"] == fingerprint:
+                    self._user_id = identity["id"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        if self._user_id is None:
+            self._user_id = self.sp.me()["id"]
+            if fingerprint is not None:
+                try:
+                    with open(IDENTITY_CACHE_PATH, "w") as identity_file:
+                        json.dump(
+                            {"id": self._user_id, "token": fingerprint},
+                            identity_file,
+                        )
+                except OSError:
+                    pass
+        return self._user_id
+
+    def _token_fingerprint(self) -> str:
+        """Hash of the cached refresh token, ties the cached identity to the logged in user"""
+        token = self.auth_manager.cache_handler.get_cached_token()
+        if token is None or "refresh_token" not in token:
+            return None
+        return hashlib.sha256(token["refresh_token"].encode()).hexdigest()
 
     def elongate(self, item_type: str):
         """
@@ -97,36 +308,264 @@ class SpotipyFacade:
         Returns an Item given item_type and item_id.
         See self.types for list of supported 'item_type's
         """
-        return self.types[item_type]["item"](self.sp, item_id)
+        item = self.types[item_type]["item"](self.sp, item_id)
+        # Compact items (albums) have no slot for it, and page with the class default
+        if isinstance(item, ItemCollection) and not isinstance(
+            item, CompactItem
+        ):
+            item.concurrency = self.concurrency
+        return item
+
+    def get_items(self, item_type: str, item_ids: List[str]) -> List[Item]:
+        """
+        Returns a list of Items given item_type and any number of item_ids, in the same order as item_ids.
+        Items that do not exist are returned as None.
+
+        Ids are looked up in the item cache first, the rest are requested in chunks as large as
+        the type's bulk getter accepts, with the chunks fetched concurrently.
+        Types without a bulk getter (playlists) are fetched one id at a time, concurrently.
+        """
+        item_type = self.elongate(item_type)
+        init_item = self.types[item_type]["item"]
+
+        infos = {}
+        uncached_ids = []
+        for item_id in dict.fromkeys(item_ids):
+            info = ItemCache.MISSING
+            if self.item_cache is not None:
+                info = self.item_cache.get(item_type, item_id)
+            if info is ItemCache.MISSING:
+                uncached_ids.append(item_id)
+            else:
+                infos[item_id] = info
+
+        if item_type in BULK_LIMITS:
+            chunks = chunked(uncached_ids, BULK_LIMITS[item_type])
+            get_chunk = lambda chunk: self._get_bulk(item_type, chunk)
+        else:
+            chunks = [[item_id] for item_id in uncached_ids]
+            get_chunk = lambda chunk: [init_item(self.sp, chunk[0]).info]
+
+        for chunk, raw_items in zip(
+            chunks, ordered_map(get_chunk, chunks, self.concurrency)
+        ):
+            for item_id, info in zip(chunk, raw_items):
+                infos[item_id] = info
+                if self.item_cache is not None and item_type in BULK_LIMITS:
+                    self.item_cache.set(item_type, item_id, info)
+
+        items = []
+        for item_id in item_ids:
+            info = infos[item_id]
+            items.append(
+                None if info is None else init_item(self.sp, item_id, info=info)
+            )
+        return items
 
-    def get_collection(self, item_type: str) -> ItemCollection:
+    def _get_bulk(self, item_type: str, item_ids: List[str]) -> List[dict]:
+        """
+        Fetch a single chunk of items with the bulk getter for item_type.
+        If spotify rejects the chunk (for example, because of a malformed id),
+        the ids are retried one by one so only the bad ids come back as None.
+        """
+        bulk_getter = getattr(self.sp, item_type + "s")
+        try:
+            return bulk_getter(item_ids)[item_type + "s"]
+        except SpotifyException as e:
+            if e.http_status != 400:
+                raise e
+
+        if len(item_ids) == 1:
+            return [None]
+        return [self._get_bulk(item_type, [item_id])[0] for item_id in item_ids]
+
+    def get_collection(self, item_type: str, mirrored=False) -> ItemCollection:
         """
         Returns an ItemCollection given item_type and item_id.
         See self.types for list of supported 'item_type's
+
+        If 'mirrored' is set, and item_type has been synced to the local mirror (and not changed since),
+        returns a read-only MirroredCollection which lists items without sending any requests.
         """
-        i_type = self.types[item_type] 
+        i_type = self.types[item_type]
+        if mirrored and "collection" in i_type:
+            item_type = self.elongate(item_type)
+            if self.mirror.is_current(item_type):
+                return MirroredCollection(
+                    self.sp, self.mirror, item_type, i_type["item"]
+                )
         if "collection" in i_type:
-            return i_type["collection"](self.sp)
+            collection = i_type["collection"](self.sp)
+            collection.concurrency = self.concurrency
+            return collection
         else:
             return None
 
-    def get_followed_items(self, item_type):
-        item_class = self.types[item_type]["collection"](self.sp)
-        return item_class.items()
+    def get_followed_items(self, item_type, mirrored=False):
+        item_class = self.get_collection(item_type, mirrored)
+        return item_class.items(retrieve_all=True)
 
-    def get_followed_item(
-        self, item_type: str, item_name: str = None, item_id: str = None
-    ) -> List[dict]:
-        item_class = self.types[item_type]["collection"](self.sp)
-        selected_items = []
-        for item in item_class.items():
-            name, cur_id = item.name, item.id
+    def expand_collection(
+        self, item_type: str, mirrored=False
+    ) -> Iterator[Tuple[ItemCollection, List[Item]]]:
+        """
+        Retrieve every album, show or playlist in the user's library, and then all the items
+        (tracks or episodes) of each of them at once, see expand_collections.
+        Yields (collection, items) for each one as soon as its items have arrived, in the order they complete.
+        At most self.concurrency requests are in flight at once, across all of them.
+
+        If 'mirrored' is set, the albums, shows or playlists are listed from the local mirror (see get_collection).
+
+        Sends an error message to self.output, if configured, and returns None if item_type
+        doesn't hold items of its own.
+        """
+        item_type = self.elongate(item_type)
+        item_class = self.types.get(item_type, {}).get("item")
+        if item_class is None or not issubclass(item_class, ItemCollection):
+            if self.output is not None:
+                self.output(f"Items of type '{item_type}' can't be expanded!")
+            return None
+
+        collections = self.get_collection(item_type, mirrored).items(
+            limit=50, retrieve_all=True
+        )
+        return expand_collections(collections, self.concurrency)
+
+    def export_items(
+        self, item_type: str, item_id: str = None, mirrored=False
+    ) -> Iterator[Item]:
+        """
+        Lazily yields every item of item_type in the user's library or, given an item_id,
+        every item (track or episode) in that playlist, album or show. Items are requested a page at a time,
+        as they are consumed, so any number of them can be streamed somewhere in constant memory.
+
+        If 'mirrored' is set, the user's library is read from the local mirror (see get_collection).
+
+        Sends an error message to self.output, if configured, and returns None if item_type is not valid,
+        or doesn't hold items of its own, or if no item exists with item_id.
+        """
+        item_type = self.elongate(item_type)
+        if item_type not in self.types:
+            if self.output is not None:
+                self.output(f"Item of type '{item_type}' not recognized!")
+            return None
+
+        if item_id is None:
+            collection = self.get_collection(item_type, mirrored)
+        else:
+            collection = self.get_item(item_type, item_id)
+            if not isinstance(collection, ItemCollection):
+                if self.output is not None:
+                    self.output(f"Items of type '{item_type}' hold no items!")
+                return None
+            if not collection.exists:
+                if self.output is not None:
+                    self.output(f"No {item_type} exists with id: {item_id}")
+                return None
+        limit = getattr(collection, "PAGE_LIMIT", 50)
+        return collection.iter_items(limit=limit, retrieve_all=True)
+
+    def import_items(
+        self, records: Iterable[Tuple[int, dict]], playlist: Playlist = None
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Generator, adds the items in 'records', (record number, record) pairs as read by transfer.read_records,
+        to the user's library (saving or following each, depending on its type) or, given a playlist, to the end of it.
+
+        Records are added in chunks of consecutive records of the same type: one request's worth for a playlist,
+        and enough for self.concurrency requests at once for the library. Only a chunk is held at a time.
+        Yields (record number, items added) after each chunk was added, where the record number is that of the
+        last record in the chunk, so an interrupted import can start over after the last number yielded.
+
+        Records without an id, with a type that isn't recognized, or that aren't tracks when adding to a playlist
+        are skipped, with an error message sent to self.output, if configured.
+        """
+        chunk, chunk_type, number = [], None, 0
+        for number, record in records:
+            item_type = self.elongate(record.get("type") or "")
             if (
-                item_name is not None and name.strip() == item_name.strip()
-            ) or item_id == cur_id:
-                selected_items.append(item)
+                not record.get("id")
+                or item_type not in self.types
+                or (playlist is not None and item_type != "track")
+            ):
+                if self.output is not None:
+                    self.output(f"Skipped record {number}: {record}")
+                continue
 
-        return None if len(selected_items) == 0 else selected_items
+            if chunk and item_type != chunk_type:
+                yield number - 1, self._import_chunk(
+                    chunk_type, chunk, playlist
+                )
+                chunk = []
+            chunk_type = item_type
+            chunk.append(record)
+
+            if playlist is not None:
+                chunk_size = Playlist.WRITE_LIMIT
+            else:
+                collection_class = self.types[item_type]["collection"]
+                chunk_size = getattr(collection_class, "ID_LIMIT", 1)
+                chunk_size *= max(self.concurrency, 1)
+            if len(chunk) >= chunk_size:
+                yield number, self._import_chunk(chunk_type, chunk, playlist)
+                chunk = []
+
+        if chunk:
+            yield number, self._import_chunk(chunk_type, chunk, playlist)
+
+    def _import_chunk(
+        self, item_type: str, records: List[dict], playlist: Playlist
+    ) -> int:
+        """Add a chunk of records of item_type to 'playlist', or to the user's library. Returns the number added"""
+        init_item = self.types[item_type]["item"]
+        # The records hold all that adding the items takes, so they aren't requested
+        items = [
+            init_item(
+                self.sp,
+                record["id"],
+                info={"id": record["id"], "name": record.get("name") or ""},
+            )
+            for record in records
+        ]
+        if playlist is not None:
+            playlist.add_many(items)
+            self.library_changed("playlist")
+        else:
+            self.get_collection(item_type).add_many(items)
+            self.library_changed(item_type)
+        return len(items)
+
+    def get_followed_item(
+        self,
+        item_type: str,
+        item_name: str = None,
+        item_id: str = None,
+        mirrored=False,
+        limit: int = None,
+    ) -> List[Item]:
+        """
+        Returns the items of item_type in the user's library matching item_name, best match first,
+        or the item with id item_id. Returns None if there are none.
+        Names, artists, album titles, descriptions and publishers are matched (see LibraryMirror.search).
+
+        Answered from the search index in the local mirror. Unless 'mirrored' is set, item_type is
+        synced first (see LibraryMirror.sync, after the first sync it only requests what changed).
+        Otherwise the mirror is searched as of the last sync, unless item_type was changed since.
+        """
+        item_type = self.elongate(item_type)
+        if not mirrored or not self.mirror.is_current(item_type):
+            self.mirror.sync(self.sp, [item_type])
+
+        if item_id is not None:
+            rows = []
+            if self.mirror.in_library(item_type, item_id):
+                rows.append((item_id, self.mirror.info(item_type, item_id)))
+        else:
+            rows = self.mirror.search(item_type, item_name or "", limit)
+
+        init_item = self.types[item_type]["item"]
+        items = [init_item(self.sp, i, info=info) for i, info in rows]
+        return None if len(items) == 0 else items
 
     def get_item_and_collection(self, item_type: str, item_id: str):
         """
@@ -147,13 +586,39 @@ class SpotipyFacade:
             return None, None
 
         # Check if the given item_id corresponds to an actual item
-        if item.info is None:
+        if not item.exists:
             if self.output is not None:
                 self.output(f"No {item_type} exists with id: {item_id}")
             return None, None
 
         return item, collection
 
+    def get_items_and_collection(self, item_type: str, item_ids: List[str]):
+        """
+        Like get_item_and_collection, but for any number of item_ids.
+        Items are fetched with get_items, so they are requested in bulk.
+
+        Sends an error message to self.output, if configured, for each id that does not exist.
+
+        Returns the list of items that exist (in the same order as item_ids) and an ItemCollection object,
+        or None, None if item_type is not valid.
+        """
+        collection = self.get_collection(item_type)
+        if collection is None:
+            if self.output is not None:
+                self.output(f"Item of type '{item_type}' not recognized!")
+            return None, None
+
+        items = []
+        for item_id, item in zip(item_ids, self.get_items(item_type, item_ids)):
+            if item is None:
+                if self.output is not None:
+                    self.output(f"No {item_type} exists with id: {item_id}")
+                continue
+            items.append(item)
+
+        return items, collection
+
     def search_public(self, item_type, query, limit=10, offset=0, market=None):
         raw_items = self.sp.search(query, limit, offset, item_type, market)
         init_item = self.types[item_type]["item"]
@@ -184,6 +649,7 @@ class SpotipyFacade:
             description=description,
         )
         if result is not None:
+            self.library_changed("playlist")
             playlist = self.get_item("playlist", result["id"])
             return playlist
         return None
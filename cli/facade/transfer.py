@@ -0,0 +1,98 @@
+"""
+This module contains the record formats used to export items to, and import them from, files.
+
+Every item is one record: its type, id and name, and the fields 'list' shows for it (artists, album, show,
+release date and url), as a line of NDJSON or a row of CSV. Records are written and read one at a time,
+so files of any size are handled in constant memory. Only the type and id of a record are needed to import it.
+"""
+import csv
+import json
+from itertools import islice
+from typing import IO, Iterable, Iterator, Tuple
+
+from cli.facade.interfaces import CompactItem, Item
+from cli.facade.items import spotify_url
+
+FORMATS = ("ndjson", "csv")
+# Every field a record can have, in the order they are written. Fields an item type doesn't have are left out (or empty)
+COLUMNS = (
+    "type",
+    "id",
+    "name",
+    "artists",
+    "album",
+    "show",
+    "release_date",
+    "url",
+)
+# Seperates the artists of a record in a CSV cell
+ARTIST_SEPERATOR = "; "
+
+
+def guess_format(path: str, fmt: str = None) -> str:
+    """The format 'fmt', or if it isn't given, the one matching the extension of 'path' (NDJSON by default)"""
+    if fmt is not None:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(
+                f"Format '{fmt}' not recognized, use one of: {', '.join(FORMATS)}"
+            )
+        return fmt
+    if path is not None and path.lower().endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+
+def item_record(item: Item) -> dict:
+    """The record for 'item', as a dict holding only the fields it has"""
+    record = {"type": item.type, "id": item.id, "name": item.name}
+    for field in ("artists", "album", "show", "release_date"):
+        value = getattr(item, field, None)
+        if value is not None:
+            record[field] = list(value) if field == "artists" else value
+    if isinstance(item, CompactItem):
+        url = item.url
+    else:
+        url = spotify_url(item.info or {})
+    if url is not None:
+        record["url"] = url
+    return record
+
+
+def write_records(items: Iterable[Item], file: IO, fmt: str) -> int:
+    """Write a record per item to 'file', as each item arrives. Returns the number of records written"""
+    if fmt == "csv":
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+
+    count = 0
+    for item in items:
+        record = item_record(item)
+        if fmt == "csv":
+            if "artists" in record:
+                record["artists"] = ARTIST_SEPERATOR.join(record["artists"])
+            writer.writerow(record)
+        else:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def read_records(
+    file: IO, fmt: str, start: int = 0
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Lazily yield (record number, record) for every record in 'file', numbered from 1 (the CSV header isn't a record).
+    The first 'start' records are skipped, NDJSON ones without being parsed.
+    """
+    if fmt == "csv":
+        rows = csv.DictReader(file)
+        for number, record in islice(enumerate(rows, 1), start, None):
+            if record.get("artists"):
+                record["artists"] = record["artists"].split(ARTIST_SEPERATOR)
+            yield number, record
+        return
+
+    lines = (line for line in file if line.strip())
+    for number, line in islice(enumerate(lines, 1), start, None):
+        yield number, json.loads(line)
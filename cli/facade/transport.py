@@ -0,0 +1,174 @@
+"""
+This module contains the HTTP transport shared by every request the facade makes.
+A single keep-alive session is used for the API and for token refreshes, with a connection pool
+sized to the facade's concurrency, so concurrent requests reuse sockets instead of opening new ones.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from cli.facade.rate_limit import RateLimiter
+
+# Seconds to wait for a connection to be established, and for the server to send a response
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 5
+
+STAT_NAMES = ("requests", "connections", "wire_bytes", "decoded_bytes")
+
+
+class TransportStats:
+    """
+    Thread safe counters for a Transport.
+    'connections' counts every socket the pools opened, so 'requests' - 'connections' were
+    served over a reused socket. 'wire_bytes' is the size of the response bodies as sent
+    (compressed, when gzip was negotiated), 'decoded_bytes' is their size once decompressed.
+    """
+
+    def __init__(self):
+        self.counters = dict.fromkeys(STAT_NAMES, 0)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+        return stats
+
+
+def counting_pool(pool_class, stats: TransportStats):
+    """Returns a subclass of the urllib3 pool_class that counts the connections it opens in stats"""
+
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            stats.count("connections")
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose pools block when every connection is busy, rather than opening
+    throwaway connections past pool_maxsize, and that count the connections they open.
+    """
+
+    def __init__(self, stats: TransportStats, **kwargs):
+        self.stats = stats
+        super().__init__(pool_block=True, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting_pool(HTTPConnectionPool, self.stats),
+            "https": counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+
+class TransportSession(requests.Session):
+    """
+    A requests Session that records the size of every response in stats.
+    If given a RateLimiter, every request is scheduled through it, and 429/5xx responses are retried
+    (5xx responses only for idempotent methods).
+    """
+
+    def __init__(self, stats: TransportStats, limiter: RateLimiter = None):
+        super().__init__()
+        self.stats = stats
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        if self.limiter is None:
+            return self._send(request, **kwargs)
+
+        attempt = 0
+        while True:
+            self.limiter.acquire(request.url)
+            response = self._send(request, **kwargs)
+            delay = self.limiter.retry_delay(response, attempt, request.method)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.stats.count("requests")
+        if not kwargs.get("stream", False):
+            self.stats.count("decoded_bytes", len(response.content))
+            self.stats.count("wire_bytes", response.raw.tell())
+        return response
+
+
+class Transport:
+    """
+    Builds and owns the session shared by the spotipy client and its auth manager.
+
+    pool_size: Max number of connections kept open per host, match it to the facade's concurrency.
+    connect_timeout, read_timeout: Seconds before giving up on connecting, or on a response.
+    gzip: Ask for gzip compressed responses.
+    limiter: Optional, a RateLimiter every request is scheduled through, which also retries
+        429 and 5xx responses. Without one, responses are returned as they come.
+    retries: How many times urllib3 retries failed connections.
+    """
+
+    def __init__(
+        self,
+        pool_size: int,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        gzip: bool = True,
+        limiter: RateLimiter = None,
+        retries: int = 3,
+    ):
+        self.pool_size = max(pool_size, 1)
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = TransportStats()
+        self.limiter = limiter
+
+        # Statuses are left to the limiter, which shares its backoff between threads
+        retry = Retry(
+            total=retries,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+            backoff_factor=0.3,
+            respect_retry_after_header=False,
+        )
+        adapter = PooledAdapter(
+            self.stats,
+            pool_connections=2,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        self.session = TransportSession(self.stats, limiter)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = (
+            "gzip" if gzip else "identity"
+        )
+
+    def spotify_kwargs(self) -> dict:
+        """Keyword arguments that hand this transport to spotipy.Spotify and its auth managers"""
+        return {
+            "requests_session": self.session,
+            "requests_timeout": self.timeout,
+        }
+
+    def snapshot(self) -> dict:
+        """Transport counters, merged with the limiter's, if there is one"""
+        stats = self.stats.snapshot()
+        if self.limiter is not None:
+            stats.update(self.limiter.stats())
+        return stats
+
+    def close(self):
+        self.session.close()
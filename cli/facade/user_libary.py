@@ -4,10 +4,11 @@ All classes require a spotify instance for instantiation.
 All classes assume that the instance in question is configured to manage a user, 
 i.e. the Auth Manager used was a SpotifyOAuth object, (or implicit grant?... TODO: Look into that)
 """
-from typing import List
+from typing import Iterator, List
 
 from spotipy import Spotify
 
+from cli.facade.concurrency import ordered_map
 from cli.facade.interfaces import Item, ItemCollection, Mutable
 from cli.facade.items import Episode, Track, Artist, Album, Playlist, Show
 
@@ -17,24 +18,24 @@ class SavedEpisodes(ItemCollection, Mutable):
     Class for managing the current user's saved episodes
     """
 
+    # Max number of ids accepted by the saved episodes endpoints
+    ID_LIMIT = 50
+
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Episode]:
-        raw_episodes = self._items(
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Episode]:
+        raw_episodes = self._iter_raw_items(
             self.sp.current_user_saved_episodes,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_episodes is None:
-            return None
-
-        episodes = []
         for episode in raw_episodes:
             ep = episode["episode"]
-            episodes.append(Episode(self.sp, ep["id"], ep))
-        return episodes
+            yield Episode(self.sp, ep["id"], ep)
 
     def add(self, item: Episode, **kwargs):
         self.sp.current_user_saved_episodes_add(episodes=[item.id])
@@ -47,30 +48,55 @@ class SavedEpisodes(ItemCollection, Mutable):
             0
         ]
 
+    def contains_many(self, items: List[Episode]) -> List[bool]:
+        return self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_episodes_contains(
+                episodes=ids
+            ),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def add_many(self, items: List[Episode], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_episodes_add(episodes=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def remove_many(self, items: List[Episode], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_episodes_delete(
+                episodes=ids
+            ),
+            items,
+            self.ID_LIMIT,
+        )
+
 
 class SavedTracks(ItemCollection, Mutable):
     """
     Class for managing the current user's saved tracks
     """
 
+    # Max number of ids accepted by the saved tracks endpoints
+    ID_LIMIT = 50
+
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Track]:
-        raw_tracks = self._items(
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Track]:
+        raw_tracks = self._iter_raw_items(
             self.sp.current_user_saved_tracks,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_tracks is None:
-            return None
-
-        tracks = []
-        for track in tracks:
+        for track in raw_tracks:
             track = track["track"]
-            tracks.append(Track(self.sp, track["id"], track))
-        return tracks
+            yield Track(self.sp, track["id"], track)
 
     def add(self, item: Track, **kwargs):
         self.sp.current_user_saved_tracks_add(tracks=[item.id])
@@ -81,30 +107,51 @@ class SavedTracks(ItemCollection, Mutable):
     def contains(self, item: Track):
         return self.sp.current_user_saved_tracks_contains(tracks=[item.id])[0]
 
+    def contains_many(self, items: List[Track]) -> List[bool]:
+        return self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_tracks_contains(tracks=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def add_many(self, items: List[Track], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_tracks_add(tracks=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def remove_many(self, items: List[Track], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_tracks_delete(tracks=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
 
 class SavedShows(ItemCollection, Mutable):
     """
     Class for managing the current user's saved shows
     """
 
+    # Max number of ids accepted by the saved shows endpoints
+    ID_LIMIT = 50
+
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Show]:
-        raw_shows = self._items(
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Show]:
+        raw_shows = self._iter_raw_items(
             self.sp.current_user_saved_shows,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_shows is None:
-            return None
-
-        shows = []
         for show in raw_shows:
             show = show["show"]
-            shows.append(Show(self.sp, show["id"], show))
-        return shows
+            yield Show(self.sp, show["id"], show)
 
     def contains(self, item: Show):
         return self.sp.current_user_saved_shows_contains(shows=[item.id])[0]
@@ -115,30 +162,51 @@ class SavedShows(ItemCollection, Mutable):
     def remove(self, item: Item, **kwargs):
         self.sp.current_user_saved_shows_delete(shows=[item.id])
 
+    def contains_many(self, items: List[Show]) -> List[bool]:
+        return self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_shows_contains(shows=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def add_many(self, items: List[Show], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_shows_add(shows=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def remove_many(self, items: List[Show], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_shows_delete(shows=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
 
 class SavedAlbums(ItemCollection, Mutable):
     """
     Class for managing the current user's saved ablums
     """
 
+    # Max number of ids accepted by the saved albums endpoints
+    ID_LIMIT = 20
+
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Album]:
-        raw_albums = self._items(
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Album]:
+        raw_albums = self._iter_raw_items(
             self.sp.current_user_saved_albums,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_albums is None:
-            return None
-
-        albums = []
         for album in raw_albums:
             album = album["album"]
-            albums.append(Album(self.sp, album["id"], album))
-        return albums
+            yield Album(self.sp, album["id"], album)
 
     def add(self, item: Album, **kwargs):
         self.sp.current_user_saved_albums_add(albums=[item.id])
@@ -149,6 +217,27 @@ class SavedAlbums(ItemCollection, Mutable):
     def contains(self, item: Album):
         return self.sp.current_user_saved_albums_contains(albums=[item.id])[0]
 
+    def contains_many(self, items: List[Album]) -> List[bool]:
+        return self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_albums_contains(albums=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def add_many(self, items: List[Album], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_albums_add(albums=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
+    def remove_many(self, items: List[Album], **kwargs):
+        self._id_chunk_calls(
+            lambda ids: self.sp.current_user_saved_albums_delete(albums=ids),
+            items,
+            self.ID_LIMIT,
+        )
+
 
 class FollowedPlaylists(ItemCollection, Mutable):
     """
@@ -158,20 +247,17 @@ class FollowedPlaylists(ItemCollection, Mutable):
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Playlist]:
-        raw_playlists = self._items(
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Playlist]:
+        raw_playlists = self._iter_raw_items(
             self.sp.current_user_playlists,
             limit=limit,
             offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_playlists is None:
-            return None
-
-        playlists = []
         for playlist in raw_playlists:
-            playlists.append(Playlist(self.sp, playlist["id"], info=playlist))
-        return playlists
+            yield Playlist(self.sp, playlist["id"], info=playlist)
 
     def add(self, item: Playlist, **kwargs):
         self.sp.current_user_follow_playlist(playlist_id=item.id)
@@ -182,39 +268,51 @@ class FollowedPlaylists(ItemCollection, Mutable):
     def contains(self, item: Playlist):
         return self.sp.playlist_is_following(item.id, [self.sp.me()["id"]])[0]
 
+    def contains_many(self, items: List[Playlist]) -> List[bool]:
+        user_id = self.sp.me()["id"]
+        is_following = lambda item: self.sp.playlist_is_following(
+            item.id, [user_id]
+        )[0]
+        return list(ordered_map(is_following, items, self.concurrency))
+
+    # Playlists can only be followed and unfollowed one at a time, so those requests are sent concurrently
+    def add_many(self, items: List[Playlist], **kwargs):
+        list(ordered_map(self.add, items, self.concurrency))
+
+    def remove_many(self, items: List[Playlist], **kwargs):
+        list(ordered_map(self.remove, items, self.concurrency))
+
 
 class FollowedArtists(ItemCollection, Mutable):
     """
     Class for managing the current user's followed artists
     """
 
+    # Max number of ids accepted by the followed artists endpoints
+    ID_LIMIT = 50
+
     def __init__(self, sp: Spotify):
         self.sp: Spotify = sp
 
-    def items(self, limit=20, offset=0, retrieve_all=False) -> List[Artist]:
+    def iter_items(
+        self, limit=20, offset=0, retrieve_all=False
+    ) -> Iterator[Artist]:
         # Wrap 'current_user_followed_artists' because the return format is different
         # from all other current user followed/saved get functions, for some reason.
         def wrapped_cur_followed_artists(*args, **kwargs):
-            if "offset" in kwargs:
-                kwargs.pop("offset")
             res = self.sp.current_user_followed_artists(*args, **kwargs)
             if res is None:
                 return None
             return res["artists"]
 
-        raw_artists = self._items(
+        # Followed artists are paged by cursor, the endpoint does not accept an offset
+        raw_artists = self._iter_raw_items(
             wrapped_cur_followed_artists,
             limit=limit,
-            offset=offset,
             retrieve_all=retrieve_all,
         )
-        if raw_artists is None:
-            return None
-
-        artists = []
         for artist in raw_artists:
-            artists.append(Artist(self.sp, artist["id"], artist))
-        return artists
+            yield Artist(self.sp, artist["id"], artist)
 
     def add(self, item: Artist, **kwargs):
         self.sp.user_follow_artists([item.id])
@@ -224,3 +322,16 @@ class FollowedArtists(ItemCollection, Mutable):
 
     def contains(self, item: Artist):
         return self.sp.current_user_following_artists([item.id])[0]
+
+    def contains_many(self, items: List[Artist]) -> List[bool]:
+        return self._id_chunk_calls(
+            self.sp.current_user_following_artists, items, self.ID_LIMIT
+        )
+
+    def add_many(self, items: List[Artist], **kwargs):
+        self._id_chunk_calls(self.sp.user_follow_artists, items, self.ID_LIMIT)
+
+    def remove_many(self, items: List[Artist], **kwargs):
+        self._id_chunk_calls(
+            self.sp.user_unfollow_artists, items, self.ID_LIMIT
+        )
@@ -1,13 +1,15 @@
 """A CLI app for interacting with Spotify. It's a work in progress, so please be patient."""
 
+import os
 import sys
 import textwrap
+import threading
+from contextlib import nullcontext
 from typing import List, Tuple
 from itertools import zip_longest
 
 import typer
 
-import cli.facade.spotipy_facade as SF
 from cli.app_strings import (
     General,
     Create,
@@ -18,22 +20,116 @@ from cli.app_strings import (
     Save,
     Unsave,
     Edit,
+    Cache,
+    Stats,
+    Sync,
+    Transfer,
+    Batch,
+    Daemon,
 )
 
-# Allow arguments to be piped in via stdin
-if __name__ == "__main__" and not sys.stdin.isatty():
-    piped_arguments = sys.stdin.readline().rstrip("\n").split(" ")
-    if len(piped_arguments) > 0:
-        sys.argv.extend(piped_arguments)
+# Allow arguments to be piped in via stdin, unless stdin is being read as a file of IDs, or of commands
+if (
+    __name__ == "__main__"
+    and not sys.stdin.isatty()
+    and "-" not in sys.argv[1:]
+):
+    from cli.client import command_name
+
+    if command_name(sys.argv[1:]) != "batch":
+        piped_arguments = sys.stdin.readline().rstrip("\n").split(" ")
+        sys.argv.extend(arg for arg in piped_arguments if arg != "")
+
+
+class LazyFacade:
+    """
+    Stands in for a SpotipyFacade, which is only imported and built the first time it is used.
+    This keeps authorization, network requests, and the heavier imports (spotipy, requests, decouple)
+    off of paths that never touch spotify, like '--help' or a command with bad arguments.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._facade = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._facade is None:
+            with self._lock:
+                if self._facade is None:
+                    import cli.facade.spotipy_facade as SF
+
+                    self._facade = SF.SpotipyFacade(**self._kwargs)
+        return getattr(self._facade, name)
+
+
+spot = LazyFacade(output_object=typer.echo)
+
+
+def echo_wrapped(item):
+    """Print an item, wrapping each of its lines at 80 characters"""
+    for line in str(item).split("\n"):
+        for sub_line in textwrap.wrap(line, width=80):
+            typer.echo(sub_line)
+
+
+def read_ids(path: str) -> List[str]:
+    """Read whitespace or newline seperated IDs from the file at 'path' ('-' reads stdin)"""
+    if path == "-":
+        return sys.stdin.read().split()
+    with open(path) as id_file:
+        return id_file.read().split()
+
+
+def collect_ids(item_ids: List[str], from_file: str) -> List[str]:
+    """
+    Combine IDs given as arguments with any read from 'from_file'.
+    Exits if no IDs were given at all.
+    """
+    item_ids = [] if item_ids is None else item_ids
+    if from_file is not None:
+        item_ids = item_ids + read_ids(from_file)
+    if len(item_ids) == 0:
+        typer.echo(General.no_ids)
+        sys.exit(1)
+    return item_ids
+
+
+class State(threading.local):
+    """
+    Global options, set by the callback. Kept per thread,
+    so commands run at once by the daemon (see cli/daemon.py) each see their own
+    """
+
+    mirror = False
+
+
+state = State()
 
-spot = SF.SpotipyFacade(output_object=typer.echo)
 app = typer.Typer(no_args_is_help=True)
 edit_app = typer.Typer()
 app.add_typer(edit_app, name="edit", help=Edit.help)
+cache_app = typer.Typer()
+app.add_typer(cache_app, name="cache", help=Cache.help)
+
+
+def print_http_stats():
+    """Print the facade's transport counters to stderr, if the facade was ever built"""
+    if spot._facade is None:
+        return
+    typer.echo(Stats.header, err=True)
+    for name, value in spot.transport.snapshot().items():
+        if isinstance(value, float):
+            value = round(value, 3)
+        typer.echo(Stats.stat.format(name, value), err=True)
 
 
 @app.callback()
-def callback():
+def callback(
+    ctx: typer.Context,
+    stats: bool = typer.Option(False, "--stats", help=Stats.help),
+    mirror: bool = typer.Option(False, "--mirror", help=Sync.mirror_help),
+):
     """
     A CLI app for interacting with Spotify. It's a work in progress, so please 
     be patient.
@@ -50,6 +146,9 @@ def callback():
 
     pl, tr, al, ar, sh, ep
     """
+    if stats:
+        ctx.call_on_close(print_http_stats)
+    state.mirror = mirror
 
 
 @app.command(no_args_is_help=True)
@@ -69,9 +168,9 @@ def create(
     """
     # Check if you already have a playlist with name 'pl_name'
     name_exists = False
-    followed_playlists = spot.get_collection("playlist").items(
-        retrieve_all=True
-    )
+    followed_playlists = spot.get_collection(
+        "playlist", mirrored=state.mirror
+    ).items(retrieve_all=True)
     if followed_playlists is not None:
         for playlist in followed_playlists:
             if name == playlist.name:
@@ -101,19 +200,23 @@ def follow(
     item_type: str = typer.Argument(
         ..., help="Item type to follow: 'playlist' or 'artist'"
     ),
-    item_id: str = typer.Argument(..., help=Follow.id_help),
+    item_ids: List[str] = typer.Argument(None, help=Follow.id_help),
+    from_file: str = typer.Option(
+        None, "--from-file", "-f", help=General.from_file_help
+    ),
 ):
-    """Follow a followable item"""
-    item, collection = spot.get_item_and_collection(
-        item_type=item_type, item_id=item_id
-    )
+    """Follow one or more followable items"""
+    item_ids = collect_ids(item_ids, from_file)
+    items, collection = spot.get_items_and_collection(item_type, item_ids)
+    if collection is None:
+        sys.exit(1)
 
-    if item is not None and collection is not None:
-        collection.add(item)
+    collection.add_many(items)
+    spot.library_changed(item_type)
+    for item in items:
         typer.echo(Follow.followed.format(item.type, item.name, item.id))
-        sys.exit(0)
 
-    sys.exit(1)
+    sys.exit(0 if len(items) == len(item_ids) else 1)
 
 
 @app.command(no_args_is_help=True)
@@ -121,19 +224,23 @@ def save(
     item_type: str = typer.Argument(
         ..., help="Item type to save: 'album', 'track', 'show', or 'episode'"
     ),
-    item_id: str = typer.Argument(..., help=Follow.id_help),
+    item_ids: List[str] = typer.Argument(None, help=Save.id_help),
+    from_file: str = typer.Option(
+        None, "--from-file", "-f", help=General.from_file_help
+    ),
 ):
-    """Save a saveable item"""
-    item, collection = spot.get_item_and_collection(
-        item_type=item_type, item_id=item_id
-    )
+    """Save one or more saveable items"""
+    item_ids = collect_ids(item_ids, from_file)
+    items, collection = spot.get_items_and_collection(item_type, item_ids)
+    if collection is None:
+        sys.exit(1)
 
-    if item is not None and collection is not None:
-        collection.add(item)
+    collection.add_many(items)
+    spot.library_changed(item_type)
+    for item in items:
         typer.echo(Save.saved.format(item.type, item.name, item.id))
-        sys.exit(0)
 
-    sys.exit(1)
+    sys.exit(0 if len(items) == len(item_ids) else 1)
 
 
 @app.command(no_args_is_help=True)
@@ -141,41 +248,48 @@ def unfollow(
     item_type: str = typer.Argument(
         ..., help="Item type to follow: 'playlist' or 'artist'"
     ),
-    item_id: str = typer.Argument(..., help=Unfollow.id_help),
+    item_ids: List[str] = typer.Argument(None, help=Unfollow.id_help),
     no_prompt: bool = typer.Option(
         False,
         "--no-prompt",
         "-n",
         help=Unfollow.no_prompt_help,
     ),
+    from_file: str = typer.Option(
+        None, "--from-file", "-f", help=General.from_file_help
+    ),
 ):
     """
-    Unfollow an item; remove it from your library.
+    Unfollow one or more items; remove them from your library.
     This "deletes" playlists you've created.
     """
-    # Retrieve item matching item_id
-    item, collection = spot.get_item_and_collection(
-        item_type=item_type, item_id=item_id
-    )
-
-    if item is None or collection is None:
+    # Retrieve items matching item_ids
+    item_ids = collect_ids(item_ids, from_file)
+    items, collection = spot.get_items_and_collection(item_type, item_ids)
+    if collection is None:
         sys.exit(1)
+    status = 0 if len(items) == len(item_ids) else 1
 
-    # If '--no-prompt' was not used, confirm Unfollow with user
-    confirm_Unfollow = False
+    # If '--no-prompt' was not used, confirm each Unfollow with user
     if not no_prompt:
-        confirm_Unfollow = typer.confirm(
-            text=Unfollow.confirm.format(item.type, item.name, item.id)
-        )
-    else:
-        confirm_Unfollow = True
+        items = [
+            item
+            for item in items
+            if typer.confirm(
+                text=Unfollow.confirm.format(item.type, item.name, item.id)
+            )
+        ]
+
+    if len(items) == 0:
+        typer.echo(General.op_canceled)
+        sys.exit(status)
 
-    if confirm_Unfollow:
-        collection.remove(item)
+    collection.remove_many(items)
+    spot.library_changed(item_type)
+    for item in items:
         typer.echo(Unfollow.unfollowed_item.format(item.name, item.id))
-        sys.exit(0)
 
-    typer.echo(General.op_canceled)
+    sys.exit(status)
 
 
 @app.command(no_args_is_help=True)
@@ -183,19 +297,23 @@ def unsave(
     item_type: str = typer.Argument(
         ..., help="Item type to unsave: 'album', 'track', 'show', or 'episode'"
     ),
-    item_id: str = typer.Argument(..., help=Follow.id_help),
+    item_ids: List[str] = typer.Argument(None, help=Unsave.id_help),
+    from_file: str = typer.Option(
+        None, "--from-file", "-f", help=General.from_file_help
+    ),
 ):
-    """Unsave a saveable item"""
-    item, collection = spot.get_item_and_collection(
-        item_type=item_type, item_id=item_id
-    )
+    """Unsave one or more saveable items"""
+    item_ids = collect_ids(item_ids, from_file)
+    items, collection = spot.get_items_and_collection(item_type, item_ids)
+    if collection is None:
+        sys.exit(1)
 
-    if item is not None and collection is not None:
-        collection.remove(item)
+    collection.remove_many(items)
+    spot.library_changed(item_type)
+    for item in items:
         typer.echo(Unsave.unsaved.format(item.type, item.name, item.id))
-        sys.exit(0)
 
-    sys.exit(1)
+    sys.exit(0 if len(items) == len(item_ids) else 1)
 
 
 @app.command(no_args_is_help=True)
@@ -220,14 +338,19 @@ def search(
         typer.echo(Search.list_all)
         spot.print_items(
             print_func=typer.echo,
-            items=spot.get_followed_items(item_type),
+            items=spot.get_followed_items(item_type, state.mirror),
         )
     elif query == "":
         typer.Exit(code=1)
 
     # Search through user created items, and user followed items
     elif user:
-        items = spot.get_followed_item(item_type=item_type, item_name=query)
+        items = spot.get_followed_item(
+            item_type=item_type,
+            item_name=query,
+            mirrored=state.mirror,
+            limit=limit,
+        )
         if items is None:
             typer.echo(General.not_found.format(query))
             sys.exit(1)
@@ -257,12 +380,31 @@ def list(
     retrieve_all: bool = typer.Option(
         False, "--retrieve-all", "-A", help=Listing.ret_all_help
     ),
+    expand: bool = typer.Option(
+        False, "--expand", "-E", help=Listing.expand_help
+    ),
 ):
     """
     List out items you have saved/followed.
     """
-    
-    collection = spot.get_collection(item_type)
+    if expand:
+        expanded = spot.expand_collection(item_type, mirrored=state.mirror)
+        if expanded is None:
+            sys.exit(1)
+
+        typer.echo(Listing.listing.format(spot.elongate(item_type)))
+        typer.echo(Listing.ret_all)
+        # Each collection is printed as soon as all of its items have arrived
+        for collection, items in expanded:
+            typer.echo("=" * 80)
+            echo_wrapped(collection)
+            typer.echo(Listing.expanded.format(len(items), collection.name))
+            for item in items:
+                typer.echo("-" * 80)
+                echo_wrapped(item)
+        return
+
+    collection = spot.get_collection(item_type, mirrored=state.mirror)
     if collection is None:
         typer.echo(f"Collection for type {item_type} does not exist")
         sys.exit(1)
@@ -272,14 +414,186 @@ def list(
         typer.echo(Listing.params.format(limit, offset))
     else:
         typer.echo(Listing.ret_all)
-    for item in collection.items(
+    # Stream the items so output starts as soon as the first page arrives
+    for item in collection.iter_items(
         limit=limit, offset=offset, retrieve_all=retrieve_all
     ):
         typer.echo("-" * 80)
-        for line in str(item).split("\n"):
-            wrapped = textwrap.wrap(line, width=80)
-            for sub_line in wrapped:
-                typer.echo(sub_line)
+        echo_wrapped(item)
+
+
+@app.command()
+def sync(
+    item_types: List[str] = typer.Argument(None, help=Sync.types_help),
+    full: bool = typer.Option(False, "--full", "-F", help=Sync.full_help),
+):
+    """
+    Update the local mirror of your library, only fetching what changed since the last sync.
+    Use '--mirror' before any command to have it read your library from the mirror.
+    """
+    results = spot.sync_mirror(item_types, full=full)
+    if results is None:
+        sys.exit(1)
+
+    for item_type, result in results.items():
+        if item_type == "playlist":
+            line = Sync.synced_playlists.format(result["items"], result["new"])
+        else:
+            line = Sync.synced.format(item_type, result["items"], result["new"])
+        typer.echo(line + (Sync.full if result["full"] else ""))
+
+
+@app.command(no_args_is_help=True)
+def export(
+    item_type: str = typer.Argument(..., help=Transfer.type_help),
+    item_id: str = typer.Argument(None, help=Transfer.id_help),
+    output: str = typer.Option(
+        None, "--output", "-o", help=Transfer.output_help
+    ),
+    fmt: str = typer.Option(None, "--format", "-f", help=Transfer.format_help),
+):
+    """
+    Export items you have saved/followed, or the tracks of a playlist, to NDJSON or CSV, a page at a time
+    """
+    from cli.facade.transfer import guess_format, write_records
+
+    try:
+        fmt = guess_format(output, fmt)
+    except ValueError as e:
+        typer.echo(e)
+        sys.exit(1)
+
+    items = spot.export_items(item_type, item_id, mirrored=state.mirror)
+    if items is None:
+        sys.exit(1)
+
+    if output is None:
+        count = write_records(items, sys.stdout, fmt)
+    else:
+        with open(output, "w", newline="", encoding="utf-8") as out_file:
+            count = write_records(items, out_file, fmt)
+    typer.echo(Transfer.exported.format(count), err=True)
+
+
+@app.command("import", no_args_is_help=True)
+def import_items(
+    path: str = typer.Argument(..., help=Transfer.path_help),
+    playlist_id: str = typer.Argument(None, help=Transfer.playlist_help),
+    fmt: str = typer.Option(None, "--format", "-f", help=Transfer.format_help),
+    start: int = typer.Option(0, "--start", "-s", help=Transfer.start_help),
+    resume: bool = typer.Option(
+        False, "--resume", "-r", help=Transfer.resume_help
+    ),
+):
+    """
+    Import items exported with 'export' into your library, or into a playlist, in chunks.
+    An interrupted import can be picked up where it stopped with '--resume'.
+    """
+    from cli.facade.transfer import guess_format, read_records
+
+    try:
+        fmt = guess_format(path, fmt)
+    except ValueError as e:
+        typer.echo(e)
+        sys.exit(1)
+
+    # The number of the last record imported is kept next to the file, until the import finishes
+    progress_path = None if path == "-" else path + ".progress"
+    if resume and progress_path is not None:
+        try:
+            with open(progress_path) as progress_file:
+                start = int(progress_file.read())
+        except (OSError, ValueError):
+            pass
+    if start > 0:
+        typer.echo(Transfer.resuming.format(start + 1))
+
+    playlist = None
+    if playlist_id is not None:
+        playlist = spot.get_item("playlist", playlist_id)
+        if not playlist.exists:
+            typer.echo(General.item_DNE.format("Playlist", "id", playlist_id))
+            sys.exit(1)
+
+    if path == "-":
+        in_file = nullcontext(sys.stdin)
+    else:
+        in_file = open(path, newline="", encoding="utf-8")
+    imported = 0
+    with in_file as in_file:
+        records = read_records(in_file, fmt, start)
+        for number, added in spot.import_items(records, playlist):
+            imported += added
+            if progress_path is not None:
+                with open(progress_path, "w") as progress_file:
+                    progress_file.write(str(number))
+    if progress_path is not None and os.path.exists(progress_path):
+        os.remove(progress_path)
+    typer.echo(Transfer.imported.format(imported))
+
+
+@app.command()
+def batch(
+    path: str = typer.Argument("-", help=Batch.path_help),
+    as_json: bool = typer.Option(False, "--json", "-j", help=Batch.json_help),
+    concurrency: int = typer.Option(
+        None, "--concurrency", "-c", help=Batch.concurrency_help
+    ),
+):
+    """
+    Run many commands, one per line (e.g. 'save track ID'), in this one process, printing the result of each in order.
+    Consecutive save, unsave, follow and 'unfollow --no-prompt' lines of the same item type are done in bulk,
+    and consecutive list and search lines are run at once. Commands can't prompt, so they get the default answer.
+    """
+    import json
+
+    from cli.batch import run_batch
+
+    concurrency = spot.concurrency if concurrency is None else concurrency
+    if path == "-":
+        in_file = nullcontext(sys.stdin)
+    else:
+        in_file = open(path, encoding="utf-8")
+    count = failed = 0
+    with in_file as in_file:
+        command = typer.main.get_command(app)
+        for result in run_batch(command, spot, in_file, concurrency):
+            count += 1
+            failed += result.exit_code != 0
+            if as_json:
+                typer.echo(json.dumps(result._asdict(), ensure_ascii=False))
+                continue
+            typer.echo(
+                Batch.result.format(
+                    result.line, result.exit_code, result.command
+                )
+            )
+            typer.echo(result.stdout, nl=False)
+            typer.echo(result.stderr, nl=False, err=True)
+    typer.echo(Batch.summary.format(count, failed), err=True)
+    sys.exit(0 if failed == 0 else 1)
+
+
+@app.command()
+def daemon(
+    socket_path: str = typer.Option(
+        None, "--socket", "-s", help=Daemon.socket_help
+    ),
+    idle_timeout: float = typer.Option(
+        600, "--idle-timeout", "-t", help=Daemon.idle_help
+    ),
+):
+    """
+    Keep the app running in the background, serving commands sent with 'python -m cli.client',
+    so they don't have to start up, log in and connect to spotify every time.
+    The client starts a daemon by itself if none is running.
+    """
+    from cli.daemon import SOCKET_PATH, serve
+
+    socket_path = SOCKET_PATH if socket_path is None else socket_path
+    if not serve(app, socket_path, idle_timeout):
+        typer.echo(Daemon.running.format(socket_path), err=True)
+        sys.exit(1)
 
 
 @edit_app.command(no_args_is_help=True)
@@ -288,7 +602,7 @@ def add(
         ..., help="ID of playlist to add tracks to"
     ),
     track_ids: List[str] = typer.Argument(
-        ...,
+        None,
         help=Edit.Add.track_ids_help,
     ),
     insert_at: str = typer.Option(
@@ -300,10 +614,15 @@ def add(
         "-u/-U",
         help=Edit.Add.unique_help,
     ),
+    from_file: str = typer.Option(
+        None, "--from-file", "-f", help=Edit.Add.from_file_help
+    ),
 ):
     """
     Add tracks to a playlist you own or are a collaborator on.
     """
+    track_ids = collect_ids(track_ids, from_file)
+
     collection = spot.get_item("playlist", playlist_id)
 
     if insert_at is None:
@@ -314,17 +633,31 @@ def add(
             for tk in insert_at.rstrip().split(";")
         ]
 
-    for track_id, index_list in zip_longest(
-        track_ids, insert_at, fillvalue=[None]
+    # Plan every insert first, so they can be sent to spotify in as few requests as possible
+    items, positions = [], []
+    added_ids = set()
+    for item, track_id, index_list in zip_longest(
+        spot.get_items("track", track_ids),
+        track_ids,
+        insert_at[: len(track_ids)],
+        fillvalue=[None],
     ):
-        item = spot.get_item("track", track_id)
-        if add_if_unique and collection.contains(item):
+        if item is None:
+            typer.echo(General.item_DNE.format("Track", "id", track_id))
+            continue
+        if add_if_unique and (
+            item.id in added_ids or collection.contains(item)
+        ):
             typer.echo(Edit.Add.not_unique)
             continue
 
+        added_ids.add(item.id)
         for index in index_list:
-            position = index
-            collection.add(item, position=position)
+            items.append(item)
+            positions.append(index)
+
+    collection.add_many(items, positions)
+    spot.library_changed("playlist")
 
 
 @edit_app.command(no_args_is_help=True)
@@ -358,9 +691,72 @@ def remove(
             for tk in specific.rstrip().split(";")
         ]
 
-    items = [spot.get_item("track", track_id) for track_id in track_ids]
+    # Drop tracks that do not exist, along with their position lists
+    items, positions = [], []
+    for item, track_id, position_list in zip_longest(
+        spot.get_items("track", track_ids),
+        track_ids,
+        specific[: len(track_ids)],
+    ):
+        if item is None:
+            typer.echo(General.item_DNE.format("Track", "id", track_id))
+            continue
+        items.append(item)
+        positions.append(position_list)
+
     collection.remove(
-        items, positions=specific, all=all, offset=offset, count=count
+        items, positions=positions, all=all, offset=offset, count=count
+    )
+    spot.library_changed("playlist")
+
+
+@edit_app.command(no_args_is_help=True)
+def dedupe(
+    playlist_id: str = typer.Argument(..., help="ID of playlist to dedupe"),
+    keep_last: bool = typer.Option(
+        False, "--keep-last/--keep-first", "-L/-F", help=Edit.Dedupe.keep_help
+    ),
+):
+    """
+    Remove duplicate tracks from a playlist you own, or are a collaborator on
+    """
+    playlist = spot.get_item("playlist", playlist_id)
+    if not playlist.exists:
+        typer.echo(General.item_DNE.format("Playlist", "id", playlist_id))
+        sys.exit(1)
+
+    removed = playlist.dedupe(keep="last" if keep_last else "first")
+    spot.library_changed("playlist")
+    typer.echo(Edit.Dedupe.removed.format(removed))
+
+
+@edit_app.command("sync", no_args_is_help=True)
+def sync_playlist(
+    source_id: str = typer.Argument(
+        ..., help="ID of playlist to copy tracks from"
+    ),
+    playlist_id: str = typer.Argument(..., help="ID of playlist to update"),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", "-n", help=Edit.Sync.dry_run_help
+    ),
+):
+    """
+    Make a playlist you own, or are a collaborator on, hold the same tracks as another, in the same order
+    """
+    playlists = []
+    for item_id in (source_id, playlist_id):
+        playlist = spot.get_item("playlist", item_id)
+        if not playlist.exists:
+            typer.echo(General.item_DNE.format("Playlist", "id", item_id))
+            sys.exit(1)
+        playlists.append(playlist)
+    source, playlist = playlists
+
+    plan = playlist.sync_from(source, dry_run=dry_run)
+    if not dry_run:
+        spot.library_changed("playlist")
+    typer.echo(
+        (Edit.Sync.planned if dry_run else Edit.Sync.synced).format(**plan)
     )
 
 
@@ -388,6 +784,33 @@ def details(
         collaborative=collaborative,
         description=description,
     )
+    spot.library_changed("playlist")
+
+
+@cache_app.command("stats")
+def cache_stats():
+    """
+    Show hit/miss counters and the number of entries in the item cache
+    """
+    if spot.item_cache is None:
+        typer.echo(Cache.disabled)
+        sys.exit(1)
+
+    for name, value in spot.item_cache.stats().items():
+        typer.echo(Cache.stat.format(name, value))
+
+
+@cache_app.command("clear")
+def cache_clear():
+    """
+    Remove every entry from the item cache
+    """
+    if spot.item_cache is None:
+        typer.echo(Cache.disabled)
+        sys.exit(1)
+
+    spot.item_cache.clear()
+    typer.echo(Cache.cleared)
 
 
 if __name__ == "__main__":
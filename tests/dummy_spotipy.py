@@ -1,42 +1,124 @@
-""" 
-This module contains a dummy wrapper used for local testing. 
+"""
+This module contains a dummy wrapper used for local testing.
 The dummy wrapper emulates some behavior of the spotipy Spotify API wrapper.
+
+Items live in a StubData catalog (the same data model the stub server uses), indexed by type and id,
+and the user's library is kept per type, most recently added first, like the real API returns it.
+Paged getters honor limit and offset (or the 'after' cursor, for followed artists) and return
+pages with 'total' and 'next', playlists carry a snapshot_id that changes on every edit,
+and 'populate' fills the catalog and library with a synthetic data set of any size.
+
+Unlike spotipy, single item getters return None for ids that do not exist, instead of raising.
 """
 
-from typing import List
+from typing import Iterable, List
+
+from spotipy import SpotifyException
+
+from tests.stub_server import (
+    DEFAULT_ADDED_AT,
+    ITEM_TYPES,
+    StubData,
+    page,
+    parse_fields,
+    project,
+)
+
+API_PREFIX = "https://api.spotify.com/v1/"
+USER_ID = "123_fake_user_id"
+
+
+def to_id(item: str) -> str:
+    """Ids can be passed as ids or uris ('spotify:track:<id>'), like to spotipy"""
+    return item.rsplit(":", 1)[-1]
+
+
+class Library:
+    """Saved or followed ids of one type, most recently added first, with constant time membership"""
+
+    def __init__(self):
+        self.ids = []
+        self._members = set()
+        # id -> index in self.ids, rebuilt on first use after a change
+        self._positions = None
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._members
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, item_ids: Iterable[str]) -> List[str]:
+        """
+        Add ids one after another, so the last one ends up first.
+        Returns the ids that were not in the library already.
+        """
+        new_ids = [i for i in dict.fromkeys(item_ids) if i not in self._members]
+        if new_ids:
+            self.ids[:0] = new_ids[::-1]
+            self._members.update(new_ids)
+            self._positions = None
+        return new_ids
+
+    def remove(self, item_ids: Iterable[str]):
+        dropped = self._members.intersection(item_ids)
+        if dropped:
+            self.ids = [i for i in self.ids if i not in dropped]
+            self._members -= dropped
+            self._positions = None
+
+    def position(self, item_id: str) -> int:
+        if self._positions is None:
+            self._positions = {i: pos for pos, i in enumerate(self.ids)}
+        return self._positions[item_id]
 
 
 class DummySpotipy:
-    def __init__(self, auth_manager=None):
+    def __init__(self, auth_manager=None, **kwargs):
         self.pl_id_count = 0
-        self.data = {
-            "id": "123_fake_user_id",
-        }
-
-        self.items = {
-            "artist": {"items": []},
-            "album": {"items": []},
-            "track": {"items": []},
-            "episode": {"items": []},
-            "show": {"items": []},
-            "playlist": {"items": []},
-        }
-        self.ext_items = {
-            "artist": {"items": []},
-            "album": {"items": []},
-            "track": {"items": []},
-            "episode": {"items": []},
-            "show": {"items": []},
-            "playlist": {"items": []},
-        }
+        self.user = {"id": USER_ID, "display_name": USER_ID, "type": "user"}
+        self.data = StubData()
+        self.lock = self.data.lock
+        self.library = {item_type: Library() for item_type in ITEM_TYPES}
+        # Every snapshot_id each playlist has had, edits against any other are rejected
+        self.snapshots = {}
+
+    def populate(self, **kwargs):
+        """Fill the catalog and library with a synthetic data set, see StubData.populate for the arguments"""
+        with self.lock:
+            self.data.populate(**kwargs)
+            for item_type in ITEM_TYPES:
+                saved = self.data.library[item_type]
+                self.library[item_type].add(reversed(saved))
+        return self
+
+    @staticmethod
+    def error(status: int, msg: str):
+        return SpotifyException(status, -1, msg)
 
     # ============================= General ===================================#
 
     def me(self):
-        return self.data
-
-    def search(self, q, limit=10, offset=0, type="", market=None):
-        return {"playlists": self.items["playlist"]}
+        return self.user
+
+    def search(self, q, limit=10, offset=0, type="track", market=None):
+        query = q.lower()
+        results = {}
+        for item_type in type.split(","):
+            if item_type not in ITEM_TYPES:
+                raise self.error(400, "Bad search type field")
+            matches = [
+                item["id"]
+                for item in self.data.catalog[item_type].values()
+                if query in item["name"].lower()
+            ]
+            convert = self.data.catalog[item_type].__getitem__
+            if item_type == "playlist":
+                convert = self.simple_playlist
+            results[item_type + "s"] = page(
+                matches, limit, offset, API_PREFIX + "search", convert
+            )
+        return results
 
     def create_item(
         self,
@@ -46,178 +128,253 @@ class DummySpotipy:
         extern=False,
         additional_properties: dict = None,
     ):
-        collection = self.items
-        if extern:
-            collection = self.ext_items
-
-        item = {"name": item_name, "id": item_id}
-        if additional_properties is not None:
-            item.update(additional_properties)
-
-        collection[item_type]["items"].append(item)
-
-    def select_item(self, item_type, item_id, extern: int = 0):
         """
-        extern: 0 = search user collection, 1 = search public (external) collection, 2 = search both
+        Add an item to the catalog, and unless 'extern' is set to the user's library too.
+        Fields the facade reads get placeholder values, 'additional_properties' overrides them.
         """
-        item = None
-        collection = self.items[item_type]["items"]
-        if extern == 1:
-            collection = self.ext_items[item_type]["items"]
-        elif extern == 2:
-            collection.extend(self.ext_items[item_type]["items"])
-
-        for cur_item in collection:
-            cur_id = cur_item["id"]
-            if cur_id == item_id:
-                item = cur_item
-                break
-        return item
-
-    def add_item(self, item_type, item_id):
-        item = self.select_item(item_type, item_id, extern=1)
-        self.items[item_type]["items"].append(item)
-        self.ext_items[item_type]["items"].remove(item)
-
-    def remove_item(self, item_type, item_id):
-        item = self.select_item(item_type, item_id, extern=0)
-        self.ext_items[item_type]["items"].append(item)
-        self.items[item_type]["items"].remove(item)
-
-    def contains(self, item_type, item_id, extern=0):
-        item = self.select_item(
-            item_type=item_type, item_id=item_id, extern=extern
+        with self.lock:
+            self.data.add(
+                item_type,
+                item_id,
+                name=item_name,
+                **(additional_properties or {}),
+            )
+            if not extern:
+                self.add_to_library(item_type, [item_id])
+
+    def delete_item(self, item_type, item_id):
+        """Remove an item from the catalog, and from the user's library"""
+        with self.lock:
+            self.library[item_type].remove([item_id])
+            self.data.catalog[item_type].pop(item_id, None)
+
+    def add_to_library(self, item_type: str, item_ids: List[str]):
+        """Save ids to the library, recording when each new one was added"""
+        for item_id in self.library[item_type].add(item_ids):
+            self.data.stamp(item_type, item_id)
+
+    def get_item(self, item_type: str, item_id: str) -> dict:
+        return self.data.catalog[item_type].get(to_id(item_id))
+
+    def get_items(self, item_type: str, item_ids: List[str]) -> dict:
+        return {
+            item_type + "s": [self.get_item(item_type, i) for i in item_ids]
+        }
+
+    def saved_page(self, item_type: str, limit: int, offset: int) -> dict:
+        catalog = self.data.catalog[item_type]
+        return page(
+            self.library[item_type].ids,
+            limit,
+            offset,
+            f"{API_PREFIX}me/{item_type}s",
+            lambda item_id: {
+                "added_at": self.data.saved_at(item_type, item_id),
+                item_type: catalog[item_id],
+            },
         )
-        return item is not None
+
+    def contains(self, item_type: str, item_ids: List[str]) -> List[bool]:
+        library = self.library[item_type]
+        return [to_id(item_id) in library for item_id in item_ids]
+
+    def save(self, item_type: str, item_ids: List[str]):
+        item_ids = [to_id(item_id) for item_id in item_ids]
+        with self.lock:
+            for item_id in item_ids:
+                if item_id not in self.data.catalog[item_type]:
+                    raise self.error(400, f"Invalid id: {item_id}")
+            self.add_to_library(item_type, item_ids)
+
+    def unsave(self, item_type: str, item_ids: List[str]):
+        with self.lock:
+            self.library[item_type].remove(to_id(i) for i in item_ids)
 
     # ============================= Artists ===================================#
 
     def current_user_following_artists(self, ids: List[str]):
-        bools = []
-        for item_id in ids:
-            for artist in self.items["artist"]["items"]:
-                if item_id == artist["id"]:
-                    bools.append(True)
-                    break
-            else:
-                bools.append(False)
-        return bools
-
-    def current_user_followed_artists(self, limit=20):
-        return {"artists": self.items["artist"], "next": None}
+        return self.contains("artist", ids)
+
+    def current_user_followed_artists(self, limit=20, after=None):
+        artists = self.library["artist"]
+        with self.lock:
+            start = 0 if after is None else artists.position(after) + 1
+            ids = artists.ids[start : start + limit]
+        more = start + limit < len(artists)
+        after = ids[-1] if more and ids else None
+        url = f"{API_PREFIX}me/following"
+        return {
+            "artists": {
+                "href": url,
+                "items": [self.data.catalog["artist"][i] for i in ids],
+                "limit": limit,
+                "total": len(artists),
+                "cursors": {"after": after},
+                "next": (
+                    f"{url}?type=artist&after={after}&limit={limit}"
+                    if more
+                    else None
+                ),
+            }
+        }
 
     def artist(self, artist_id):
-        all_artists = (
-            self.items["artist"]["items"] + self.ext_items["artist"]["items"]
-        )
-        for artist in all_artists:
-            if artist_id == artist["id"]:
-                return artist
+        return self.get_item("artist", artist_id)
+
+    def artists(self, artists: List[str]):
+        return self.get_items("artist", artists)
 
     def user_follow_artists(self, ids):
-        for artist_id in ids:
-            self.add_item(item_type="artist", item_id=artist_id)
+        self.save("artist", ids)
 
     def user_unfollow_artists(self, ids):
-        for artist_id in ids:
-            self.remove_item(item_type="artist", item_id=artist_id)
+        self.unsave("artist", ids)
 
     def create_non_followed_artist(self, item_id, name=None):
-        nf_artist = {"name": name, "id": item_id}
-        self.ext_items["artist"]["items"].append(nf_artist)
+        self.create_item("artist", item_id, name, extern=True)
 
     # ============================ Playlists ==================================#
 
-    def create_non_followed_playlist(self, name, id=None):
+    def new_playlist_id(self) -> str:
         pl_id = "123_fake_playlist_id" + str(self.pl_id_count)
-        if id is not None:
-            pl_id = id
         self.pl_id_count += 1
-        pl = {
-            "name": name,
-            "id": pl_id,
-            "public": "False",
-            "collaborative": "False",
-            "description": "No description.",
-            "tracks": {"total": self.pl_id_count},
-            "owner": {
-                "display_name": f"test_owner_name{self.pl_id_count}",
-                "id": f"test_owner_id{self.pl_id_count}",
-            },
-            "external_urls": {
-                "spotify": f"test_external_url{self.pl_id_count}.com"
-            },
-        }
-        self.ext_items["playlist"]["items"].append(pl)
+        return pl_id
+
+    def create_non_followed_playlist(self, name, id=None):
+        with self.lock:
+            pl_id = self.new_playlist_id() if id is None else id
+            self.data.add("playlist", pl_id, name=name)
 
     def user_playlist_create(
         self,
         user,
         name,
-        public,
-        collaborative,
-        description,
+        public=True,
+        collaborative=False,
+        description="",
     ):
-        pl_id = "123_fake_playlist_id" + str(self.pl_id_count)
-        self.pl_id_count += 1
-        pl = {
-            "name": name,
-            "id": pl_id,
-            "public": public,
-            "collaborative": collaborative,
-            "description": description,
-            "tracks": {"total": self.pl_id_count},
-            "owner": {
-                "display_name": f"test_owner_name{self.pl_id_count}",
-                "id": f"test_owner_id{self.pl_id_count}",
-            },
-            "external_urls": {
-                "spotify": f"test_external_url{self.pl_id_count}.com"
-            },
+        with self.lock:
+            pl_id = self.new_playlist_id()
+            self.data.add(
+                "playlist",
+                pl_id,
+                name=name,
+                public=public,
+                collaborative=collaborative,
+                description=description,
+                owner={"id": user, "display_name": user},
+            )
+            self.library["playlist"].add([pl_id])
+            return self.playlist(pl_id)
+
+    def simple_playlist(self, playlist_id: str) -> dict:
+        """A playlist as listed in pages, with a summary of its tracks"""
+        playlist = self.data.catalog["playlist"][playlist_id]
+        tracks = {
+            "href": f"{API_PREFIX}playlists/{playlist_id}/tracks",
+            "total": len(self.data.playlist_tracks[playlist_id]),
         }
-        self.items["playlist"]["items"].append(pl)
-        return {"id": pl_id}
-
-    def user_playlists(self, user):
-        return self.items["playlist"]
-
-    def current_user_playlists(self, limit=20, offset=0):
-        stuff = {"next": None}
-        stuff.update(self.items["playlist"])
-        return stuff
+        return dict(playlist, tracks=tracks)
+
+    def user_playlists(self, user, limit=50, offset=0):
+        return self.current_user_playlists(limit=limit, offset=offset)
+
+    def current_user_playlists(self, limit=50, offset=0):
+        return page(
+            self.library["playlist"].ids,
+            limit,
+            offset,
+            f"{API_PREFIX}me/playlists",
+            self.simple_playlist,
+        )
 
     def current_user_follow_playlist(self, playlist_id):
-        self.add_item(
-            item_type="playlist",
-            item_id=playlist_id,
-        )
+        self.save("playlist", [playlist_id])
 
     def current_user_unfollow_playlist(self, playlist_id):
-        self.remove_item(item_type="playlist", item_id=playlist_id)
+        self.unsave("playlist", [playlist_id])
 
     def playlist_is_following(self, playlist_id, user_ids):
-        return [self.contains("playlist", playlist_id)]
+        return self.contains("playlist", [playlist_id]) * len(user_ids)
+
+    def playlist(self, playlist_id, fields=None, market=None, **kwargs):
+        playlist_id = to_id(playlist_id)
+        with self.lock:
+            playlist = self.data.catalog["playlist"].get(playlist_id)
+            if playlist is None:
+                return None
+            # Hand out a copy, like the real api would
+            tracks = self.playlist_items(playlist_id)
+            return self.projected(dict(playlist, tracks=tracks), fields)
+
+    @staticmethod
+    def projected(result: dict, fields: str) -> dict:
+        """The result, with only the 'fields' asked for (if any)"""
+        return (
+            result if fields is None else project(result, parse_fields(fields))
+        )
 
-    def playlist(self, playlist_id):
-        item = self.select_item("playlist", playlist_id, extern=0)
-        if item is not None:
-            return item
+    def edited_playlist(self, playlist_id: str, snapshot_id: str) -> dict:
+        """
+        The playlist about to be edited. Raises like the api does if it doesn't exist,
+        or if 'snapshot_id' was never one of its snapshots.
+        """
+        playlist = self.data.catalog["playlist"].get(playlist_id)
+        if playlist is None:
+            raise self.error(404, "Non existing id")
+        history = self.snapshots.setdefault(
+            playlist_id, {playlist["snapshot_id"]}
+        )
+        if snapshot_id is not None and snapshot_id not in history:
+            raise self.error(400, f"Invalid snapshot id: {snapshot_id}")
+        return playlist
 
-        return self.select_item("playlist", playlist_id, extern=1)
+    def new_snapshot(self, playlist) -> dict:
+        """Give a playlist a new snapshot_id after it changed, returns it the way the api does"""
+        self.data.touch(playlist)
+        self.snapshots[playlist["id"]].add(playlist["snapshot_id"])
+        return {"snapshot_id": playlist["snapshot_id"]}
 
     def playlist_add_items(self, playlist_id, items, position=None):
-        playlist = self.select_item("playlist", playlist_id, extern=0)
-
-        if "tracks" not in playlist:
-            playlist["tracks"] = {"items": []}
-        elif "items" not in playlist["tracks"]:
-            playlist["tracks"]["items"] = []
-        for item in items:
-            track = {"track": {"id": item, "name": f"track_{self.pl_id_count}"}}
-            if position is not None:
-                playlist["tracks"]["items"].insert(position, track)
+        """Ids not in the catalog are added to it, so tests can fill playlists with made up tracks"""
+        item_ids = [to_id(item) for item in items]
+        with self.lock:
+            playlist = self.edited_playlist(playlist_id, None)
+            for item_id in item_ids:
+                if item_id not in self.data.catalog["track"]:
+                    self.data.add("track", item_id, name=f"track {item_id}")
+            tracks = self.data.playlist_tracks[playlist_id]
+            if position is None:
+                tracks.extend(item_ids)
             else:
-                playlist["tracks"]["items"].append(track)
+                tracks[position:position] = item_ids
+            return self.new_snapshot(playlist)
+
+    def playlist_items(
+        self,
+        playlist_id,
+        fields=None,
+        limit=100,
+        offset=0,
+        market=None,
+        additional_types=("track", "episode"),
+    ):
+        playlist_id = to_id(playlist_id)
+        catalog = self.data.catalog["track"]
+        with self.lock:
+            if playlist_id not in self.data.playlist_tracks:
+                return None
+            result = page(
+                self.data.playlist_tracks[playlist_id],
+                limit,
+                offset,
+                f"{API_PREFIX}playlists/{playlist_id}/tracks",
+                lambda track_id: {
+                    "added_at": DEFAULT_ADDED_AT,
+                    "track": catalog[track_id],
+                },
+            )
+            return self.projected(result, fields)
 
     def playlist_tracks(
         self,
@@ -228,35 +385,56 @@ class DummySpotipy:
         market=None,
         additional_types=("track",),
     ):
-        tracks = self.select_item("playlist", playlist_id, extern=0)["tracks"]
-        tracks.update({"next": None})
-        return tracks
-
-    def playlist_remove_all_occurrences_of_items(self, playlist_id, items):
-        playlist = self.select_item("playlist", playlist_id)
-        tracks = playlist["tracks"]["items"]
-        for item_id in items:
-            count = 0
-            for i, track in enumerate(tracks):
-                if track["track"]["id"] == item_id:
-                    tracks[i] = "REMOVE"
-                    count += 1
-            for _ in range(count):
-                tracks.remove("REMOVE")
-
-    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items):
-        playlist = self.select_item("playlist", playlist_id)
-        tracks = playlist["tracks"]["items"]
-        count = 0
-        for item in items:
-            item_id, positions = item["uri"], item["positions"]
-            for pos in positions:
-                track = tracks[pos]
-                if track["track"]["id"] == item_id:
-                    tracks[pos] = "REMOVE"
-                    count += 1
-        for _ in range(count):
-            tracks.remove("REMOVE")
+        return self.playlist_items(
+            playlist_id, fields, limit, offset, market, additional_types
+        )
+
+    def playlist_remove_all_occurrences_of_items(
+        self, playlist_id, items, snapshot_id=None
+    ):
+        removed = {to_id(item) for item in items}
+        with self.lock:
+            playlist = self.edited_playlist(playlist_id, snapshot_id)
+            tracks = self.data.playlist_tracks[playlist_id]
+            tracks[:] = [track for track in tracks if track not in removed]
+            return self.new_snapshot(playlist)
+
+    def playlist_remove_specific_occurrences_of_items(
+        self, playlist_id, items, snapshot_id=None
+    ):
+        with self.lock:
+            playlist = self.edited_playlist(playlist_id, snapshot_id)
+            tracks = self.data.playlist_tracks[playlist_id]
+            removed = set()
+            for item in items:
+                item_id = to_id(item["uri"])
+                for pos in item["positions"]:
+                    if pos >= len(tracks) or tracks[pos] != item_id:
+                        raise self.error(400, f"No {item_id} at position {pos}")
+                    removed.add(pos)
+            tracks[:] = [t for i, t in enumerate(tracks) if i not in removed]
+            return self.new_snapshot(playlist)
+
+    def playlist_reorder_items(
+        self,
+        playlist_id,
+        range_start,
+        insert_before,
+        range_length=1,
+        snapshot_id=None,
+    ):
+        with self.lock:
+            playlist = self.edited_playlist(playlist_id, snapshot_id)
+            tracks = self.data.playlist_tracks[playlist_id]
+            end = range_start + range_length
+            if end > len(tracks) or insert_before > len(tracks):
+                raise self.error(400, "Index out of bounds")
+            moved = tracks[range_start:end]
+            del tracks[range_start:end]
+            if insert_before > range_start:
+                insert_before -= len(moved)
+            tracks[insert_before:insert_before] = moved
+            return self.new_snapshot(playlist)
 
     def playlist_change_details(
         self,
@@ -266,85 +444,114 @@ class DummySpotipy:
         collaborative=None,
         description=None,
     ):
-        playlist = self.select_item("playlist", playlist_id)
-        if name is not None:
-            playlist["name"] = name
-        if public is not None:
-            playlist["public"] = public
-        if collaborative is not None:
-            playlist["collaborative"] = collaborative
-        if description is not None:
-            playlist["description"] = description
+        with self.lock:
+            playlist = self.edited_playlist(playlist_id, None)
+            if name is not None:
+                playlist["name"] = name
+            if public is not None:
+                playlist["public"] = public
+            if collaborative is not None:
+                playlist["collaborative"] = collaborative
+            if description is not None:
+                playlist["description"] = description
 
     # ============================== Albums ===================================#
-    def album(self, album_id):
-        return self.select_item("album", album_id, extern=1)
+    def album(self, album_id, market=None):
+        return self.get_item("album", album_id)
+
+    def albums(self, albums: List[str], market=None):
+        return self.get_items("album", albums)
+
+    def album_tracks(self, album_id, limit=50, offset=0, market=None):
+        album_id = to_id(album_id)
+        if album_id not in self.data.catalog["album"]:
+            return None
+        return page(
+            self.data.album_tracks.get(album_id, []),
+            limit,
+            offset,
+            f"{API_PREFIX}albums/{album_id}/tracks",
+            self.data.catalog["track"].__getitem__,
+        )
 
-    def current_user_saved_albums(self, limit=10, offset=0, market=None):
-        albums = self.items["album"]
-        albums.update({"next": None})
-        return albums
+    def current_user_saved_albums(self, limit=20, offset=0, market=None):
+        return self.saved_page("album", limit, offset)
 
     def current_user_saved_albums_contains(self, albums: List[str]):
-        return [self.contains("album", albums[0], extern=0)]
+        return self.contains("album", albums)
 
     def current_user_saved_albums_add(self, albums: List[str]):
-        self.add_item("album", albums[0])
+        self.save("album", albums)
 
     def current_user_saved_albums_delete(self, albums: List[str]):
-        self.remove_item("album", albums[0])
+        self.unsave("album", albums)
 
     # ============================== Shows ====================================#
-    def show(self, show_id):
-        return self.select_item("show", show_id, extern=1)
+    def show(self, show_id, market=None):
+        return self.get_item("show", show_id)
+
+    def shows(self, shows: List[str], market=None):
+        return self.get_items("show", shows)
+
+    def show_episodes(self, show_id, limit=50, offset=0, market=None):
+        show_id = to_id(show_id)
+        if show_id not in self.data.catalog["show"]:
+            return None
+        return page(
+            self.data.show_episodes.get(show_id, []),
+            limit,
+            offset,
+            f"{API_PREFIX}shows/{show_id}/episodes",
+            self.data.catalog["episode"].__getitem__,
+        )
 
-    def current_user_saved_shows(self, limit=10, offset=0, market=None):
-        shows = self.items["show"]
-        shows.update({"next": None})
-        return shows
+    def current_user_saved_shows(self, limit=20, offset=0, market=None):
+        return self.saved_page("show", limit, offset)
 
     def current_user_saved_shows_contains(self, shows: List[str]):
-        return [self.contains("show", shows[0], extern=0)]
+        return self.contains("show", shows)
 
     def current_user_saved_shows_add(self, shows: List[str]):
-        self.add_item("show", shows[0])
+        self.save("show", shows)
 
     def current_user_saved_shows_delete(self, shows: List[str]):
-        self.remove_item("show", shows[0])
+        self.unsave("show", shows)
 
     # ============================= Episodes ==================================#
-    def episode(self, ep_id):
-        return self.select_item("episode", ep_id, extern=1)
+    def episode(self, ep_id, market=None):
+        return self.get_item("episode", ep_id)
 
-    def current_user_saved_episodes(self, limit=10, offset=0, market=None):
-        eps = self.items["episode"]
-        eps.update({"next": None})
-        return eps
+    def episodes(self, episodes: List[str], market=None):
+        return self.get_items("episode", episodes)
+
+    def current_user_saved_episodes(self, limit=20, offset=0, market=None):
+        return self.saved_page("episode", limit, offset)
 
     def current_user_saved_episodes_contains(self, episodes: List[str]):
         """episodes: list of id's"""
-        return [self.contains("episode", episodes[0], extern=0)]
+        return self.contains("episode", episodes)
 
     def current_user_saved_episodes_add(self, episodes: List[str]):
-        self.add_item("episode", episodes[0])
+        self.save("episode", episodes)
 
     def current_user_saved_episodes_delete(self, episodes: List[str]):
-        self.remove_item("episode", episodes[0])
+        self.unsave("episode", episodes)
 
     # ============================== Tracks ===================================#
-    def track(self, track_id):
-        return self.select_item("track", track_id, extern=1)
+    def track(self, track_id, market=None):
+        return self.get_item("track", track_id)
+
+    def tracks(self, tracks: List[str], market=None):
+        return self.get_items("track", tracks)
 
-    def current_user_saved_tracks(self, limit=10, offset=0, market=None):
-        tracks = self.items["track"]
-        tracks.update({"next": None})
-        return tracks
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        return self.saved_page("track", limit, offset)
 
     def current_user_saved_tracks_contains(self, tracks: List[str]):
-        return [self.contains("track", tracks[0], extern=0)]
+        return self.contains("track", tracks)
 
     def current_user_saved_tracks_add(self, tracks: List[str]):
-        self.add_item("track", tracks[0])
+        self.save("track", tracks)
 
     def current_user_saved_tracks_delete(self, tracks: List[str]):
-        self.remove_item("track", tracks[0])
+        self.unsave("track", tracks)
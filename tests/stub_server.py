@@ -0,0 +1,824 @@
+"""
+This module contains a stub of the Spotify Web API, served over real HTTP on localhost.
+Unlike the dummy wrapper, requests to it go through spotipy and the facade's transport,
+so it is used to test and benchmark the networking itself.
+
+The stub keeps a catalog and one user's library in memory (see StubData),
+and implements the endpoints the facades use with the same paths and page shapes as the real API.
+StubServer can hold every request for a while and fail some of them with 429s and 5xx responses,
+so the effect of pooling, concurrency and retries can be measured offline.
+
+Run it on its own with (see --help for the data set and fault options):
+    python -m tests.stub_server --port 8900 --latency 0.1 --throttle-rate 0.05
+"""
+import argparse
+import gzip
+import json
+import random
+import re
+import string
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+BASE62 = string.digits + string.ascii_letters
+ITEM_TYPES = ("track", "album", "artist", "show", "episode", "playlist")
+SAVED_TYPES = ("track", "album", "show", "episode")
+USER_ID = "stub_user"
+# When items saved before the stub started, or added to playlists, were added
+DEFAULT_ADDED_AT = "2000-01-01T00:00:00Z"
+
+
+def uri_parts(uri: str):
+    """Split 'spotify:track:<id>' into ('track', '<id>')"""
+    _, item_type, item_id = uri.split(":")
+    return item_type, item_id
+
+
+class StubData:
+    """
+    The catalog and the user's library served by the stub.
+    'populate' fills both with a synthetic, seeded data set.
+    """
+
+    def __init__(self):
+        self.catalog = {item_type: {} for item_type in ITEM_TYPES}
+        # Saved or followed ids per type, most recently added first
+        self.library = {item_type: [] for item_type in ITEM_TYPES}
+        self.playlist_tracks = {}
+        # Track ids per album, and episode ids per show, in the order they were added
+        self.album_tracks = {}
+        self.show_episodes = {}
+        self.snapshots = 0
+        # Every snapshot_id each playlist has had
+        self.snapshot_history = {}
+        # (item type, id) -> when the item was saved, from a clock that ticks a second per save
+        self.added_at = {}
+        self.clock = 946684800
+        self.lock = threading.RLock()
+        self.rng = random.Random(0)
+
+    def new_id(self) -> str:
+        return "".join(self.rng.choices(BASE62, k=22))
+
+    def add(self, item_type: str, item_id: str = None, **info) -> dict:
+        """Add an item to the catalog, filling in the fields the facade reads"""
+        item_id = item_id or self.new_id()
+        item = {
+            "id": item_id,
+            "type": item_type,
+            "name": f"{item_type} {item_id}",
+            "uri": f"spotify:{item_type}:{item_id}",
+            "external_urls": {
+                "spotify": f"https://open.spotify.com/{item_type}/{item_id}"
+            },
+        }
+        if item_type == "track":
+            item.update(album={"id": "", "name": ""}, artists=[])
+            item.update(duration_ms=0)
+        elif item_type == "album":
+            item.update(artists=[], release_date="2000-01-01", total_tracks=0)
+        elif item_type == "artist":
+            item.update(genres=[], followers={"total": 0})
+        elif item_type == "show":
+            item.update(publisher="", description="", total_episodes=0)
+        elif item_type == "episode":
+            item.update(description="", release_date="2000-01-01")
+            item.update(show={"id": "", "name": ""})
+        elif item_type == "playlist":
+            item.update(description="", public=False, collaborative=False)
+            item.update(owner={"id": USER_ID, "display_name": USER_ID})
+            self.playlist_tracks.setdefault(item_id, [])
+            self.touch(item)
+        item.update(info)
+        self.catalog[item_type][item_id] = item
+        if item_type == "track":
+            self.album_tracks.setdefault(item["album"]["id"], []).append(item_id)
+        elif item_type == "episode":
+            self.show_episodes.setdefault(item["show"]["id"], []).append(item_id)
+        return item
+
+    def stamp(self, item_type: str, item_id: str) -> str:
+        """Record that the item was saved just now, returns its 'added_at'"""
+        self.clock += 1
+        added_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.clock))
+        self.added_at[(item_type, item_id)] = added_at
+        return added_at
+
+    def saved_at(self, item_type: str, item_id: str) -> str:
+        return self.added_at.get((item_type, item_id), DEFAULT_ADDED_AT)
+
+    def touch(self, playlist: dict):
+        """Give the playlist a new snapshot id, after its tracks changed"""
+        self.snapshots += 1
+        playlist["snapshot_id"] = f"snapshot{self.snapshots}"
+        self.snapshot_history.setdefault(playlist["id"], set()).add(
+            playlist["snapshot_id"]
+        )
+
+    def populate(
+        self,
+        seed: int = 0,
+        tracks: int = 200,
+        albums: int = 20,
+        artists: int = 20,
+        shows: int = 5,
+        episodes: int = 50,
+        playlists: int = 3,
+        playlist_size: int = 100,
+        saved_fraction: float = 0.5,
+    ):
+        """Fill the catalog and library with a synthetic data set, the same for the same seed"""
+        self.rng = random.Random(seed)
+        rng = self.rng
+        artist_list = [self.add("artist") for _ in range(artists)]
+        album_list = []
+        for _ in range(albums):
+            artist = rng.choice(artist_list)
+            album_list.append(
+                self.add(
+                    "album",
+                    artists=[{"id": artist["id"], "name": artist["name"]}],
+                )
+            )
+        for _ in range(tracks):
+            album = rng.choice(album_list)
+            album["total_tracks"] += 1
+            self.add(
+                "track",
+                album={"id": album["id"], "name": album["name"]},
+                artists=album["artists"],
+                duration_ms=rng.randint(60, 600) * 1000,
+            )
+        show_list = [self.add("show") for _ in range(shows)]
+        for _ in range(episodes):
+            show = rng.choice(show_list)
+            show["total_episodes"] += 1
+            self.add("episode", show={"id": show["id"], "name": show["name"]})
+
+        track_ids = list(self.catalog["track"])
+        for _ in range(playlists):
+            playlist = self.add("playlist")
+            self.playlist_tracks[playlist["id"]] = [
+                rng.choice(track_ids) for _ in range(playlist_size)
+            ]
+            self.library["playlist"].append(playlist["id"])
+        for item_type in ("track", "album", "artist", "show", "episode"):
+            ids = list(self.catalog[item_type])
+            count = int(len(ids) * saved_fraction)
+            self.library[item_type] = rng.sample(ids, count)
+            for item_id in reversed(self.library[item_type]):
+                self.stamp(item_type, item_id)
+        return self
+
+
+def parse_fields(fields: str) -> dict:
+    """
+    Parse a 'fields' filter, e.g. 'items(track(id,album.name)),next' into
+    {"items": {"track": {"id": None, "album": {"name": None}}}, "next": None}, where None keeps the whole value.
+    Exclusions ('!field') are not supported.
+    """
+    spec, _ = _parse_fields(fields, 0)
+    return spec
+
+
+def _parse_fields(fields: str, pos: int):
+    spec = {}
+    while pos < len(fields):
+        if fields[pos] == ")":
+            return spec, pos + 1
+        if fields[pos] == ",":
+            pos += 1
+            continue
+        match = re.compile(r"[^,()]+").match(fields, pos)
+        if match is None:
+            raise ValueError(f"Malformed fields: {fields}")
+        pos = match.end()
+        sub_spec = None
+        if pos < len(fields) and fields[pos] == "(":
+            sub_spec, pos = _parse_fields(fields, pos + 1)
+        *parents, name = match.group().strip().split(".")
+        node = spec
+        for parent in parents:
+            node = node.setdefault(parent, {})
+            if node is None:
+                break
+        else:
+            if name not in node:
+                node[name] = sub_spec
+            elif node[name] is None or sub_spec is None:
+                node[name] = None
+            else:
+                node[name].update(sub_spec)
+    return spec, pos
+
+
+def project(value, spec: dict):
+    """Keep only the fields in 'spec' (see parse_fields), applied to every element of lists"""
+    if spec is None:
+        return value
+    if isinstance(value, list):
+        return [project(element, spec) for element in value]
+    if isinstance(value, dict):
+        return {
+            name: project(value[name], sub_spec)
+            for name, sub_spec in spec.items()
+            if name in value
+        }
+    return value
+
+
+def page(items: list, limit: int, offset: int, url: str, convert=None) -> dict:
+    """
+    A page of items, with 'next' and 'previous' urls like the real API's.
+    If given, 'convert' is applied to the items on the page only, so large collections
+    can be paged as a list of ids.
+    """
+    total = len(items)
+    page_items = items[offset : offset + limit]
+    if convert is not None:
+        page_items = [convert(item) for item in page_items]
+
+    def link(new_offset):
+        return f"{url}?{urlencode({'offset': new_offset, 'limit': limit})}"
+
+    return {
+        "href": link(offset),
+        "items": page_items,
+        "limit": limit,
+        "offset": offset,
+        "total": total,
+        "next": link(offset + limit) if offset + limit < total else None,
+        "previous": link(max(offset - limit, 0)) if offset > 0 else None,
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without this Nagle stalls every response
+    disable_nagle_algorithm = True
+
+    # (method, path pattern) -> handler method name, tried in order
+    ROUTES = [
+        ("GET", r"me", "get_me"),
+        ("GET", r"me/(tracks|albums|shows|episodes)", "get_saved"),
+        ("GET", r"me/following", "get_followed_artists"),
+        ("GET", r"me/playlists", "get_followed_playlists"),
+        ("POST", r"me/playlists", "create_playlist"),
+        ("POST", r"users/[^/]+/playlists", "create_playlist"),
+        ("GET", r"me/library/contains", "library_contains"),
+        ("PUT", r"me/library", "library_add"),
+        ("DELETE", r"me/library", "library_remove"),
+        ("GET", r"search", "search"),
+        ("GET", r"playlists/([^/]+)", "get_playlist"),
+        ("PUT", r"playlists/([^/]+)", "change_playlist_details"),
+        ("GET", r"playlists/([^/]+)/(?:items|tracks)", "get_playlist_items"),
+        ("POST", r"playlists/([^/]+)/(?:items|tracks)", "add_playlist_items"),
+        ("PUT", r"playlists/([^/]+)/(?:items|tracks)", "update_playlist_items"),
+        (
+            "DELETE",
+            r"playlists/([^/]+)/(?:items|tracks)",
+            "remove_playlist_items",
+        ),
+        ("DELETE", r"playlists/([^/]+)/followers", "unfollow_playlist"),
+        (
+            "GET",
+            r"playlists/([^/]+)/followers/contains",
+            "playlist_followed",
+        ),
+        ("GET", r"albums/([^/]+)/tracks", "get_album_tracks"),
+        ("GET", r"shows/([^/]+)/episodes", "get_show_episodes"),
+        ("GET", r"(tracks|albums|artists|shows|episodes)", "get_many"),
+        ("GET", r"(tracks|albums|artists|shows|episodes)/([^/]+)", "get_one"),
+    ]
+
+    def setup(self):
+        super().setup()
+        # Handlers live for as long as their connection, so this counts TCP handshakes
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    @property
+    def data(self) -> StubData:
+        return self.server.data
+
+    def dispatch(self, method: str):
+        self.server.count("requests")
+        url = urlparse(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.body = json.loads(self.rfile.read(length) or "null")
+
+        delay = self.server.next_delay()
+        if delay:
+            time.sleep(delay)
+        fault = self.server.next_fault()
+        if fault is not None:
+            status, headers = fault
+            self.send_error_json(status, "Injected fault", headers)
+            return
+
+        # Drop the API version, and any trailing slash
+        path = "/".join(part for part in url.path.split("/") if part)
+        path = path.split("/", 1)[1] if "/" in path else ""
+        self.url = self.server.url(path)
+        for route_method, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match is not None:
+                self.server.count_call(handler)
+                try:
+                    with self.data.lock:
+                        result = getattr(self, handler)(*match.groups())
+                except (KeyError, ValueError, TypeError, AttributeError) as e:
+                    # Missing or malformed arguments, like the real API answers them
+                    result = 400, f"Invalid request: {e!r}"
+                if isinstance(result, tuple):
+                    self.send_error_json(*result)
+                else:
+                    self.send_json(result)
+                return
+        self.send_error_json(404, "Service not found")
+
+    def limit_offset(self, default_limit: int = 20):
+        return (
+            int(self.query.get("limit", default_limit)),
+            int(self.query.get("offset", 0)),
+        )
+
+    # ================================ User ===================================#
+    def get_me(self):
+        return {"id": USER_ID, "display_name": USER_ID, "type": "user"}
+
+    def get_saved(self, collection: str):
+        item_type = collection[:-1]
+        limit, offset = self.limit_offset()
+        catalog = self.data.catalog[item_type]
+        return page(
+            self.data.library[item_type],
+            limit,
+            offset,
+            self.url,
+            lambda item_id: {
+                "added_at": self.data.saved_at(item_type, item_id),
+                item_type: catalog[item_id],
+            },
+        )
+
+    def get_followed_artists(self):
+        limit = int(self.query.get("limit", 20))
+        ids = self.data.library["artist"]
+        start = ids.index(self.query["after"]) + 1 if "after" in self.query else 0
+        items = self.items("artist", ids[start : start + limit])
+        more = start + limit < len(ids)
+        after = items[-1]["id"] if more and items else None
+        artists = {
+            "href": self.url,
+            "items": items,
+            "limit": limit,
+            "total": len(ids),
+            "cursors": {"after": after},
+            "next": f"{self.url}?{urlencode({'type': 'artist', 'after': after, 'limit': limit})}"
+            if more
+            else None,
+        }
+        return {"artists": artists}
+
+    def get_followed_playlists(self):
+        limit, offset = self.limit_offset()
+        return page(
+            self.data.library["playlist"],
+            limit,
+            offset,
+            self.url,
+            self.simple_playlist,
+        )
+
+    def create_playlist(self):
+        body = self.body or {}
+        playlist = self.data.add(
+            "playlist",
+            name=body.get("name", ""),
+            description=body.get("description", ""),
+            public=body.get("public", True),
+            collaborative=body.get("collaborative", False),
+        )
+        self.data.library["playlist"].insert(0, playlist["id"])
+        return self.full_playlist(playlist)
+
+    # ============================== Library ==================================#
+    def library_uris(self):
+        uris = [uri for uri in self.query.get("uris", "").split(",") if uri]
+        return [uri_parts(uri) for uri in uris]
+
+    def library_contains(self):
+        return [
+            item_id in self.data.library[item_type]
+            for item_type, item_id in self.library_uris()
+        ]
+
+    def library_add(self):
+        for item_type, item_id in self.library_uris():
+            if item_id not in self.data.catalog[item_type]:
+                return 400, f"Invalid id: {item_id}"
+            if item_id not in self.data.library[item_type]:
+                self.data.library[item_type].insert(0, item_id)
+                self.data.stamp(item_type, item_id)
+        return None
+
+    def library_remove(self):
+        for item_type, item_id in self.library_uris():
+            if item_id in self.data.library[item_type]:
+                self.data.library[item_type].remove(item_id)
+        return None
+
+    def search(self):
+        limit, offset = self.limit_offset(10)
+        query = self.query.get("q", "").lower()
+        results = {}
+        for item_type in self.query.get("type", "track").split(","):
+            if item_type not in ITEM_TYPES:
+                return 400, "Bad search type field"
+            matches = [
+                item["id"]
+                for item in self.data.catalog[item_type].values()
+                if query in item["name"].lower()
+            ]
+            convert = self.data.catalog[item_type].__getitem__
+            if item_type == "playlist":
+                convert = self.simple_playlist
+            results[item_type + "s"] = page(
+                matches, limit, offset, self.url, convert
+            )
+        return results
+
+    # ============================== Catalog ==================================#
+    def items(self, item_type: str, ids: list) -> list:
+        return [self.data.catalog[item_type][item_id] for item_id in ids]
+
+    def get_many(self, collection: str):
+        item_type = collection[:-1]
+        ids = self.query.get("ids", "").split(",")
+        return {
+            collection: [self.data.catalog[item_type].get(i) for i in ids]
+        }
+
+    def get_one(self, collection: str, item_id: str):
+        item = self.data.catalog[collection[:-1]].get(item_id)
+        return (404, "Non existing id") if item is None else item
+
+    def get_album_tracks(self, album_id: str):
+        if album_id not in self.data.catalog["album"]:
+            return 404, "Non existing id"
+        limit, offset = self.limit_offset()
+        return page(
+            self.data.album_tracks.get(album_id, []),
+            limit,
+            offset,
+            self.url,
+            self.data.catalog["track"].__getitem__,
+        )
+
+    def get_show_episodes(self, show_id: str):
+        if show_id not in self.data.catalog["show"]:
+            return 404, "Non existing id"
+        limit, offset = self.limit_offset()
+        return page(
+            self.data.show_episodes.get(show_id, []),
+            limit,
+            offset,
+            self.url,
+            self.data.catalog["episode"].__getitem__,
+        )
+
+    # ============================= Playlists =================================#
+    def playlist_page(self, playlist_id: str, limit: int, offset: int, url):
+        catalog = self.data.catalog["track"]
+        return page(
+            self.data.playlist_tracks[playlist_id],
+            limit,
+            offset,
+            url,
+            lambda track_id: {
+                "added_at": DEFAULT_ADDED_AT,
+                "track": catalog[track_id],
+            },
+        )
+
+    def simple_playlist(self, playlist_id: str) -> dict:
+        """A playlist as listed in pages, with a summary of its tracks"""
+        playlist = self.data.catalog["playlist"][playlist_id]
+        tracks = {
+            "href": self.server.url(f"playlists/{playlist_id}/tracks"),
+            "total": len(self.data.playlist_tracks[playlist_id]),
+        }
+        return dict(playlist, tracks=tracks)
+
+    def full_playlist(self, playlist: dict) -> dict:
+        url = self.server.url(f"playlists/{playlist['id']}/tracks")
+        tracks = self.playlist_page(playlist["id"], 100, 0, url)
+        return dict(playlist, tracks=tracks)
+
+    def projected(self, result: dict) -> dict:
+        """The result, with only the fields asked for (if any)"""
+        if "fields" not in self.query:
+            return result
+        return project(result, parse_fields(self.query["fields"]))
+
+    def get_playlist(self, playlist_id: str):
+        playlist = self.data.catalog["playlist"].get(playlist_id)
+        if playlist is None:
+            return 404, "Non existing id"
+        return self.projected(self.full_playlist(playlist))
+
+    def change_playlist_details(self, playlist_id: str):
+        playlist = self.data.catalog["playlist"].get(playlist_id)
+        if playlist is None:
+            return 404, "Non existing id"
+        for field in ("name", "public", "collaborative", "description"):
+            if field in (self.body or {}):
+                playlist[field] = self.body[field]
+        return None
+
+    def get_playlist_items(self, playlist_id: str):
+        if playlist_id not in self.data.playlist_tracks:
+            return 404, "Non existing id"
+        limit, offset = self.limit_offset(100)
+        return self.projected(
+            self.playlist_page(playlist_id, limit, offset, self.url)
+        )
+
+    def add_playlist_items(self, playlist_id: str):
+        if playlist_id not in self.data.playlist_tracks:
+            return 404, "Non existing id"
+        body = self.body
+        position = self.query.get("position")
+        if isinstance(body, dict):
+            position = body.get("position", position)
+            body = body["uris"]
+        ids = [uri_parts(uri)[1] for uri in body]
+        tracks = self.data.playlist_tracks[playlist_id]
+        if position is None:
+            tracks.extend(ids)
+        else:
+            tracks[int(position) : int(position)] = ids
+        return self.touch(playlist_id)
+
+    def update_playlist_items(self, playlist_id: str):
+        """Reorder a range of the playlist's tracks, or replace them all"""
+        if playlist_id not in self.data.playlist_tracks:
+            return 404, "Non existing id"
+        body = self.body or {}
+        tracks = self.data.playlist_tracks[playlist_id]
+        if "range_start" not in body:
+            uris = body.get("uris")
+            if uris is None:
+                uris = [u for u in self.query.get("uris", "").split(",") if u]
+            tracks[:] = [uri_parts(uri)[1] for uri in uris]
+            return self.touch(playlist_id)
+
+        if self.stale_snapshot(playlist_id, body.get("snapshot_id")):
+            return 400, "Snapshot is out of date"
+        start, length = body["range_start"], body.get("range_length", 1)
+        insert_before = body["insert_before"]
+        moved = tracks[start : start + length]
+        del tracks[start : start + length]
+        if insert_before > start:
+            insert_before -= len(moved)
+        tracks[insert_before:insert_before] = moved
+        return self.touch(playlist_id)
+
+    def stale_snapshot(self, playlist_id: str, snapshot_id: str) -> bool:
+        # The real API applies positions to the given snapshot, the stub only keeps
+        # the latest tracks, and applies them to those (see remove_playlist_items)
+        history = self.data.snapshot_history.get(playlist_id, set())
+        return snapshot_id is not None and snapshot_id not in history
+
+    def remove_playlist_items(self, playlist_id: str):
+        if playlist_id not in self.data.playlist_tracks:
+            return 404, "Non existing id"
+        if self.stale_snapshot(playlist_id, self.body.get("snapshot_id")):
+            return 400, "Snapshot is out of date"
+        tracks = self.data.playlist_tracks[playlist_id]
+        removals = set()
+        for entry in self.body.get("items", self.body.get("tracks", [])):
+            item_id = uri_parts(entry["uri"])[1]
+            positions = entry.get("positions")
+            if positions is None:
+                positions = [i for i, t in enumerate(tracks) if t == item_id]
+            elif any(
+                p >= len(tracks) or tracks[p] != item_id for p in positions
+            ):
+                return 400, f"Item {item_id} is not at the given positions"
+            removals.update(positions)
+        tracks[:] = [t for i, t in enumerate(tracks) if i not in removals]
+        return self.touch(playlist_id)
+
+    def touch(self, playlist_id: str) -> dict:
+        playlist = self.data.catalog["playlist"][playlist_id]
+        self.data.touch(playlist)
+        return {"snapshot_id": playlist["snapshot_id"]}
+
+    def unfollow_playlist(self, playlist_id: str):
+        if playlist_id in self.data.library["playlist"]:
+            self.data.library["playlist"].remove(playlist_id)
+        return None
+
+    def playlist_followed(self, playlist_id: str):
+        return [playlist_id in self.data.library["playlist"]]
+
+    # ============================== Responses ================================#
+    def send_error_json(self, status: int, message: str, headers=None):
+        body = {"error": {"status": status, "message": message}}
+        self.send_json(body, status, headers)
+
+    def send_json(self, body, status: int = 200, headers: dict = None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        if payload and "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload)
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(payload))
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Serves StubHandler on localhost (an ephemeral port by default), from a background thread.
+    Use as a context manager; 'prefix' is what to set as a spotipy client's prefix.
+
+    Every request is held for 'latency' seconds, give or take up to 'jitter' seconds.
+    A 'throttle_rate' share of requests is answered with a 429 (with a 'retry_after' Retry-After),
+    and an 'error_rate' share with a 500, 502 or 503, picked with a random generator seeded by 'seed'.
+    Append (status, headers) pairs to 'faults' to fail the next requests with them, in order.
+    'calls' counts the requests answered by each handler, i.e. per endpoint.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+    SERVER_ERRORS = (500, 502, 503)
+
+    def __init__(
+        self,
+        data: StubData = None,
+        latency: float = 0,
+        jitter: float = 0,
+        throttle_rate: float = 0,
+        error_rate: float = 0,
+        retry_after: float = 1,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        super().__init__((host, port), StubHandler)
+        self.data = data if data is not None else StubData().populate()
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.counters = dict.fromkeys(
+            ("connections", "requests", "throttled", "errors"), 0
+        )
+        self.calls = Counter()
+        self.faults = []
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def prefix(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def url(self, path: str) -> str:
+        return self.prefix + path
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def count_call(self, handler: str):
+        with self._lock:
+            self.calls[handler] += 1
+
+    def next_delay(self) -> float:
+        """How long to hold the next request for"""
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            offset = self.rng.uniform(-self.jitter, self.jitter)
+        return max(self.latency + offset, 0)
+
+    def next_fault(self):
+        """The (status, headers) to fail the next request with, or None to answer it"""
+        with self._lock:
+            if self.faults:
+                fault = self.faults.pop(0)
+            elif self.throttle_rate or self.error_rate:
+                roll = self.rng.random()
+                if roll < self.throttle_rate:
+                    fault = (429, {"Retry-After": str(self.retry_after)})
+                elif roll < self.throttle_rate + self.error_rate:
+                    fault = (self.rng.choice(self.SERVER_ERRORS), {})
+                else:
+                    return None
+            else:
+                return None
+            self.counters["throttled" if fault[0] == 429 else "errors"] += 1
+            return fault
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+            self.calls = Counter()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a stub of the Spotify Web API, with a synthetic library"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracks", type=int, default=200)
+    parser.add_argument("--albums", type=int, default=20)
+    parser.add_argument("--artists", type=int, default=20)
+    parser.add_argument("--shows", type=int, default=5)
+    parser.add_argument("--episodes", type=int, default=50)
+    parser.add_argument("--playlists", type=int, default=3)
+    parser.add_argument("--playlist-size", type=int, default=100)
+    parser.add_argument("--saved-fraction", type=float, default=0.5)
+    args = parser.parse_args()
+
+    data = StubData().populate(
+        seed=args.seed,
+        tracks=args.tracks,
+        albums=args.albums,
+        artists=args.artists,
+        shows=args.shows,
+        episodes=args.episodes,
+        playlists=args.playlists,
+        playlist_size=args.playlist_size,
+        saved_fraction=args.saved_fraction,
+    )
+    server = StubServer(
+        data,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving the stub Spotify API at {server.prefix}")
+    print(f"Point the app at it with SPOTIFY_API_PREFIX={server.prefix}")
+    print("and SPOTIFY_ACCESS_TOKEN set to any value. Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,41 @@
+import asyncio
+import io
+import json
+import os
+import random
 import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from typing import List
 
+import pytest
+import requests
+import spotipy
 from typer.testing import CliRunner
 
-from cli.facade.spotipy_facade import USE_DUMMY_WRAPPER
+from cli.facade.spotipy_facade import USE_DUMMY_WRAPPER, SpotipyFacade
+from cli import client, daemon
 from cli.spotify_cli import spot, app
 
-from cli.facade.interfaces import Item, ItemCollection
+from cli.facade.async_client import AsyncSpotify
+from cli.facade.async_facade import AsyncSpotipyFacade
+from cli.facade.async_http import Connection, ConnectionPool
+from cli.facade.concurrency import bounded_gather, nested_map, ordered_map
+from cli.facade.cache import ItemCache, MemoryItemCache, SqliteItemCache
+from cli.facade.interfaces import Item, ItemCollection, expand_collections
 from cli.facade.items import Show, Episode, Track, Playlist, Artist, Album
+from cli.facade.mirror import (
+    MIRROR_TYPES,
+    LibraryMirror,
+    MirroredCollection,
+    item_terms,
+    search_terms,
+)
 from cli.facade.user_libary import (
     FollowedPlaylists,
     FollowedArtists,
@@ -17,6 +45,7 @@ from cli.facade.user_libary import (
     SavedTracks,
 )
 from cli.app_strings import (
+    Batch,
     Edit,
     General,
     Create,
@@ -25,9 +54,21 @@ from cli.app_strings import (
     Unfollow,
     Follow,
     Save,
+    Transfer,
     Unsave,
 )
+from cli.batch import plan_steps, read_lines
+from cli.facade.transfer import read_records, write_records
+from cli.facade.rate_limit import (
+    RateLimiter,
+    TokenBucket,
+    parse_endpoint_limits,
+)
+from cli.facade.transport import Transport
+from tests.dummy_spotipy import DummySpotipy
+from tests.stub_server import StubData, StubServer, parse_fields, project
 import tests.testing_utils as tu
+from benchmarks import bench_commands, bench_memory, bench_startup
 
 runner = CliRunner()
 
@@ -556,6 +597,18 @@ class TestList:
     def test_retrieve_all(self):
         self._test_list("track", "--retrieve-all")
 
+    def test_expand(self):
+        runner.invoke(app, ["create", "Expanded playlist"])
+        result = runner.invoke(app, ["list", "playlist", "--expand"])
+        assert Listing.ret_all in result.stdout
+        assert Listing.expanded.format(0, "Expanded playlist") in result.stdout
+        assert result.exit_code == 0
+
+    def test_expand_items_without_children(self):
+        result = runner.invoke(app, ["list", "track", "--expand"])
+        assert "can't be expanded" in result.stdout
+        assert result.exit_code == 1
+
 
 class TestEdit:
     def test_edit_details(self):
@@ -602,6 +655,15 @@ class TestEdit:
         if len(initial_tracks) > 0:
             spot.sp.playlist_add_items(item.id, initial_tracks)
 
+        if USE_DUMMY_WRAPPER:
+            # Make sure the (22 character) track ids used exist
+            track_ids = [arg for arg in args if len(str(arg)) == 22]
+            for track_id in set(initial_tracks + track_ids):
+                if spot.sp.track(track_id) is None:
+                    spot.sp.create_item(
+                        "track", track_id, track_id, extern=True
+                    )
+
         args = ["edit", action, item.id, *args]
 
         try:
@@ -740,3 +802,1954 @@ class TestEdit:
         assert tracks[0]["track"]["id"] == init_tracks[1]
         assert tracks[-1]["track"]["id"] == init_tracks[-1]
         assert len(tracks) == 4
+
+
+class SlowPagedSpotipy(DummySpotipy):
+    """Stand-in for spotipy that serves saved tracks in pages, with injected latency"""
+
+    def __init__(self, total: int, latency: float = 0.01):
+        super().__init__()
+        self.total = total
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+
+        end = min(offset + limit, self.total)
+        items = [
+            {"track": {"id": f"track_{i}", "name": f"track_{i}"}}
+            for i in range(offset, end)
+        ]
+        next_page = "next_url" if end < self.total else None
+        return {"items": items, "next": next_page, "total": self.total}
+
+
+class TestPagination:
+    def _retrieve_all(self, concurrency, total=205, latency=0.01):
+        sp = SlowPagedSpotipy(total, latency)
+        collection = SavedTracks(sp)
+        collection.concurrency = concurrency
+        start = time.perf_counter()
+        tracks = collection.items(limit=20, retrieve_all=True)
+        return tracks, sp, time.perf_counter() - start
+
+    def test_retrieve_all_keeps_order(self):
+        tracks, sp, _ = self._retrieve_all(concurrency=4)
+        assert [tr.id for tr in tracks] == [f"track_{i}" for i in range(205)]
+        assert sp.calls == 11
+
+    def test_retrieve_all_respects_concurrency_cap(self):
+        _, sp, _ = self._retrieve_all(concurrency=3)
+        assert 1 < sp.max_in_flight <= 3
+
+    def test_retrieve_all_sequential(self):
+        tracks, sp, _ = self._retrieve_all(concurrency=1)
+        assert len(tracks) == 205
+        assert sp.max_in_flight == 1
+
+    def test_retrieve_all_faster_with_concurrency(self):
+        _, _, sequential = self._retrieve_all(concurrency=1, latency=0.05)
+        _, _, concurrent = self._retrieve_all(concurrency=10, latency=0.05)
+        assert concurrent < sequential / 2
+
+    def test_iter_items_is_lazy(self):
+        sp = SlowPagedSpotipy(total=205, latency=0)
+        collection = SavedTracks(sp)
+        items = collection.iter_items(limit=20, retrieve_all=True)
+        first = next(items)
+        assert first.id == "track_0"
+        assert sp.calls == 1
+        items.close()
+
+
+class TestNestedExpansion:
+    def test_nested_map_shares_the_cap(self):
+        lock = threading.Lock()
+        counts = {"in_flight": 0, "max_in_flight": 0}
+
+        def call(value):
+            with lock:
+                counts["in_flight"] += 1
+                counts["max_in_flight"] = max(
+                    counts["max_in_flight"], counts["in_flight"]
+                )
+            time.sleep(0.01)
+            with lock:
+                counts["in_flight"] -= 1
+            return value
+
+        # Parent n has n + 1 calls, the first of them says how many follow
+        def rest(parent, first_result):
+            return [lambda i=i: call((parent, i)) for i in range(1, parent + 1)]
+
+        parents = [9, 0, 5, 1]
+        results = list(
+            nested_map(
+                lambda parent: call((parent, 0)), rest, parents, concurrency=4
+            )
+        )
+
+        assert sorted(parent for parent, _ in results) == sorted(parents)
+        for parent, values in results:
+            assert values == [(parent, i) for i in range(parent + 1)]
+        # Parents are yielded as they complete, not in the order they were given
+        assert results[0][0] == 0
+        assert 1 < counts["max_in_flight"] <= 4
+
+    def test_nested_map_sequential(self):
+        rest = lambda parent, first: [lambda: first * 10]
+        results = list(nested_map(lambda p: p + 1, rest, [1, 2], 1))
+        assert results == [(1, [2, 20]), (2, [3, 30])]
+
+    def test_expand_library(self):
+        sp = DummySpotipy().populate(
+            tracks=400, albums=6, shows=3, episodes=160, saved_fraction=1
+        )
+        facade = SpotipyFacade(mirror=LibraryMirror(":memory:"))
+        facade.sp = sp
+        albums = dict(facade.expand_collection("al"))
+        shows = dict(facade.expand_collection("show"))
+        playlists = dict(facade.expand_collection("pl"))
+
+        assert len(albums) == len(sp.library["album"].ids)
+        for album, tracks in albums.items():
+            assert [tr.id for tr in tracks] == sp.data.album_tracks[album.id]
+            assert all(tr.album == album.name for tr in tracks)
+        assert sum(len(tracks) for tracks in albums.values()) == 400
+        for show, episodes in shows.items():
+            assert [ep.id for ep in episodes] == sp.data.show_episodes[show.id]
+            assert all(ep.show == show.name for ep in episodes)
+        assert sum(len(episodes) for episodes in shows.values()) == 160
+        for playlist, tracks in playlists.items():
+            assert [tr.id for tr in tracks] == sp.data.playlist_tracks[
+                playlist.id
+            ]
+        assert facade.expand_collection("track") is None
+
+    def test_expand_collections_pages(self, monkeypatch):
+        sp = DummySpotipy().populate(tracks=130, albums=1, saved_fraction=1)
+        album = Album(sp, next(iter(sp.data.catalog["album"])))
+        calls = []
+        album_tracks = sp.album_tracks
+        monkeypatch.setattr(
+            sp,
+            "album_tracks",
+            lambda **kwargs: calls.append(kwargs) or album_tracks(**kwargs),
+        )
+        [(expanded, tracks)] = expand_collections([album], concurrency=2)
+
+        assert expanded is album
+        assert len(tracks) == 130
+        assert sorted(call["offset"] for call in calls) == [0, 50, 100]
+
+
+class TestItemCache:
+    def test_hits_misses_and_negative_entries(self, tmp_path):
+        cache = SqliteItemCache(str(tmp_path / "cache.sqlite3"))
+        assert cache.get("track", "tr1") is ItemCache.MISSING
+        cache.set("track", "tr1", {"id": "tr1", "name": "A track"})
+        cache.set("track", "DNE", None)
+
+        assert cache.get("track", "tr1")["name"] == "A track"
+        assert cache.get("track", "DNE") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (
+            1,
+            1,
+            1,
+        )
+        cache.close()
+
+    def test_ttl_per_type(self, tmp_path):
+        cache = SqliteItemCache(
+            str(tmp_path / "cache.sqlite3"), ttls={"track": 60, "album": -1}
+        )
+        cache.set("track", "tr1", {"id": "tr1"})
+        cache.set("album", "al1", {"id": "al1"})
+        # Types without a ttl (playlist) are never cached
+        cache.set("playlist", "pl1", {"id": "pl1"})
+        assert cache.get("track", "tr1") is not ItemCache.MISSING
+        assert cache.get("album", "al1") is ItemCache.MISSING
+        assert cache.get("playlist", "pl1") is ItemCache.MISSING
+        cache.close()
+
+    def test_lru_eviction(self, tmp_path):
+        cache = SqliteItemCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        cache.set("track", "tr1", {"id": "tr1"})
+        time.sleep(0.01)
+        cache.set("track", "tr2", {"id": "tr2"})
+        time.sleep(0.01)
+        cache.get("track", "tr1")
+        cache.set("track", "tr3", {"id": "tr3"})
+
+        assert len(cache) == 2
+        assert cache.get("track", "tr2") is ItemCache.MISSING
+        assert cache.stats()["evictions"] == 1
+        cache.close()
+
+    def test_bulk_writes_and_hits(self, tmp_path):
+        cache = SqliteItemCache(
+            str(tmp_path / "cache.sqlite3"), max_entries=100
+        )
+        statements = []
+        cache._db.set_trace_callback(statements.append)
+        for i in range(250):
+            cache.set("track", f"tr{i}", {"id": f"tr{i}"})
+        counts = [s for s in statements if "COUNT(*)" in s]
+        statements.clear()
+        hits = [cache.get("track", f"tr{i}") for i in range(240, 250)]
+
+        # Counted on the first write, then on every 11th write from the 101st (each evicting 10 + 1)
+        assert len(counts) == 1 + len(range(101, 251, 11))
+        assert 90 <= len(cache) <= 100
+        assert hits == [{"id": f"tr{i}"} for i in range(240, 250)]
+        assert not any(s.startswith("UPDATE") for s in statements)
+        cache.close()
+
+    def test_shared_between_connections(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        first, second = SqliteItemCache(path), SqliteItemCache(path)
+        first.set("track", "tr1", {"id": "tr1"})
+        assert second.get("track", "tr1") == {"id": "tr1"}
+        first.close()
+        second.close()
+
+        totals = SqliteItemCache(path).stats()
+        assert totals["total_hits"] == 1
+
+    def test_items_use_cache(self):
+        sp = DummySpotipy()
+        sp.create_item("track", "tr1", "A track", extern=True)
+        cache = MemoryItemCache()
+        previous, Item.cache = Item.cache, cache
+        try:
+            Track(sp, "tr1")
+            sp.delete_item("track", "tr1")
+            track = Track(sp, "tr1")
+            missing = Track(sp, "DNE"), Track(sp, "DNE")
+        finally:
+            Item.cache = previous
+
+        assert track.name == "A track"
+        assert all(item.info is None for item in missing)
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["negative_hits"] == 1
+
+
+class TestCompactItems:
+    def test_only_printed_fields_are_kept(self):
+        sp = DummySpotipy().populate(tracks=1)
+        raw = sp.tracks(list(sp.data.catalog["track"]))["tracks"][0]
+        track = Track(sp, raw["id"], dict(raw, available_markets=["SE"] * 100))
+
+        assert not hasattr(track, "__dict__")
+        assert track._info is None
+        assert (track.album, track.artists) == (
+            raw["album"]["name"],
+            tuple(artist["name"] for artist in raw["artists"]),
+        )
+        assert f"Track Name: {raw['name']}" in str(track)
+
+    def test_albums_page_with_class_concurrency(self):
+        facade = SpotipyFacade(concurrency=2)
+        facade.sp = DummySpotipy().populate(albums=1)
+        album = facade.get_item(
+            "album", next(iter(facade.sp.data.catalog["album"]))
+        )
+
+        assert not hasattr(album, "__dict__")
+        assert "concurrency" not in Album.__slots__
+        assert album.concurrency == ItemCollection.concurrency
+
+    def test_full_info_loaded_lazily(self, monkeypatch):
+        sp = DummySpotipy()
+        sp.create_item("track", "tr1", "A track", extern=True)
+        calls = []
+        track_getter = sp.track
+
+        def counting_getter(item_id):
+            calls.append(item_id)
+            return track_getter(item_id)
+
+        monkeypatch.setattr(sp, "track", counting_getter)
+        track = Track(sp, "tr1", {"id": "tr1", "name": "A track"})
+        missing = Track(sp, "DNE")
+
+        assert calls == ["DNE"]
+        assert track.info["uri"] == "spotify:track:tr1"
+        assert track.info is track.info
+        assert not missing.exists and missing.info is None
+        assert calls == ["DNE", "tr1"]
+
+    def test_memory_benchmark(self):
+        results = bench_memory.run(tracks=200)
+        assert results["raw"]["items"] == results["compact"]["items"] == 200
+        assert results["peak_rss_saved_kb"] > 0
+
+
+class TestGetItems:
+    def test_bulk_get_in_order_with_missing(self, monkeypatch):
+        if not USE_DUMMY_WRAPPER:
+            return
+        track_ids = [f"bulk_track_{i}" for i in range(120)]
+        for track_id in track_ids:
+            spot.sp.create_item("track", track_id, track_id, extern=True)
+
+        chunk_sizes = []
+        bulk_getter = spot.sp.tracks
+
+        def counting_getter(tracks, market=None):
+            chunk_sizes.append(len(tracks))
+            return bulk_getter(tracks)
+
+        monkeypatch.setattr(spot.sp, "tracks", counting_getter)
+        requested = ["DNE_ID"] + track_ids[::-1] + [track_ids[0]]
+        items = spot.get_items("tr", requested)
+
+        assert items[0] is None
+        assert [item.id for item in items[1:]] == requested[1:]
+        assert sorted(chunk_sizes) == [21, 50, 50]
+
+    def test_playlists_without_bulk_getter(self):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        items = spot.get_items("playlist", [playlist.id, "DNE_ID"])
+        spot.get_collection("playlist").remove(playlist)
+
+        assert items[0].name == TEST_PL_NAME
+        assert items[1] is None
+
+
+class TestPlaylistIndex:
+    def test_contains_reuses_index(self, monkeypatch):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        spot.sp.playlist_add_items(playlist.id, ["tr1", "tr2", "tr1"])
+        calls = []
+        playlist_tracks = spot.sp.playlist_tracks
+
+        def counting_playlist_tracks(*args, **kwargs):
+            calls.append(kwargs)
+            return playlist_tracks(*args, **kwargs)
+
+        monkeypatch.setattr(
+            spot.sp, "playlist_tracks", counting_playlist_tracks
+        )
+        try:
+            found = [
+                playlist.contains(Track(spot.sp, track_id, {"name": track_id}))
+                for track_id in ["tr1", "tr2", "tr3"]
+            ]
+            playlist.add(Track(spot.sp, "tr3", {"name": "tr3"}))
+            playlist.add(Track(spot.sp, "tr4", {"name": "tr4"}), position=0)
+            added = playlist.contains(Track(spot.sp, "tr3", {"name": "tr3"}))
+            positions = playlist._track_index()
+        finally:
+            spot.get_collection("playlist").remove(playlist)
+
+        assert found == [True, True, False]
+        assert added
+        assert len(calls) == 1
+        assert positions == {"tr4": [0], "tr1": [1, 3], "tr2": [2], "tr3": [4]}
+
+
+class TestFieldProjection:
+    def test_parse_and_project(self):
+        spec = parse_fields(
+            "items(track(id,album.name),added_at),next,items.track.name"
+        )
+        assert spec == {
+            "items": {
+                "track": {"id": None, "album": {"name": None}, "name": None},
+                "added_at": None,
+            },
+            "next": None,
+        }
+        page = {
+            "items": [
+                {
+                    "added_at": "now",
+                    "is_local": False,
+                    "track": {
+                        "id": "1",
+                        "name": "a",
+                        "album": {"name": "b", "id": "2"},
+                    },
+                }
+            ],
+            "next": None,
+            "total": 1,
+        }
+        assert project(page, spec) == {
+            "items": [
+                {
+                    "added_at": "now",
+                    "track": {"id": "1", "name": "a", "album": {"name": "b"}},
+                }
+            ],
+            "next": None,
+        }
+
+    def test_playlist_requests_only_needed_fields(self):
+        with StubServer() as server:
+            transport = Transport(pool_size=1, gzip=False)
+            sp = spotipy.Spotify(auth="token", **transport.spotify_kwargs())
+            sp.prefix = server.prefix
+            playlist_id = server.data.library["playlist"][0]
+            track_ids = server.data.playlist_tracks[playlist_id]
+
+            sizes = {}
+            for fields in (
+                None,
+                Playlist.TRACK_FIELDS,
+                Playlist.TRACK_ID_FIELDS,
+            ):
+                before = transport.stats.snapshot()["decoded_bytes"]
+                sp.playlist_items(playlist_id, fields=fields)
+                sizes[fields] = (
+                    transport.stats.snapshot()["decoded_bytes"] - before
+                )
+
+            playlist = Playlist(sp, playlist_id)
+            info_keys = set(playlist.info)
+            tracks = playlist.items(limit=100, retrieve_all=True)
+            found = playlist.contains(tracks[0])
+            transport.close()
+
+        assert (
+            sizes[Playlist.TRACK_ID_FIELDS]
+            < sizes[Playlist.TRACK_FIELDS]
+            < sizes[None]
+        )
+        assert "tracks" in info_keys and "uri" not in info_keys
+        assert [track.id for track in tracks] == track_ids
+        assert all(track.album and track.artists for track in tracks)
+        assert found
+
+
+class TestLibraryMirror:
+    @staticmethod
+    def _sync(server: StubServer, mirror: LibraryMirror, sp, *item_types):
+        server.reset()
+        results = mirror.sync(sp, item_types or MIRROR_TYPES)
+        return results, server.counters["requests"], dict(server.calls)
+
+    def test_incremental_sync(self):
+        data = StubData().populate(
+            tracks=500, playlists=5, playlist_size=150, saved_fraction=1
+        )
+        with StubServer(data) as server, tempfile.TemporaryDirectory() as tmp:
+            sp = spotipy.Spotify(auth="token")
+            sp.prefix = server.prefix
+            mirror = LibraryMirror(f"{tmp}/mirror.sqlite3")
+
+            first, first_requests, _ = self._sync(server, mirror, sp)
+            again, again_requests, _ = self._sync(server, mirror, sp)
+
+            with data.lock:
+                new_ids = [data.add("track")["id"] for _ in range(3)]
+            sp.current_user_saved_tracks_add(new_ids)
+            saved, saved_requests, _ = self._sync(server, mirror, sp, "track")
+
+            sp.current_user_saved_tracks_delete([data.library["track"][10]])
+            removed, _, _ = self._sync(server, mirror, sp, "track")
+
+            edited_id = data.library["playlist"][2]
+            sp.playlist_add_items(edited_id, new_ids)
+            edited, _, calls = self._sync(server, mirror, sp, "playlist")
+
+            mirrored_ids = [item_id for item_id, _ in mirror.library("track")]
+            mirrored_tracks = {
+                playlist_id: mirror.playlist_track_ids(playlist_id)
+                for playlist_id in data.library["playlist"]
+            }
+            mirror.close()
+
+        assert first["track"] == {"items": 500, "new": 500, "full": True}
+        assert again["track"] == {"items": 500, "new": 0, "full": False}
+        assert again["playlist"]["new"] == 0
+        # A page of each saved type, of followed artists and of followed playlists
+        assert again_requests == len(MIRROR_TYPES) < first_requests
+        assert saved["track"] == {"items": 503, "new": 3, "full": False}
+        assert saved_requests == 1
+        # A removal can't be seen from the newest items, so tracks are walked in full
+        assert removed["track"] == {"items": 502, "new": 0, "full": True}
+        assert edited["playlist"]["new"] == 1
+        assert calls["get_playlist_items"] == 2
+        assert mirrored_ids == data.library["track"]
+        assert mirrored_tracks == {
+            playlist_id: data.playlist_tracks[playlist_id]
+            for playlist_id in data.library["playlist"]
+        }
+
+    def test_mirrored_reads(self, monkeypatch):
+        pl_id = spot.create_playlist(TEST_PL_NAME).id
+        sync_result = runner.invoke(app, ["sync", "pl", "tr"])
+        live = runner.invoke(app, ["list", "pl", "-A"])
+
+        def offline(*args, **kwargs):
+            raise AssertionError("The library was requested from spotify")
+
+        monkeypatch.setattr(spot.sp, "current_user_playlists", offline)
+        mirrored = runner.invoke(app, ["--mirror", "list", "pl", "-A"])
+        create_result = runner.invoke(app, ["--mirror", "create", TEST_PL_NAME])
+        monkeypatch.undo()
+        bad_type = runner.invoke(app, ["sync", "nope"])
+
+        # Clean up
+        FollowedPlaylists(spot.sp).remove(Playlist(spot.sp, pl_id))
+
+        assert sync_result.exit_code == 0
+        assert "tracks: " in sync_result.stdout
+        assert mirrored.exit_code == 0
+        assert mirrored.stdout == live.stdout
+        assert Create.dupe_exist_no_f in create_result.stdout
+        assert bad_type.exit_code == 1
+
+
+class TestSearchIndex:
+    @staticmethod
+    def _library() -> DummySpotipy:
+        sp = DummySpotipy().populate(tracks=300, saved_fraction=1)
+        tracks = [
+            ("Digital Love", "Daft Punk", "Discovery"),
+            ("One More Time", "Daft Punk", "Discovery"),
+            ("Discovery Channel", "Bloodhound Gang", "Hooray for Boobies"),
+            ("Déjà Vu", "Beyoncé", "B'Day"),
+        ]
+        for i, (name, artist, album) in enumerate(tracks):
+            sp.create_item(
+                "track",
+                f"tr{i}",
+                name,
+                additional_properties={
+                    "artists": [{"id": f"ar{i}", "name": artist}],
+                    "album": {"id": f"al{i}", "name": album},
+                },
+            )
+        return sp
+
+    def test_terms(self):
+        assert search_terms("Beyoncé - Déjà_Vu (Remix)") == [
+            "beyonce",
+            "deja",
+            "vu",
+            "remix",
+        ]
+        assert item_terms(
+            {"name": "Daft", "artists": [{"name": "Daft Punk"}]}
+        ) == {"daft": 3, "punk": 2}
+
+    def test_search_ranking(self):
+        sp = self._library()
+        mirror = LibraryMirror(":memory:")
+        mirror.sync(sp, ["track"])
+
+        def search(query, limit=None):
+            return [
+                item_id for item_id, _ in mirror.search("track", query, limit)
+            ]
+
+        oldest = sp.data.catalog["track"][sp.library["track"].ids[-1]]
+        results = {
+            "token": search("punk"),
+            "prefix": search("DISCO"),
+            "accents": search("deja"),
+            "all terms": search("daft love"),
+            "limited": search("daft", limit=1),
+            "nothing": search("daft gang"),
+            "oldest": search(oldest["name"]),
+        }
+        mirror.close()
+
+        assert results["token"] == ["tr1", "tr0"]
+        # A match in the name beats one in the album, then the most recently added goes first
+        assert results["prefix"] == ["tr2", "tr1", "tr0"]
+        assert results["accents"] == ["tr3"]
+        assert results["all terms"] == ["tr0"]
+        assert results["limited"] == ["tr1"]
+        assert results["nothing"] == []
+        # Found past the first page of the library
+        assert results["oldest"][0] == oldest["id"]
+
+    def test_mirrored_search_sends_no_requests(self, monkeypatch):
+        sp = self._library()
+        facade = SpotipyFacade(mirror=LibraryMirror(":memory:"))
+        facade.sp = sp
+        fresh = facade.get_followed_item("tr", item_name="daft")
+
+        def offline(*args, **kwargs):
+            raise AssertionError("The library was requested from spotify")
+
+        monkeypatch.setattr(sp, "current_user_saved_tracks", offline)
+        mirrored = facade.get_followed_item(
+            "tr", item_name="daft", mirrored=True
+        )
+        by_id = facade.get_followed_item("tr", item_id="tr3", mirrored=True)
+        missing = facade.get_followed_item(
+            "tr", item_name="nope", mirrored=True
+        )
+        facade.mirror.close()
+
+        assert [item.id for item in fresh] == ["tr1", "tr0"]
+        assert [item.id for item in mirrored] == ["tr1", "tr0"]
+        assert mirrored[0].artists == ("Daft Punk",)
+        assert [item.name for item in by_id] == ["Déjà Vu"]
+        assert missing is None
+
+    def test_search_syncs_what_changed(self, monkeypatch):
+        sp = self._library()
+        facade = SpotipyFacade(mirror=LibraryMirror(":memory:"))
+        facade.sp = sp
+        assert facade.get_followed_item("tr", item_name="harder") is None
+
+        sp.create_item("track", "tr9", "Harder Better", extern=True)
+        items, collection = facade.get_items_and_collection("tr", ["tr9"])
+        collection.add_many(items)
+        facade.library_changed("tr")
+        stale = facade.get_collection("tr", mirrored=True)
+        calls = []
+
+        def counted(name, getter):
+            def request(*args, **kwargs):
+                calls.append(name)
+                return getter(*args, **kwargs)
+
+            return request
+
+        for name in ("current_user_saved_tracks", "tracks", "track"):
+            monkeypatch.setattr(sp, name, counted(name, getattr(sp, name)))
+        found = facade.get_followed_item("tr", item_name="harder")
+        requests_found = list(calls)
+        mirrored = facade.get_followed_item(
+            "tr", item_name="harder", mirrored=True
+        )
+        current = facade.get_collection("tr", mirrored=True)
+        facade.mirror.close()
+
+        # Changed since the sync, so not read from the mirror
+        assert not isinstance(stale, MirroredCollection)
+        assert [item.id for item in found] == ["tr9"]
+        # Only the newest page of saved tracks was requested
+        assert requests_found == ["current_user_saved_tracks"]
+        assert [item.id for item in mirrored] == ["tr9"]
+        assert calls == requests_found
+        assert isinstance(current, MirroredCollection)
+
+    def test_concurrent_searches_sync_once(self, monkeypatch):
+        sp = self._library()
+        facade = SpotipyFacade(mirror=LibraryMirror(":memory:"))
+        facade.sp = sp
+        facade.sync_mirror(["tr"])
+        getter = sp.current_user_saved_tracks
+        release = threading.Event()
+        calls = []
+
+        def blocked(*args, **kwargs):
+            calls.append(args)
+            release.wait(5)
+            return getter(*args, **kwargs)
+
+        monkeypatch.setattr(sp, "current_user_saved_tracks", blocked)
+        found = []
+        searches = [
+            threading.Thread(
+                target=lambda: found.append(
+                    facade.get_followed_item("tr", item_name="harder")
+                )
+            )
+            for _ in range(2)
+        ]
+        for search in searches:
+            search.start()
+        # Let both searches reach the sync before the first one gets its page
+        time.sleep(0.2)
+        release.set()
+        for search in searches:
+            search.join()
+        facade.mirror.close()
+
+        assert len(calls) == 1
+        assert found == [None, None]
+
+
+class TestStartup:
+    def test_help_stays_offline(self):
+        report = bench_startup.run_once(["--help"])
+        assert report["exit_code"] == 0
+        assert report["connections"] == []
+        assert report["heavy_modules"] == []
+
+    def test_bad_arguments_stay_offline(self):
+        report = bench_startup.run_once(["list", "track", "--limit", "x"])
+        assert report["exit_code"] == 2
+        assert report["connections"] == []
+        assert report["heavy_modules"] == []
+
+
+class TestBenchCommands:
+    def test_run_once_reports_calls(self):
+        with StubServer(bench_commands.build_library(50)) as server:
+            with tempfile.TemporaryDirectory() as workdir:
+                env = bench_commands.child_env(server, workdir)
+                argv = bench_commands.build_scenarios(server.data)["edit_add"]
+                before = list(server.data.playlist_tracks[argv[2]])
+                report = bench_commands.run_once(server, argv, env, trace=True)
+                after = server.data.playlist_tracks[argv[2]]
+
+        assert report["exit_code"] == 0
+        assert report["api_calls"] == sum(
+            report["api_calls_by_endpoint"].values()
+        )
+        assert report["api_calls_by_endpoint"]["add_playlist_items"] == 1
+        assert report["peak_rss_kb"] > 0
+        assert report["peak_allocated_bytes"] > 0
+        # The library is put back after every run
+        assert after == before
+
+    def test_compare_flags_regressions(self):
+        baseline = {
+            "list_all": {
+                "1000": {"mean_seconds": 1.0, "api_calls": 10},
+                "10000": {"mean_seconds": 5.0, "api_calls": 100},
+            }
+        }
+        results = {
+            "list_all": {
+                "1000": {"mean_seconds": 1.05, "api_calls": 11},
+                "10000": {"mean_seconds": 6.0, "api_calls": 100},
+            },
+            "create": {"1000": {"mean_seconds": 9.0, "api_calls": 1}},
+        }
+        regressions = bench_commands.compare(baseline, results, 0.1)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("list_all @ 1000: api_calls")
+        assert regressions[1].startswith("list_all @ 10000: mean_seconds")
+
+
+class TestBulkAdd:
+    @staticmethod
+    def _apply(playlist: list, requests: list) -> list:
+        for position, ids in requests:
+            if position is None:
+                playlist = playlist + ids
+            else:
+                playlist = playlist[:position] + ids + playlist[position:]
+        return playlist
+
+    def test_plan_matches_one_at_a_time(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            initial = [f"old_{i}" for i in range(rng.randint(0, 10))]
+            ids = [f"new_{i}" for i in range(rng.randint(1, 30))]
+            positions, length = [], len(initial)
+            for _ in ids:
+                positions.append(rng.choice([None, rng.randint(0, length)]))
+                length += 1
+
+            one_at_a_time = [
+                (pos, [item_id]) for item_id, pos in zip(ids, positions)
+            ]
+            planned = Playlist.plan_inserts(ids, positions, limit=4)
+            assert all(len(request_ids) <= 4 for _, request_ids in planned)
+            assert self._apply(initial, planned) == self._apply(
+                initial, one_at_a_time
+            )
+
+    def test_plan_coalesces_contiguous_inserts(self):
+        ids = ["a", "b", "c", "d", "e"]
+        planned = Playlist.plan_inserts(ids, [3, 4, 5, None, None], limit=100)
+        assert planned == [(3, ["a", "b", "c"]), (None, ["d", "e"])]
+        planned = Playlist.plan_inserts(ids, [0, 0, 0, 0, 0], limit=100)
+        assert planned == [(0, ["e", "d", "c", "b", "a"])]
+
+    def test_add_many_chunks_requests(self, monkeypatch):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        calls = []
+        add_items = spot.sp.playlist_add_items
+
+        def counting_add_items(playlist_id, items, position=None):
+            calls.append(len(items))
+            return add_items(playlist_id, items, position=position)
+
+        monkeypatch.setattr(spot.sp, "playlist_add_items", counting_add_items)
+        tracks = [
+            Track(spot.sp, f"tr{i}", {"name": f"tr{i}"}) for i in range(250)
+        ]
+        playlist.add_many(tracks)
+        added = spot.sp.playlist_tracks(playlist.id, limit=250)["items"]
+        spot.get_collection("playlist").remove(playlist)
+
+        assert calls == [100, 100, 50]
+        assert [track["track"]["id"] for track in added] == [
+            track.id for track in tracks
+        ]
+
+    def test_edit_add_from_file(self, tmp_path):
+        track_ids = ["3hgdCqTrU786DoKcqMGsA8", "55d553uqFMy1882OvdPPvV"]
+        ids_file = tmp_path / "ids.txt"
+        ids_file.write_text("\n".join(track_ids) + "\n")
+        if USE_DUMMY_WRAPPER:
+            for track_id in track_ids:
+                if spot.sp.track(track_id) is None:
+                    spot.sp.create_item(
+                        "track", track_id, track_id, extern=True
+                    )
+        tracks, _ = TestEdit()._modify_tracks_test(
+            "add", [track_ids[0], "--from-file", str(ids_file)], []
+        )
+        added = [track["track"]["id"] for track in tracks]
+        assert added == [track_ids[0]] + track_ids
+
+
+class TestRemovalPlanner:
+    def test_plan_specific_count_and_offset(self):
+        track_ids = ["a", "b", "a", "c", "a", "b", "a"]
+        index = {}
+        for position, track_id in enumerate(track_ids):
+            index.setdefault(track_id, []).append(position)
+
+        # 'b' has an explicit list, 'a' falls back to count within the window
+        planned = Playlist.plan_removals(
+            index, ["b", "a"], [[5]], count=2, offset=(1, -1)
+        )
+        assert planned == [(5, "b"), (4, "a"), (2, "a")]
+
+        planned = Playlist.plan_removals(index, ["a", "c"], [], offset=(3, 6))
+        assert planned == [(4, "a"), (3, "c")]
+
+    def test_large_removal_single_snapshot(self, monkeypatch):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        track_ids = [f"tr{i % 125}" for i in range(250)]
+        spot.sp.playlist_add_items(playlist.id, track_ids)
+        playlist = spot.get_item("playlist", playlist.id)
+
+        calls = {"playlist_tracks": 0, "snapshots": []}
+        playlist_tracks = spot.sp.playlist_tracks
+        remove_specific = spot.sp.playlist_remove_specific_occurrences_of_items
+
+        def counting_playlist_tracks(*args, **kwargs):
+            calls["playlist_tracks"] += 1
+            return playlist_tracks(*args, **kwargs)
+
+        def recording_remove(playlist_id, items, snapshot_id=None):
+            calls["snapshots"].append(snapshot_id)
+            assert sum(len(item["positions"]) for item in items) <= 100
+            return remove_specific(playlist_id, items, snapshot_id=snapshot_id)
+
+        monkeypatch.setattr(
+            spot.sp, "playlist_tracks", counting_playlist_tracks
+        )
+        monkeypatch.setattr(
+            spot.sp,
+            "playlist_remove_specific_occurrences_of_items",
+            recording_remove,
+        )
+        items = [Track(spot.sp, f"tr{i}", {"name": ""}) for i in range(125)]
+        requests = playlist.remove(items, count=2)
+        remaining = playlist_tracks(playlist.id)["items"]
+        spot.get_collection("playlist").remove(playlist)
+
+        assert requests == 3
+        # A single walk of the playlist, in pages of 100
+        assert calls["playlist_tracks"] == 3
+        assert len(set(calls["snapshots"])) == 1
+        assert calls["snapshots"][0] is not None
+        assert remaining == []
+
+
+class TestDedupe:
+    def test_plan_dedupe(self):
+        track_ids = ["a", "b", "a", None, "c", "a", None, "b"]
+        index = {}
+        for position, track_id in enumerate(track_ids):
+            index.setdefault(track_id, []).append(position)
+
+        first = Playlist.plan_dedupe(index, keep="first")
+        last = Playlist.plan_dedupe(index, keep="last")
+
+        assert first == [(7, "b"), (5, "a"), (2, "a")]
+        assert last == [(2, "a"), (1, "b"), (0, "a")]
+        with pytest.raises(ValueError):
+            Playlist.plan_dedupe(index, keep="middle")
+
+    @pytest.mark.parametrize("keep", ["first", "last"])
+    def test_dedupe_large_playlist(self, keep):
+        data = StubData().populate(tracks=300, playlists=0, saved_fraction=0)
+        track_ids = list(data.catalog["track"])
+        playlist = data.add("playlist")
+        tracks = [data.rng.choice(track_ids) for _ in range(1000)]
+        data.playlist_tracks[playlist["id"]] = list(tracks)
+
+        with StubServer(data) as server:
+            sp = spotipy.Spotify(auth="token")
+            sp.prefix = server.prefix
+            server.reset()
+            removed = Playlist(sp, playlist["id"]).dedupe(keep=keep)
+            calls = dict(server.calls)
+
+        kept = list(dict.fromkeys(tracks if keep == "first" else tracks[::-1]))
+        if keep == "last":
+            kept.reverse()
+        assert data.playlist_tracks[playlist["id"]] == kept
+        assert removed == 1000 - len(kept)
+        # One walk of the playlist in pages of 100, then at most 100 removals per request
+        assert calls["get_playlist_items"] == 10
+        assert calls["remove_playlist_items"] == -(-removed // 100)
+
+    def test_dedupe_command(self):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        spot.sp.playlist_add_items(playlist.id, ["tr1", "tr2", "tr1", "tr1"])
+        result = runner.invoke(app, ["edit", "dedupe", playlist.id, "-L"])
+        remaining = spot.sp.playlist_tracks(playlist.id)["items"]
+        missing = runner.invoke(app, ["edit", "dedupe", "no_such_playlist"])
+        spot.get_collection("playlist").remove(playlist)
+
+        assert Edit.Dedupe.removed.format(2) in result.stdout
+        assert [item["track"]["id"] for item in remaining] == ["tr2", "tr1"]
+        assert missing.exit_code == 1
+
+
+class TestPlaylistSync:
+    @staticmethod
+    def _apply(target_ids, removals, moves, inserts):
+        """Apply an edit script from Playlist.plan_sync to a list of track ids"""
+        removed = {position for position, _ in removals}
+        assert all(target_ids[position] == i for position, i in removals)
+        tracks = [t for i, t in enumerate(target_ids) if i not in removed]
+        for start, length, insert_before in moves:
+            block = tracks[start : start + length]
+            del tracks[start : start + length]
+            if insert_before > start:
+                insert_before -= length
+            tracks[insert_before:insert_before] = block
+        for position, ids in inserts:
+            assert len(ids) <= 100
+            tracks[position:position] = ids
+        return tracks
+
+    def test_plan_sync(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            alphabet = [f"tr{i}" for i in range(rng.randint(1, 12))] + [None]
+            source = [rng.choice(alphabet) for _ in range(rng.randint(0, 25))]
+            target = [rng.choice(alphabet) for _ in range(rng.randint(0, 25))]
+            plan = Playlist.plan_sync(source, target, 100)
+            synced = self._apply(target, *plan)
+            # Unavailable tracks can't be added or removed, so they are left as they were
+            assert [t for t in synced if t is not None] == [
+                t for t in source if t is not None
+            ]
+            assert synced.count(None) == target.count(None)
+
+    def test_plan_sync_is_minimal(self):
+        source = [f"tr{i}" for i in range(1000)]
+        target = source[:100] + source[300:] + source[100:300]
+        target[500:510] = [f"new{i}" for i in range(10)]
+        removals, moves, inserts = Playlist.plan_sync(source, target, 100)
+
+        assert self._apply(target, removals, moves, inserts) == source
+        assert len(removals) == 10
+        # The moved block goes back in one range move, made after the removals
+        assert moves == [(790, 200, 100)]
+        assert inserts == [(700, source[700:710])]
+
+    def test_sync_sends_the_diff(self):
+        data = StubData().populate(tracks=3000, playlists=0, saved_fraction=0)
+        track_ids = list(data.catalog["track"])
+        source, target = data.add("playlist"), data.add("playlist")
+        data.playlist_tracks[source["id"]] = track_ids[:2000]
+        edited = track_ids[:2000]
+        del edited[700:750]
+        edited[100:100] = track_ids[2000:2005]
+        edited.insert(1500, edited.pop(10))
+        data.playlist_tracks[target["id"]] = edited
+
+        with StubServer(data) as server:
+            sp = spotipy.Spotify(auth="token")
+            sp.prefix = server.prefix
+            server.reset()
+            planned = Playlist(sp, target["id"]).sync_from(
+                Playlist(sp, source["id"]), dry_run=True
+            )
+            dry_calls = dict(server.calls)
+            server.reset()
+            synced = Playlist(sp, target["id"]).sync_from(
+                Playlist(sp, source["id"])
+            )
+            calls = dict(server.calls)
+
+        assert data.playlist_tracks[target["id"]] == track_ids[:2000]
+        assert planned == synced
+        assert synced == {
+            "removed": 5,
+            "moved": 1,
+            "inserted": 50,
+            "requests": 3,
+        }
+        # Both playlists are read in pages of 100, and nothing is written on a dry run
+        assert dry_calls == {"get_playlist": 4, "get_playlist_items": 40}
+        assert calls["remove_playlist_items"] == 1
+        assert calls["update_playlist_items"] == 1
+        assert calls["add_playlist_items"] == 1
+
+    def test_sync_command(self):
+        source = spot.create_playlist(TEST_PL_NAME)
+        target = spot.create_playlist(TEST_PL_NAME)
+        spot.sp.playlist_add_items(source.id, ["tr1", "tr2", "tr3", "tr1"])
+        spot.sp.playlist_add_items(target.id, ["tr3", "tr4", "tr1", "tr2"])
+
+        dry_run = runner.invoke(
+            app, ["edit", "sync", source.id, target.id, "-n"]
+        )
+        unchanged = spot.sp.playlist_tracks(target.id)["items"]
+        result = runner.invoke(app, ["edit", "sync", source.id, target.id])
+        synced = spot.sp.playlist_tracks(target.id)["items"]
+        for playlist in (source, target):
+            spot.get_collection("playlist").remove(playlist)
+
+        plan = dict(removed=1, moved=1, inserted=1, requests=3)
+        assert Edit.Sync.planned.format(**plan) in dry_run.stdout
+        assert [item["track"]["id"] for item in unchanged][0] == "tr3"
+        assert Edit.Sync.synced.format(**plan) in result.stdout
+        assert [item["track"]["id"] for item in synced] == [
+            "tr1",
+            "tr2",
+            "tr3",
+            "tr1",
+        ]
+
+
+class TestTransfer:
+    @pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+    def test_round_trip(self, fmt):
+        sp = DummySpotipy().populate(tracks=300, saved_fraction=1)
+        facade = SpotipyFacade(concurrency=2, mirror=LibraryMirror(":memory:"))
+        facade.sp = sp
+        saved = list(sp.library["track"].ids)
+        exported = io.StringIO(newline="")
+        count = write_records(facade.export_items("tr"), exported, fmt)
+
+        facade.get_collection("tr").remove_many(
+            [Track(sp, i, {"name": ""}) for i in saved]
+        )
+        exported.seek(0)
+        records = read_records(exported, fmt)
+        progress = [number for number, _ in facade.import_items(records)]
+        exported.seek(0)
+        first = next(read_records(exported, fmt, start=0))[1]
+
+        assert count == 300
+        assert set(sp.library["track"].ids) == set(saved)
+        # Chunks of 50 ids, enough for 2 requests at once
+        assert progress == [100, 200, 300]
+        track = sp.data.catalog["track"][saved[0]]
+        assert first["name"] == track["name"]
+        assert first["artists"] == [a["name"] for a in track["artists"]]
+
+    def test_read_records_from_start(self):
+        lines = io.StringIO(
+            '{"type": "track", "id": "a"}\n\n{"type": "track", "id": "b"}\n'
+            + "not json\n"
+        )
+        records = read_records(lines, "ndjson", start=1)
+        assert next(records) == (2, {"type": "track", "id": "b"})
+        with pytest.raises(ValueError):
+            next(records)
+
+    def test_resume_interrupted_import(self, monkeypatch):
+        source = spot.create_playlist(TEST_PL_NAME)
+        target = spot.create_playlist(TEST_PL_NAME)
+        track_ids = [f"tr{i}" for i in range(350)]
+        spot.sp.playlist_add_items(source.id, track_ids)
+
+        playlist_add_items = spot.sp.playlist_add_items
+        calls = []
+
+        def interrupted_add_items(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return playlist_add_items(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/tracks.csv"
+            exported = runner.invoke(
+                app, ["export", "pl", source.id, "-o", path]
+            )
+            monkeypatch.setattr(
+                spot.sp, "playlist_add_items", interrupted_add_items
+            )
+            first = runner.invoke(app, ["import", path, target.id])
+            with open(path + ".progress") as progress_file:
+                progress = progress_file.read()
+            resumed = runner.invoke(app, ["import", path, target.id, "-r"])
+            progress_left = os.path.exists(path + ".progress")
+        synced = spot.sp.playlist_tracks(target.id, limit=100)["total"]
+        imported = spot.get_item("playlist", target.id).items(
+            limit=100, retrieve_all=True
+        )
+        for playlist in (source, target):
+            spot.get_collection("playlist").remove(playlist)
+
+        assert Transfer.exported.format(350) in exported.stderr
+        assert first.exit_code != 0
+        assert progress == "200"
+        assert Transfer.resuming.format(201) in resumed.stdout
+        assert Transfer.imported.format(150) in resumed.stdout
+        assert not progress_left
+        assert synced == 350
+        assert [track.id for track in imported] == track_ids
+
+
+class Terminal(io.StringIO):
+    """The stdin of a client run from a terminal, which is only read to answer prompts"""
+
+    def isatty(self):
+        return True
+
+
+class TestDaemon:
+    @contextmanager
+    def daemon(self):
+        """A daemon serving on a temporary socket, until its idle timeout stops it"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/daemon.sock"
+            ready = threading.Event()
+            server = threading.Thread(
+                target=daemon.serve, args=(app, path, 0.5, ready)
+            )
+            server.start()
+            ready.wait()
+            yield path
+            server.join(timeout=5)
+            assert not server.is_alive()
+            assert not os.path.exists(path)
+
+    def run(self, path, argv, stdin=""):
+        if not isinstance(stdin, io.StringIO):
+            stdin = io.StringIO(stdin)
+        out, err = io.StringIO(), io.StringIO()
+        exit_code = client.run(argv, path, stdin, out, err, autostart=False)
+        return exit_code, out.getvalue(), err.getvalue()
+
+    def test_concurrent_clients(self):
+        playlists = [spot.create_playlist(TEST_PL_NAME) for _ in range(4)]
+        results = [None] * len(playlists)
+
+        with self.daemon() as path:
+
+            def unfollow(i):
+                argv = ["unfollow", "pl", playlists[i].id, "--no-prompt"]
+                results[i] = self.run(path, argv)
+
+            threads = [
+                threading.Thread(target=unfollow, args=(i,))
+                for i in range(len(playlists))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            bad_command = self.run(path, ["bogus"])
+
+        for playlist, (exit_code, out, err) in zip(playlists, results):
+            assert exit_code == 0
+            # Every client gets the output of its own command, and only that
+            assert (
+                out
+                == Unfollow.unfollowed_item.format(TEST_PL_NAME, playlist.id)
+                + "\n"
+            )
+            assert err == ""
+            assert not FollowedPlaylists(spot.sp).contains(playlist)
+        assert bad_command[0] == 2
+        assert "No such command" in bad_command[2]
+
+    def test_prompt_answered_by_client(self):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        argv = ["unfollow", "playlist", playlist.id]
+        with self.daemon() as path:
+            canceled = self.run(path, argv, Terminal("n\n"))
+            approved = self.run(path, argv, Terminal("y\n"))
+
+        assert canceled[0] == 0
+        assert (
+            Unfollow.confirm.format("playlist", TEST_PL_NAME, playlist.id)
+            in canceled[1]
+        )
+        assert General.op_canceled in canceled[1]
+        assert approved[0] == 0
+        assert not FollowedPlaylists(spot.sp).contains(playlist)
+
+    def test_piped_stdin(self):
+        playlist = spot.create_playlist(TEST_PL_NAME)
+        track_ids = ["3hgdCqTrU786DoKcqMGsA8", "55d553uqFMy1882OvdPPvV"]
+        if USE_DUMMY_WRAPPER:
+            for track_id in track_ids:
+                if spot.sp.track(track_id) is None:
+                    spot.sp.create_item(
+                        "track", track_id, track_id, extern=True
+                    )
+        with self.daemon() as path:
+            # Arguments piped in, and IDs read from stdin with '-'
+            argv = ["edit", "add", playlist.id]
+            piped = self.run(path, argv, track_ids[0] + "\n")
+            from_stdin = self.run(path, argv + ["-f", "-"], track_ids[1])
+        added = spot.get_item("playlist", playlist.id).items(limit=10)
+        spot.get_collection("playlist").remove(playlist)
+
+        assert piped[0] == 0
+        assert from_stdin[0] == 0
+        assert [track.id for track in added] == track_ids
+
+    def test_piped_arguments_with_batch_argument(self):
+        with self.daemon() as path:
+            # 'batch' is only the query here, so the piped '--user' is still an argument
+            exit_code, out, _ = self.run(
+                path, ["search", "playlist", "batch"], "--user\n"
+            )
+
+        assert exit_code == 1
+        assert General.not_found.format("batch") in out
+
+    def test_one_daemon_per_socket(self):
+        with self.daemon() as path:
+            started = daemon.serve(app, path)
+            # A client in another directory runs its command itself
+            sock = client.connect(path)
+            with sock, sock.makefile("rwb") as sock_file:
+                client.send(sock_file, {"cwd": "/elsewhere"})
+                reply = client.receive(sock_file)
+
+        assert not started
+        assert reply == {"refused": os.getcwd()}
+
+    def test_refused_client_keeps_stdin(self, tmp_path):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with self.daemon() as path:
+            # Refused, since it runs in another directory, so it runs the command itself
+            result = subprocess.run(
+                [sys.executable, "-m", "cli.client", "save", "tr"],
+                input="NoSuchTrack\n",
+                capture_output=True,
+                text=True,
+                cwd=tmp_path,
+                env=dict(
+                    os.environ, PYTHONPATH=root, SPOTIFY_CLI_SOCKET=path
+                ),
+                timeout=60,
+            )
+
+        # The piped argument still reached the command
+        assert General.no_item.format("tr", "NoSuchTrack") in result.stdout
+
+
+class TestBatch:
+    def test_plan_steps(self):
+        text = [
+            "save tr a b",
+            "save track c",
+            "unsave track a",
+            "unfollow pl x",
+            "unfollow pl y -n",
+            "unfollow playlist z --no-prompt",
+            "--mirror list tr",
+            "search tr 'a name'",
+            "save tr -f ids.txt",
+        ]
+        lines = list(read_lines(io.StringIO("\n# comment\n".join(text))))
+        steps = list(plan_steps(lines, spot))
+
+        assert [line.number for line in lines] == list(range(1, 18, 2))
+        assert lines[7].argv == ["search", "tr", "a name"]
+        assert [[line.number for line in step.lines] for step in steps] == [
+            [1, 3],
+            [5],
+            [7],
+            [9, 11],
+            [13],
+            [15],
+            [17],
+        ]
+        assert [step.merge for step in steps] == [
+            ("save", "track"),
+            ("unsave", "track"),
+            None,
+            ("unfollow", "playlist"),
+            None,
+            None,
+            None,
+        ]
+        assert [step.concurrent for step in steps] == [
+            False,
+            False,
+            False,
+            False,
+            True,
+            True,
+            False,
+        ]
+
+    def test_merged_lines_match_single_commands(self, monkeypatch):
+        track_ids = ["3hgdCqTrU786DoKcqMGsA8", "55d553uqFMy1882OvdPPvV"]
+        if USE_DUMMY_WRAPPER:
+            for track_id in track_ids:
+                if spot.sp.track(track_id) is None:
+                    spot.sp.create_item(
+                        "track", track_id, track_id, extern=True
+                    )
+        text = [
+            f"save track {track_ids[0]} nope",
+            f"save tr {track_ids[1]}",
+            f"unsave tr {track_ids[0]} {track_ids[1]}",
+            "unfollow pl nope -n",
+            'bogus "',
+        ]
+        single = [runner.invoke(app, shlex.split(line)) for line in text[:4]]
+
+        saved_tracks_add = spot.sp.current_user_saved_tracks_add
+        calls = []
+
+        def counted_add(tracks):
+            calls.append(tracks)
+            return saved_tracks_add(tracks)
+
+        monkeypatch.setattr(
+            spot.sp, "current_user_saved_tracks_add", counted_add
+        )
+        result = runner.invoke(
+            app, ["batch", "--json"], input="\n".join(text) + "\n"
+        )
+        results = [json.loads(line) for line in result.stdout.splitlines()]
+
+        assert result.exit_code == 1
+        assert [r["line"] for r in results] == [1, 2, 3, 4, 5]
+        for r, expected in zip(results, single):
+            assert r["exit_code"] == expected.exit_code
+            assert r["stdout"] == expected.stdout
+        assert results[4]["exit_code"] == 2
+        # Both save lines were saved with one request
+        assert calls == [track_ids]
+        assert Batch.summary.format(5, 3) in result.stderr
+
+    def test_unknown_type_fails_only_its_line(self):
+        commands = "save bogus X\nsave tr nope\n"
+        steps = list(plan_steps(read_lines(io.StringIO(commands)), spot))
+        result = runner.invoke(app, ["batch", "--json"], input=commands)
+        results = [json.loads(line) for line in result.stdout.splitlines()]
+
+        assert [step.merge for step in steps] == [None, ("save", "track")]
+        assert [r["exit_code"] for r in results] == [1, 1]
+        assert "KeyError" in results[0]["stderr"]
+        assert (
+            results[1]["stdout"] == General.no_item.format("tr", "nope") + "\n"
+        )
+        assert Batch.summary.format(2, 2) in result.stderr
+
+    def test_results_in_order(self):
+        playlists = [spot.create_playlist(TEST_PL_NAME) for _ in range(3)]
+        limits = [3, 1, 2, 3, 1, 2]
+        commands = "".join(f"list pl -l {limit}\n" for limit in limits)
+        result = runner.invoke(app, ["batch", "-c", "4"], input=commands)
+        for playlist in playlists:
+            spot.get_collection("playlist").remove(playlist)
+
+        blocks = result.stdout.split("[")[1:]
+        assert result.exit_code == 0
+        for number, (limit, block) in enumerate(zip(limits, blocks), 1):
+            assert block.startswith(f"{number}] exit 0: list pl -l {limit}")
+            assert block.count("Playlist id:") == limit
+
+
+class TestBulkLibrary:
+    def test_saved_tracks_chunked(self, monkeypatch):
+        sp = DummySpotipy()
+        track_ids = [f"tr{i}" for i in range(120)]
+        for track_id in track_ids:
+            sp.create_item("track", track_id, track_id, extern=True)
+        tracks = [
+            Track(sp, track_id, {"name": track_id}) for track_id in track_ids
+        ]
+
+        chunk_sizes = []
+        saved_tracks_add = sp.current_user_saved_tracks_add
+
+        def counting_add(tracks):
+            chunk_sizes.append(len(tracks))
+            return saved_tracks_add(tracks)
+
+        monkeypatch.setattr(sp, "current_user_saved_tracks_add", counting_add)
+        collection = SavedTracks(sp)
+        collection.add_many(tracks)
+
+        assert sorted(chunk_sizes) == [20, 50, 50]
+        assert collection.contains_many(tracks) == [True] * 120
+        collection.remove_many(tracks[:60])
+        assert collection.contains_many(tracks) == [False] * 60 + [True] * 60
+
+    def test_saved_albums_chunk_limit(self, monkeypatch):
+        sp = DummySpotipy()
+        albums = [Album(sp, f"al{i}", {"name": ""}) for i in range(45)]
+        chunk_sizes = []
+
+        def counting_contains(albums):
+            chunk_sizes.append(len(albums))
+            return [False] * len(albums)
+
+        monkeypatch.setattr(
+            sp, "current_user_saved_albums_contains", counting_contains
+        )
+        assert SavedAlbums(sp).contains_many(albums) == [False] * 45
+        assert sorted(chunk_sizes) == [5, 20, 20]
+
+    def test_save_many_cli(self):
+        item_ids = ["2bulkSaveTrackId000001", "2bulkSaveTrackId000002"]
+        for item_id in item_ids:
+            spot.sp.create_item("track", item_id, item_id, extern=True)
+
+        result = runner.invoke(app, args=["save", "tr", *item_ids, "DNE"])
+        collection = SavedTracks(spot.sp)
+        items = [Track(spot.sp, item_id, {"name": ""}) for item_id in item_ids]
+        saved = collection.contains_many(items)
+        collection.remove_many(items)
+
+        assert saved == [True, True]
+        assert result.exit_code == 1
+        assert "No tr exists with id: DNE" in result.stdout
+        for item_id in item_ids:
+            assert Save.saved.format("track", item_id, item_id) in result.stdout
+
+
+class TestTransport:
+    @staticmethod
+    def _fetch_tracks(transport: Transport, server: StubServer, count: int):
+        sp = spotipy.Spotify(auth="token", **transport.spotify_kwargs())
+        sp.prefix = server.prefix
+        ids = list(server.data.catalog["track"])[:count]
+        fetched = [track["id"] for track in ordered_map(sp.track, ids, 4)]
+        return ids, fetched
+
+    def test_connections_reused(self):
+        transport = Transport(pool_size=4)
+        with StubServer() as server:
+            ids, fetched = self._fetch_tracks(transport, server, 40)
+            handshakes = server.counters["connections"]
+        stats = transport.stats.snapshot()
+        transport.close()
+
+        assert fetched == ids
+        assert handshakes <= 4
+        assert stats["connections"] == handshakes
+        assert stats["requests"] == 40
+        assert stats["reused"] == 40 - handshakes
+
+    def test_gzip_negotiation(self):
+        sizes = {}
+        with StubServer() as server:
+            for gzip in (True, False):
+                transport = Transport(pool_size=1, gzip=gzip)
+                self._fetch_tracks(transport, server, 2)
+                sizes[gzip] = transport.stats.snapshot()
+                transport.close()
+
+        assert sizes[True]["decoded_bytes"] == sizes[False]["decoded_bytes"]
+        assert sizes[True]["wire_bytes"] < sizes[True]["decoded_bytes"]
+        assert sizes[False]["wire_bytes"] == sizes[False]["decoded_bytes"]
+
+
+class TestRateLimiter:
+    @staticmethod
+    def _client(server: StubServer, limiter: RateLimiter):
+        transport = Transport(pool_size=4, limiter=limiter)
+        sp = spotipy.Spotify(auth="token", **transport.spotify_kwargs())
+        sp.prefix = server.prefix
+        return sp, transport
+
+    def test_token_bucket_spaces_requests(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        waits = [bucket.reserve() for _ in range(5)]
+        assert waits[0] == 0
+        for expected, wait in zip([0.1, 0.2, 0.3, 0.4], waits[1:]):
+            assert abs(wait - expected) < 0.05
+
+    def test_endpoint_limits(self):
+        limits = parse_endpoint_limits("search=2, me/tracks=5, me=1")
+        assert limits == {"search": 2, "me/tracks": 5, "me": 1}
+
+        limiter = RateLimiter(endpoint_limits=limits)
+        api = "https://api.spotify.com/v1/"
+        assert limiter.endpoint(api + "me/tracks?limit=50") == "me/tracks"
+        assert limiter._endpoint_bucket(api + "me/tracks").rate == 5
+        assert limiter._endpoint_bucket(api + "me/albums").rate == 1
+        assert limiter._endpoint_bucket(api + "search?q=a").rate == 2
+        assert limiter._endpoint_bucket(api + "tracks/abc") is None
+
+    def test_retry_after_is_honored(self):
+        limiter = RateLimiter(rate=0)
+        with StubServer() as server:
+            server.faults.append((429, {"Retry-After": "0.2"}))
+            sp, transport = self._client(server, limiter)
+            start = time.monotonic()
+            track_id = next(iter(server.data.catalog["track"]))
+            track = sp.track(track_id)
+            elapsed = time.monotonic() - start
+            transport.close()
+
+        stats = limiter.stats()
+        assert track["id"] == track_id
+        assert elapsed >= 0.2
+        assert stats["rate_limited"] == 1
+        assert stats["throttled_seconds"] >= 0.15
+
+    def test_retry_after_pauses_every_thread(self):
+        limiter = RateLimiter(rate=0)
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["Retry-After"] = "0.3"
+        assert limiter.retry_delay(response, attempt=0) == 0
+
+        waited = []
+
+        def acquire():
+            start = time.monotonic()
+            limiter.acquire("https://api.spotify.com/v1/tracks/abc")
+            waited.append(time.monotonic() - start)
+
+        threads = [threading.Thread(target=acquire) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(waited) == 3
+        assert all(wait >= 0.25 for wait in waited)
+
+    def test_server_errors_back_off(self):
+        limiter = RateLimiter(rate=0, backoff_factor=0.01)
+        with StubServer() as server:
+            server.faults.extend([(503, {}), (502, {})])
+            sp, transport = self._client(server, limiter)
+            track_id = next(iter(server.data.catalog["track"]))
+            track = sp.track(track_id)
+            transport.close()
+
+        stats = limiter.stats()
+        assert track["id"] == track_id
+        assert stats["server_errors"] == 2
+        assert transport.snapshot()["requests"] == 3
+
+    def test_stats_option(self):
+        result = runner.invoke(app, args=["--stats", "list", "tr"])
+        assert result.exit_code == 0
+        assert "HTTP stats:" in result.stderr
+        assert "throttled_seconds: " in result.stderr
+
+    def test_retries_exhausted(self):
+        limiter = RateLimiter(rate=0, max_retries=1, backoff_factor=0.01)
+        with StubServer() as server:
+            server.faults.extend([(500, {}), (500, {}), (500, {})])
+            sp, transport = self._client(server, limiter)
+            try:
+                sp.track(next(iter(server.data.catalog["track"])))
+                raised = None
+            except spotipy.SpotifyException as e:
+                raised = e
+            transport.close()
+
+        assert raised is not None and raised.http_status == 500
+        assert limiter.stats()["server_errors"] == 2
+        assert server.counters["requests"] == 2
+
+    def test_server_errors_not_retried_for_post(self):
+        limiter = RateLimiter(rate=0, backoff_factor=0.01)
+        with StubServer() as server:
+            server.faults.append((503, {}))
+            sp, transport = self._client(server, limiter)
+            playlist_id = next(iter(server.data.playlist_tracks))
+            track_id = next(iter(server.data.catalog["track"]))
+            try:
+                sp.playlist_add_items(playlist_id, [track_id])
+                raised = None
+            except spotipy.SpotifyException as e:
+                raised = e
+            transport.close()
+
+        assert raised is not None and raised.http_status == 503
+        assert limiter.stats()["server_errors"] == 1
+        assert server.counters["requests"] == 1
+
+
+class TestDummySpotipy:
+    def test_paging_and_newest_first(self):
+        sp = DummySpotipy().populate(tracks=120, saved_fraction=0)
+        track_ids = list(sp.data.catalog["track"])
+        sp.current_user_saved_tracks_add(track_ids[:50])
+        sp.current_user_saved_tracks_add(track_ids[50:105])
+
+        first = sp.current_user_saved_tracks(limit=20, offset=0)
+        last = sp.current_user_saved_tracks(limit=20, offset=100)
+        assert first["total"] == 105 and first["next"] is not None
+        assert first["items"][0]["track"]["id"] == track_ids[104]
+        assert [saved["track"]["id"] for saved in last["items"]] == [
+            track_ids[4],
+            track_ids[3],
+            track_ids[2],
+            track_ids[1],
+            track_ids[0],
+        ]
+        assert last["next"] is None
+
+        tracks = SavedTracks(sp).items(limit=20, retrieve_all=True)
+        assert len(tracks) == 105
+
+    def test_snapshot_tracking(self):
+        sp = DummySpotipy()
+        playlist = sp.user_playlist_create(sp.me()["id"], TEST_PL_NAME)
+        first = sp.playlist_add_items(playlist["id"], ["tr1", "tr2", "tr1"])
+        second = sp.playlist_add_items(playlist["id"], ["tr3"])
+        assert first["snapshot_id"] != second["snapshot_id"]
+
+        # Any snapshot the playlist has had is accepted, others are rejected
+        sp.playlist_remove_specific_occurrences_of_items(
+            playlist["id"],
+            [{"uri": "tr1", "positions": [2]}],
+            snapshot_id=first["snapshot_id"],
+        )
+        with pytest.raises(spotipy.SpotifyException):
+            sp.playlist_remove_all_occurrences_of_items(
+                playlist["id"], ["tr1"], snapshot_id="not_a_snapshot"
+            )
+        with pytest.raises(spotipy.SpotifyException):
+            sp.playlist_remove_specific_occurrences_of_items(
+                playlist["id"], [{"uri": "tr1", "positions": [1]}]
+            )
+        tracks = sp.playlist_items(playlist["id"])["items"]
+        assert [track["track"]["id"] for track in tracks] == [
+            "tr1",
+            "tr2",
+            "tr3",
+        ]
+        assert sp.playlist(playlist["id"])["tracks"]["total"] == 3
+
+    def test_library_at_scale(self):
+        start = time.perf_counter()
+        sp = DummySpotipy().populate(
+            tracks=100000, artists=2000, playlists=10, saved_fraction=1
+        )
+        tracks = SavedTracks(sp).items(limit=50, retrieve_all=True)
+        artists = FollowedArtists(sp).items(limit=50, retrieve_all=True)
+        assert SavedTracks(sp).contains_many(tracks[-1000:]) == [True] * 1000
+        elapsed = time.perf_counter() - start
+
+        assert [track.id for track in tracks] == sp.data.library["track"]
+        assert [artist.id for artist in artists] == sp.data.library["artist"]
+        assert elapsed < 30
+
+
+class TestStubServer:
+    @staticmethod
+    def _statuses(server: StubServer, count: int) -> List[int]:
+        track_id = next(iter(server.data.catalog["track"]))
+        with requests.Session() as session:
+            return [
+                session.get(server.url(f"tracks/{track_id}")).status_code
+                for _ in range(count)
+            ]
+
+    def test_latency_and_jitter(self):
+        with StubServer(latency=0.05, jitter=0.02) as server:
+            start = time.monotonic()
+            self._statuses(server, 5)
+            elapsed = time.monotonic() - start
+        assert 5 * 0.03 <= elapsed
+
+    def test_injected_faults_are_seeded(self):
+        runs = []
+        for _ in range(2):
+            data = StubData().populate(tracks=10)
+            with StubServer(
+                data, throttle_rate=0.2, error_rate=0.1, retry_after=0.5, seed=7
+            ) as server:
+                statuses = self._statuses(server, 200)
+                counters = dict(server.counters)
+            runs.append(statuses)
+
+        assert runs[0] == runs[1]
+        throttled = statuses.count(429)
+        errors = sum(statuses.count(status) for status in (500, 502, 503))
+        assert counters["throttled"] == throttled and 20 < throttled < 60
+        assert counters["errors"] == errors and 5 < errors < 40
+        assert throttled + errors + statuses.count(200) == 200
+
+    def test_paging_at_scale(self):
+        data = StubData().populate(tracks=5000, saved_fraction=1)
+        with StubServer(data) as server:
+            sp = spotipy.Spotify(auth="token")
+            sp.prefix = server.prefix
+            page = sp.current_user_saved_tracks(limit=50)
+            ids = []
+            while page is not None:
+                ids += [saved["track"]["id"] for saved in page["items"]]
+                page = sp.next(page)
+        assert page is None
+        assert ids == data.library["track"]
+
+    def test_playlist_reorder_and_replace(self):
+        with StubServer() as server:
+            sp = spotipy.Spotify(auth="token")
+            sp.prefix = server.prefix
+            playlist_id = server.data.library["playlist"][0]
+            tracks = server.data.playlist_tracks[playlist_id]
+            before = list(tracks)
+
+            sp.playlist_reorder_items(
+                playlist_id, range_start=0, insert_before=5, range_length=2
+            )
+            assert tracks == before[2:5] + before[:2] + before[5:]
+
+            sp.playlist_replace_items(playlist_id, before[:3])
+            assert tracks == before[:3]
+
+            stale = {"range_start": 0, "insert_before": 2, "snapshot_id": "x"}
+            response = requests.put(
+                server.url(f"playlists/{playlist_id}/items"), json=stale
+            )
+            assert response.status_code == 400
+
+
+class TestAsyncFacade:
+    @staticmethod
+    def run(server: StubServer, scenario, concurrency=4):
+        """Run 'scenario(facade)' on an AsyncSpotipyFacade talking to the stub server"""
+
+        async def main():
+            client = AsyncSpotify(
+                auth="token", concurrency=concurrency, prefix=server.prefix
+            )
+            async with AsyncSpotipyFacade(
+                concurrency=concurrency, client=client
+            ) as facade:
+                return await scenario(facade)
+
+        return asyncio.run(main())
+
+    def test_retrieve_all_pages_in_order(self):
+        async def scenario(facade):
+            saved = facade.get_collection("tr")
+            return [track.id for track in await saved.items(retrieve_all=True)]
+
+        with StubServer() as server:
+            ids = self.run(server, scenario)
+            expected = server.data.library["track"]
+        assert ids == expected
+
+    def test_followed_artists_by_cursor(self):
+        async def scenario(facade):
+            followed = facade.get_collection("ar")
+            artists = await followed.items(limit=3, retrieve_all=True)
+            return [artist.id for artist in artists]
+
+        with StubServer() as server:
+            ids = self.run(server, scenario)
+            expected = server.data.library["artist"]
+        assert sorted(ids) == sorted(expected)
+
+    def test_get_items(self):
+        async def scenario(facade):
+            tracks = await facade.get_items("track", ids)
+            playlist = await facade.get_item("pl", playlist_id)
+            missing = await facade.get_item("pl", "missing")
+            return tracks, playlist, missing
+
+        with StubServer() as server:
+            ids = list(server.data.catalog["track"])[:60] + ["missing"]
+            playlist_id = server.data.library["playlist"][0]
+            tracks, playlist, missing = self.run(server, scenario)
+            requests_sent = server.counters["requests"]
+
+        assert [track.id for track in tracks[:-1]] == ids[:-1]
+        assert tracks[-1] is None
+        assert playlist.id == playlist_id
+        assert missing is None
+        # 61 tracks in chunks of 50, and two playlists
+        assert requests_sent == 4
+
+    def test_library_bulk_edits(self):
+        async def scenario(facade):
+            saved = facade.get_collection("track")
+            tracks = await facade.get_items("track", unsaved)
+            before = await saved.contains_many(tracks)
+            await saved.add_many(tracks)
+            after_add = await saved.contains_many(tracks)
+            await saved.remove_many(tracks[:10])
+            after_remove = await saved.contains_many(tracks)
+            return before, after_add, after_remove
+
+        with StubServer() as server:
+            saved_ids = set(server.data.library["track"])
+            unsaved = [
+                track_id
+                for track_id in server.data.catalog["track"]
+                if track_id not in saved_ids
+            ][:60]
+            before, after_add, after_remove = self.run(server, scenario)
+
+        assert not any(before)
+        assert all(after_add)
+        assert after_remove == [False] * 10 + [True] * 50
+
+    def test_playlist_edits(self):
+        async def scenario(facade):
+            playlist = await facade.create_playlist(TEST_PL_NAME)
+            tracks = await facade.get_items("track", track_ids)
+            await playlist.add_many(tracks)
+            await playlist.add(tracks[0], position=0)
+            after_add = await playlist.track_ids()
+            await playlist.remove(tracks[0])
+            after_remove = await playlist.track_ids()
+            await playlist.add(tracks[0], position=0)
+            await playlist.remove(tracks[0], all=True)
+            after_remove_all = await playlist.track_ids()
+            return playlist, after_add, after_remove, after_remove_all
+
+        with StubServer() as server:
+            track_ids = list(server.data.catalog["track"])[:120]
+            playlist, after_add, after_remove, after_remove_all = self.run(
+                server, scenario
+            )
+            stored = server.data.catalog["playlist"][playlist.id]
+
+        assert playlist.name == TEST_PL_NAME
+        assert after_add == track_ids[:1] + track_ids
+        # Only the first occurance is removed, unless all=True
+        assert after_remove == track_ids
+        assert after_remove_all == track_ids[1:]
+        assert playlist.snapshot_id == stored["snapshot_id"]
+
+    def test_playlist_remove_options(self):
+        async def scenario(facade):
+            playlist = await facade.get_item("playlist", playlist_id)
+            a, b, c = await facade.get_items("track", track_ids[:3])
+            before = await playlist.contains_many([a, b, c])
+            await playlist.remove_many([a, b], positions=[[4]], count=2)
+            await playlist.remove(c, offset=(3, None))
+            after = await playlist.contains_many([a, b, c])
+            return before, after
+
+        with StubServer() as server:
+            data = server.data
+            track_ids = list(data.catalog["track"])[:3]
+            a, b, c = track_ids
+            playlist_id = data.add("playlist")["id"]
+            data.playlist_tracks[playlist_id] = [a, b, c, a, a, b, c]
+            server.reset()
+            before, after = self.run(server, scenario)
+            calls = dict(server.calls)
+            tracks = data.playlist_tracks[playlist_id]
+
+        # a at position 4, both b, then the c after position 3
+        assert tracks == [a, c, a]
+        assert before == [True] * 3
+        assert after == [True, False, True]
+        # The playlist is walked once, every edit after that patches the index
+        assert calls["get_playlist_items"] == 1
+        assert calls["remove_playlist_items"] == 2
+
+    def test_search(self):
+        async def scenario(facade):
+            return await facade.search_public("track", name, limit=5)
+
+        with StubServer() as server:
+            track = next(iter(server.data.catalog["track"].values()))
+            name = track["name"]
+            found = self.run(server, scenario)
+        assert found[0].id == track["id"]
+
+    def test_retries_through_limiter(self):
+        async def scenario(facade):
+            facade.sp.limiter = limiter
+            return await facade.get_item("track", track_id)
+
+        limiter = RateLimiter(rate=0, backoff_factor=0.01)
+        with StubServer() as server:
+            track_id = next(iter(server.data.catalog["track"]))
+            server.faults.extend([(429, {"Retry-After": "0.1"}), (503, {})])
+            track = self.run(server, scenario)
+
+        assert track.id == track_id
+        assert limiter.stats()["rate_limited"] == 1
+        assert limiter.stats()["server_errors"] == 1
+
+    def test_connections_reused(self):
+        async def scenario(facade):
+            await bounded_gather(facade.sp.track, ids, 4)
+            return facade.sp.pool.stats.snapshot()
+
+        with StubServer() as server:
+            ids = list(server.data.catalog["track"])[:20]
+            stats = self.run(server, scenario, concurrency=2)
+            handshakes = server.counters["connections"]
+
+        assert stats["requests"] == 20
+        assert stats["connections"] == handshakes <= 2
+        assert stats["wire_bytes"] < stats["decoded_bytes"]
+
+    @pytest.mark.parametrize(
+        "method, retried", [("GET", True), ("POST", False)]
+    )
+    def test_reused_connection_dropped(self, method, retried):
+        async def handle(reader, writer):
+            # Answer the first request on each connection, then drop it on the next one
+            answered = False
+            while await reader.readuntil(b"\r\n\r\n"):
+                received.append(method)
+                if answered:
+                    break
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+                answered = True
+            writer.close()
+
+        async def scenario():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+            pool = ConnectionPool(1)
+            try:
+                await pool.request(method, url)
+                try:
+                    await pool.request(method, url)
+                    return True
+                except ConnectionError:
+                    return False
+            finally:
+                await pool.aclose()
+                server.close()
+
+        received = []
+        assert asyncio.run(scenario()) == retried
+        # A request that isn't idempotent is never sent twice
+        assert len(received) == (3 if retried else 2)
+
+    def test_chunked_response(self):
+        async def receive():
+            reader = asyncio.StreamReader()
+            reader.feed_data(
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"4\r\n{\"a\"\r\n3;ext=1\r\n: 1\r\n1\r\n}\r\n0\r\n\r\n"
+            )
+            connection = Connection(reader, writer=None)
+            return await connection.receive("GET"), connection.reusable
+
+        (status, headers, body), reusable = asyncio.run(receive())
+        assert status == 200
+        assert body == b'{"a": 1}'
+        assert reusable